@@ -0,0 +1,142 @@
+# activity.py
+
+import numpy as np
+import perf
+
+# Шаг карты активности, отсчётов (совпадает с RMS_HOP графика громкости)
+ACTIVITY_HOP = 512
+# Кадр тише SILENCE_FLOOR_DB дБFS или на SILENCE_REL_DB тише самого громкого — тишина
+SILENCE_FLOOR_DB = -60.0
+SILENCE_REL_DB   = -45.0
+# Паузы короче этого считаются частью звучания, сек
+MIN_SILENCE_SEC = 1.0
+# Запас вокруг активных участков (атаки и хвосты), сек
+ACTIVITY_PAD_SEC = 0.1
+# Обработка только активных участков окупается, если звучит меньше этой доли трека
+ACTIVE_SKIP_FRACTION = 0.9
+# Интервал positionChanged плеера при включённом пропуске тишины, мс
+SKIP_NOTIFY_MS = 100
+
+# Кэш карт активности: (track_cache_key, hop) -> ActivityMap
+_activity_cache: dict = {}
+
+
+def rms_envelope(y: np.ndarray, hop: int = ACTIVITY_HOP) -> np.ndarray:
+    """RMS неперекрывающихся блоков по hop отсчётов — один векторный проход."""
+    n = -(-len(y) // hop)
+    padded = np.zeros(n * hop, dtype=np.float32)
+    padded[:len(y)] = y
+    return np.sqrt(np.mean(np.square(padded.reshape(n, hop)), axis=1))
+
+
+def _runs(mask: np.ndarray):
+    """Начала и концы (не включая) участков True."""
+    d = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return np.flatnonzero(d == 1), np.flatnonzero(d == -1)
+
+
+class ActivityMap:
+    """
+    Карта активности трека: маска кадров по hop отсчётов (True — звук).
+    Строится по RMS-огибающей: паузы короче MIN_SILENCE_SEC заполняются,
+    активные участки расширяются на ACTIVITY_PAD_SEC.
+    """
+    __slots__ = ('mask', 'sr', 'hop', 'n_samples')
+
+    def __init__(self, mask: np.ndarray, sr: int, hop: int = ACTIVITY_HOP, n_samples: int = None):
+        self.mask      = np.asarray(mask, dtype=bool)
+        self.sr        = sr
+        self.hop       = hop
+        self.n_samples = n_samples if n_samples is not None else len(self.mask) * hop
+
+    @classmethod
+    def from_rms(cls, rms: np.ndarray, sr: int, hop: int = ACTIVITY_HOP, n_samples: int = None):
+        db = 20.0 * np.log10(np.maximum(np.asarray(rms, dtype=np.float32), 1e-10))
+        if len(db) == 0:
+            return cls(db > 0, sr, hop, n_samples)
+        threshold = max(SILENCE_FLOOR_DB, float(db.max()) + SILENCE_REL_DB)
+        starts, ends = _runs(db > threshold)
+        mask = np.zeros(len(db), dtype=bool)
+        if len(starts):
+            # Сливаем участки, разделённые короткими паузами (в том числе от начала и до конца)
+            min_gap = int(MIN_SILENCE_SEC * sr / hop)
+            gaps = starts[1:] - ends[:-1]
+            keep = np.concatenate([[True], gaps >= min_gap])
+            starts, ends = starts[keep], np.concatenate([ends[:-1][keep[1:]], ends[-1:]])
+            if starts[0] < min_gap:
+                starts[0] = 0
+            if len(db) - ends[-1] < min_gap:
+                ends[-1] = len(db)
+            pad = int(ACTIVITY_PAD_SEC * sr / hop)
+            for s, e in zip(np.maximum(starts - pad, 0), np.minimum(ends + pad, len(db))):
+                mask[s:e] = True
+        return cls(mask, sr, hop, n_samples)
+
+    @property
+    def active_fraction(self) -> float:
+        return float(self.mask.mean()) if len(self.mask) else 1.0
+
+    def regions(self) -> np.ndarray:
+        """Активные участки в отсчётах: (K, 2) — [начало, конец)."""
+        starts, ends = _runs(self.mask)
+        return np.minimum(np.stack([starts, ends], axis=1) * self.hop, self.n_samples)
+
+    def slice(self, start_sec: float, end_sec: float) -> 'ActivityMap':
+        """Карта фрагмента [start_sec, end_sec)."""
+        i0 = int(start_sec * self.sr) // self.hop
+        i1 = -(-int(end_sec * self.sr) // self.hop)
+        n_samples = int(end_sec * self.sr) - i0 * self.hop
+        return ActivityMap(self.mask[i0:i1], self.sr, self.hop, n_samples)
+
+    def next_active(self, sec: float):
+        """
+        Если sec попадает в тишину — начало следующего активного участка
+        в секундах (или конец трека); иначе None.
+        """
+        i = int(sec * self.sr) // self.hop
+        if i >= len(self.mask) or self.mask[i]:
+            return None
+        ahead = np.flatnonzero(self.mask[i:])
+        frame = i + ahead[0] if len(ahead) else len(self.mask)
+        return min(frame * self.hop, self.n_samples) / self.sr
+
+
+def activity_for(y: np.ndarray, sr: int, path: str = None, rms: np.ndarray = None,
+                 hop: int = ACTIVITY_HOP) -> ActivityMap:
+    """
+    Карта активности сигнала с кэшированием по ключу файла path
+    (track_cache_key: изменённый файл получает новую карту). rms — уже
+    посчитанная огибающая исходного сигнала с шагом hop (например,
+    из графика громкости), иначе считается rms_envelope.
+    """
+    key = None
+    if path is not None:
+        from utils import file_signature, track_cache_key
+        sig = file_signature(path)
+        key = (track_cache_key(path, *sig), hop) if sig else None
+    amap = _activity_cache.get(key) if key is not None else None
+    if amap is not None and amap.sr == sr:
+        perf.cache_hit('activity')
+        return amap
+    perf.cache_miss('activity')
+    if rms is None:
+        rms = rms_envelope(y, hop)
+    amap = ActivityMap.from_rms(rms, sr, hop, len(y))
+    if key is not None:
+        _activity_cache[key] = amap
+    return amap
+
+
+def active_signal(y: np.ndarray, amap: ActivityMap) -> np.ndarray:
+    """
+    Сигнал без тишины: активные участки подряд. Если тишины нет
+    или звука нет вовсе (в том числе внутри y) — исходный сигнал без копирования.
+    """
+    if amap.active_fraction >= 1.0:
+        return y
+    regions = np.minimum(amap.regions(), len(y))
+    regions = regions[regions[:, 1] > regions[:, 0]]
+    if len(regions) == 0:
+        return y
+    perf.count('activity.skipped_samples', len(y) - int((regions[:, 1] - regions[:, 0]).sum()))
+    return np.concatenate([y[s:e] for s, e in regions])
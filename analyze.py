@@ -0,0 +1,193 @@
+# analyze.py
+
+"""
+Пакетный анализ без GUI: признаки и сходство для папки или плейлиста.
+
+    python analyze.py /mnt/share/music --out results/ --top-k 10
+    python analyze.py playlist.gspl --out results/ --pairwise
+    python analyze.py /mnt/share/music --out results/ --index results/index --index-dtype int8
+
+Результаты: features_NNNNN.npz (колонки признаков по чанкам), similarity_topk.npz
+или similarity_pairwise.npy и report.json; с --index — компактный индекс
+эмбеддингов (embedding_index.py). Признаки каждого трека кэшируются
+на диске, поэтому прерванный запуск при повторе продолжает с того же места.
+"""
+
+import os, sys, json, time, argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from feature_cache import FeatureCache, DEFAULT_CACHE_DIR
+
+# Порядок колонок в файлах признаков
+FEATURE_COLUMNS = ('mfcc_mean', 'mfcc_std', 'chroma_mean', 'rms', 'spectral', 'duration')
+
+
+def collect_paths(source: str) -> list[str]:
+    """Пути треков из папки (рекурсивно) или файла плейлиста (.json/.gspl)."""
+    if os.path.isdir(source):
+        from library import LibraryScanner
+        scanner = LibraryScanner(index_path=os.devnull)
+        return sorted(path for path, _, _ in scanner.walk([source]))
+    from utils import iter_playlist
+    return [rec['path'] for rec in iter_playlist(source)]
+
+
+def analyze_tracks(paths: list[str], cache_root: str) -> list[tuple]:
+    """
+    Признаки группы треков (выполняется в рабочем процессе): промахи кэша
+    декодируются и считаются одним батчем (summary_features_many).
+    Возвращает [(path, feats или None, из кэша ли, текст ошибки)].
+    """
+    from similarity import summary_features_many, SUMMARY_VERSION
+    cache = FeatureCache(cache_root, version=SUMMARY_VERSION)
+    results, signals = {}, []
+    for path in paths:
+        feats = cache.get(path)
+        if feats is not None:
+            results[path] = (path, feats, True, None)
+            continue
+        try:
+            import librosa
+            signals.append((path, librosa.load(path, sr=None, mono=True)))
+        except Exception as exc:
+            results[path] = (path, None, False, f"{type(exc).__name__}: {exc}")
+    if signals:
+        try:
+            batch = summary_features_many([sig for _, sig in signals])
+        except Exception as exc:
+            batch = [None] * len(signals)
+            error = f"{type(exc).__name__}: {exc}"
+        for (path, _), feats in zip(signals, batch):
+            if feats is None:
+                results[path] = (path, None, False, error)
+            else:
+                cache.put(path, feats)
+                results[path] = (path, feats, False, None)
+    return [results[p] for p in paths]
+
+
+def write_chunk(out_dir: str, n: int, rows: list[tuple]):
+    """Пишет чанк признаков: колонка на признак, строка на трек."""
+    data = {'paths': np.array([p for p, _ in rows])}
+    for col in FEATURE_COLUMNS:
+        data[col] = np.stack([np.atleast_1d(f[col]) for _, f in rows])
+    np.savez(os.path.join(out_dir, f"features_{n:05d}.npz"), **data)
+
+
+def embedding_matrix(feats: list[dict], w_mfcc: float, w_chroma: float) -> np.ndarray:
+    """
+    Нормированные векторы для косинусного сходства: стандартизованные
+    MFCC-статистики и хрома, взвешенные как в combined_similarity.
+    """
+    from embedding_index import fit_embedding, embed
+    return embed(feats, fit_embedding(feats), w_mfcc, w_chroma)
+
+
+def top_k_similarity(E: np.ndarray, k: int, block: int = 1024):
+    """
+    Для каждой строки E — k ближайших по скалярному произведению (без себя).
+    Считается блоками, поэтому полная матрица N×N не строится.
+    """
+    n = len(E)
+    k = min(k, n - 1)
+    idx = np.zeros((n, k), dtype=np.int32)
+    score = np.zeros((n, k), dtype=np.float32)
+    for start in range(0, n, block):
+        S = E[start:start + block] @ E.T
+        rows = np.arange(len(S))
+        S[rows, start + rows] = -np.inf
+        part = np.argpartition(-S, k - 1, axis=1)[:, :k]
+        vals = np.take_along_axis(S, part, axis=1)
+        order = np.argsort(-vals, axis=1)
+        idx[start:start + block] = np.take_along_axis(part, order, axis=1)
+        score[start:start + block] = np.take_along_axis(vals, order, axis=1)
+    return idx, score
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный анализ аудио без GUI")
+    parser.add_argument('source', help="папка или плейлист (.json/.gspl)")
+    parser.add_argument('--out', required=True, help="папка для результатов")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_DIR, help="папка кэша признаков")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk', type=int, default=1000, help="треков в файле признаков")
+    parser.add_argument('--batch', type=int, default=8, help="треков в одном батче признаков")
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--pairwise', action='store_true', help="полная матрица сходства")
+    parser.add_argument('--w-mfcc', type=float, default=0.6)
+    parser.add_argument('--w-chroma', type=float, default=0.4)
+    parser.add_argument('--index', default=None, help="папка компактного индекса эмбеддингов")
+    parser.add_argument('--index-dtype', choices=('float16', 'int8'), default='float16')
+    parser.add_argument('--pca', type=int, default=None, help="размерность индекса после PCA")
+    args = parser.parse_args(argv)
+
+    t0 = time.time()
+    os.makedirs(args.out, exist_ok=True)
+    paths = collect_paths(args.source)
+    print(f"Треков: {len(paths)}", file=sys.stderr)
+
+    ok_paths, ok_feats, failures = [], [], {}
+    cached = 0
+    chunk, n_chunks = [], 0
+    with ProcessPoolExecutor(args.workers) as pool:
+        groups = [paths[i:i + args.batch] for i in range(0, len(paths), args.batch)]
+        batches = pool.map(analyze_tracks, groups, [args.cache] * len(groups))
+        results = (res for batch in batches for res in batch)
+        for i, (path, feats, from_cache, error) in enumerate(results, start=1):
+            if feats is None:
+                failures[path] = error
+                continue
+            cached += from_cache
+            ok_paths.append(path)
+            ok_feats.append(feats)
+            chunk.append((path, feats))
+            if len(chunk) == args.chunk:
+                write_chunk(args.out, n_chunks, chunk)
+                chunk, n_chunks = [], n_chunks + 1
+            if i % 100 == 0:
+                print(f"{i}/{len(paths)}", file=sys.stderr)
+    if chunk:
+        write_chunk(args.out, n_chunks, chunk)
+        n_chunks += 1
+
+    t_features = time.time()
+    if len(ok_feats) > 1:
+        E = embedding_matrix(ok_feats, args.w_mfcc, args.w_chroma)
+        if args.pairwise:
+            np.save(os.path.join(args.out, 'similarity_pairwise.npy'), (E @ E.T).astype(np.float16))
+        if args.index:
+            # Top-k считается прямо по квантованной матрице индекса
+            from embedding_index import EmbeddingIndex
+            index = EmbeddingIndex.build(args.index, ok_paths, ok_feats, args.index_dtype,
+                                         args.pca, args.w_mfcc, args.w_chroma)
+            idx, score = index.top_k_all(args.top_k)
+        else:
+            idx, score = top_k_similarity(E, args.top_k)
+        np.savez(os.path.join(args.out, 'similarity_topk.npz'),
+                 paths=np.array(ok_paths), index=idx, score=score)
+
+    report = {
+        'source':        os.path.abspath(args.source),
+        'tracks':        len(paths),
+        'analyzed':      len(ok_paths),
+        'from_cache':    cached,
+        'failed':        len(failures),
+        'failures':      failures,
+        'feature_files': n_chunks,
+        'columns':       list(FEATURE_COLUMNS),
+        'similarity':    'cosine over standardised MFCC stats + chroma, '
+                         f'w_mfcc={args.w_mfcc}, w_chroma={args.w_chroma}',
+        'index':         args.index and {'path': os.path.abspath(args.index),
+                                         'dtype': args.index_dtype, 'pca': args.pca},
+        'features_s':    round(t_features - t0, 2),
+        'total_s':       round(time.time() - t0, 2),
+    }
+    with open(os.path.join(args.out, 'report.json'), 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps({k: v for k, v in report.items() if k != 'failures'}, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,24 +1,76 @@
-import os, tempfile, librosa
+import os, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
 from PyQt5.QtCore       import QUrl
 import numpy as np
-import scipy.io.wavfile as wavfile
-from eq import apply_equalizer  
-from similarity import compute_similarity_indices as _sim_idx
+from similarity import pair_components, combine_scores, SCORE_VERSION
+from fingerprint import find_duplicate_groups
+import perf
+from playlist import Playlist, Track
+from utils import file_signature, is_track_unchanged, track_cache_key
+from probe import probe_file, probe_files
+from loudness import analyze_loudness, db_to_gain, MAX_TRUE_PEAK
+from streaming import StreamingDecode, STREAM_MIN_DURATION
+from stretch import StretchCache, render_stretched
+from eq_cache import EqRenderCache, EqRender, EQ_PREROLL_SEC
+from clustering import TrackClusters, DEFAULT_CLUSTERS
+from activity import activity_for, ACTIVITY_HOP, ACTIVE_SKIP_FRACTION, SKIP_NOTIFY_MS
 
 class AudioController:
     def __init__(self):
         # Основной Qt-плеер
         self.player        = QMediaPlayer()
-        # Плейлист: список словарей {"path", "title", "duration", "original_data", "original_fs"}
-        self.playlist      = []
+        # Плейлист: записи Track {"path", "title", "duration", "original_data", "original_fs"}
+        self.playlist      = Playlist()
         self.current_index = None
         # Данные текущего трека
         self.data          = None
         self.fs            = None
         self.duration      = 0  # в миллисекундах
-
-        
+        # Пул процессов для анализа (запускается при первой задаче)
+        self._pool         = None
+        # Громкость ползунка (0–100) и выравнивание громкости по LUFS
+        self.volume         = 50
+        self.loudness_match = False
+        # Поправка громкости отрендеренного эквалайзером файла, дБ
+        self._render_db     = 0.0
+        # Фоновый анализ громкости: path -> Future; колбэк on_loudness(path)
+        # вызывается из фонового потока по готовности
+        self._loudness_pool = None
+        self._loudness_jobs = {}
+        self.on_loudness    = None
+        # Потоковое открытие длинных файлов: текущий StreamingDecode и колбэки
+        # on_stream_progress(path) / on_stream_done(path) из фонового потока
+        self.stream             = None
+        self.on_stream_progress = None
+        self.on_stream_done     = None
+        # Темп с сохранением высоты тона: запрошенный rate и темп играющего файла.
+        # Позиции в интерфейсе всегда в секундах исходного трека.
+        self.rate           = 1.0
+        self.stretch_rate   = 1.0
+        self._base_media    = None    # исходный файл или рендер эквалайзера
+        self._eq_key        = None    # усиления полос рендера эквалайзера
+        self._stretch_cache = StretchCache()
+        self._stretch_pool  = None
+        self._stretch_job   = None    # (key, Future, threading.Event)
+        self.on_stretch_ready = None  # колбэк(key) из фонового потока
+        # Хранилище сырых оценок сходства пар (открывается при первом запросе)
+        # и колбэк(request) готовности request_similarity из фонового потока
+        self._scores        = None
+        self.on_similarity_ready = None
+        # Именованные снимки эквалайзера (имя -> усиления) и кэш их рендеров.
+        # Длинный трек рендерится фрагментом: _media_offset — его начало, мс
+        self.eq_snapshots   = {}
+        self._eq_cache      = EqRenderCache()
+        self._media_offset  = 0
+        self._media_segment = False   # играет рендер фрагмента, а не весь трек
+        # Рендер эквалайзера в пуле: (ключ, Job); колбэк(key, EqRender) из фонового потока
+        self._eq_job        = None
+        self.on_eq_ready    = None
+        # Группы похожих треков (мини-батч k-means, дополняется новыми файлами)
+        self.clusters       = None
+        # Перескакивать через паузы при воспроизведении (по карте активности)
+        self.skip_silence   = False
 
 
     def open_file(self, path):
@@ -33,68 +85,174 @@ class AudioController:
         # 1) Проверяем, что файл существует
         if not os.path.exists(path):
             return
+        self._cancel_stream()
+
+        # Длинные файлы декодируются поблочно в фоне
+        if self.should_stream(path):
+            self._open_streaming(path)
+            return
 
         # 2) Загружаем сигнал и частоту дискретизации
-        y, sr = librosa.load(path, sr=None, mono=True)
+        import librosa
+        with perf.span('audio.decode'):
+            y, sr = librosa.load(path, sr=None, mono=True)
+        perf.count('audio.decode.bytes', y.nbytes)
         self.data, self.fs = y, sr
 
         # 3) Проверяем, есть ли уже такой трек в плейлисте
-        found = False
-        for idx, tr in enumerate(self.playlist):
-            if tr['path'] == path:
-                self.current_index = idx
-                found = True
-                break
+        idx = self.playlist.index_of(path)
 
         # 4) Если не найден — добавляем новый трек с оригинальными данными
-        if not found:
-            duration = librosa.get_duration(y=y, sr=sr)
-            track = {
-                'path': path,
-                'title': os.path.basename(path),
-                'duration': duration,
-                'original_data': y.copy(),
-                'original_fs': sr
-            }
-            self.playlist.append(track)
-            self.current_index = len(self.playlist) - 1
-
-        # 5) Устанавливаем media и запускаем воспроизведение
-        self._set_media(path)
+        if idx is None:
+            self.playlist.append(self._make_track(path, y, sr))
+            idx = len(self.playlist) - 1
+        elif self.playlist[idx].original_data is None:
+            # трек восстановлен из кэша плейлиста без декодирования
+            tr = self.playlist[idx]
+            tr.original_data, tr.original_fs = y.copy(), sr
+        self.current_index = idx
+
+        # 5) Громкость трека считается в фоне по уже декодированному сигналу
+        self._render_db = 0.0
+        self.analyze_loudness_async([idx], y, sr)
+
+        # 6) Устанавливаем media и запускаем воспроизведение
+        self._set_base_media(path, None)
+        self.apply_volume()
+        self.player.play()
+        self._request_stretch()
+
+
+    # --Потоковое открытие--
+    def should_stream(self, path) -> bool:
+        """True, если файл достаточно длинный для потокового открытия."""
+        tr = self.playlist.get(path)
+        if tr is not None and tr.original_data is not None:
+            return False
+        duration = tr.duration if tr is not None and tr.duration else None
+        if duration is None:
+            info = probe_file(path)
+            duration = info['duration'] if info else 0.0
+        return duration >= STREAM_MIN_DURATION
+
+    def _open_streaming(self, path):
+        """
+        Запускает воспроизведение сразу (QMediaPlayer читает файл сам),
+        а сигнал декодирует поблочно в фоне: графики растут по мере
+        поступления блоков, self.data появляется после finish_stream.
+        """
+        idx = self.playlist.index_of(path)
+        if idx is None:
+            info = probe_file(path)
+            self.playlist.append(self._track_from_info(info) if info else Track(path))
+            idx = len(self.playlist) - 1
+        self.current_index = idx
+        self.data, self.fs = None, self.playlist[idx].original_fs
+        self._render_db = 0.0
+        self.stream = StreamingDecode(path, self.on_stream_progress, self.on_stream_done).start()
+
+        self._set_base_media(path, None)
+        self.apply_volume()
         self.player.play()
-        
+
+    def finish_stream(self, path) -> bool:
+        """
+        Завершает потоковое открытие (вызывается из GUI-потока по on_stream_done):
+        переносит сигнал в self.data и плейлист и ставит анализ громкости.
+        """
+        stream = self.stream
+        if stream is None or stream.path != path or not stream.done:
+            return False
+        y, sr = stream.result(), stream.sr
+        self.data, self.fs = y, sr
+        idx = self.playlist.index_of(path)
+        if idx is not None:
+            tr = self.playlist[idx]
+            tr.original_data, tr.original_fs = y, sr
+            if not tr.duration:
+                tr.duration = len(y) / sr
+            self.analyze_loudness_async([idx], y, sr)
+        # Темп, выбранный во время декодирования, применяется теперь
+        self._request_stretch()
+        return True
+
+    def _cancel_stream(self):
+        if self.stream is not None:
+            self.stream.cancel()
+            self.stream = None
+
     def add_files(self, paths):
         """
         Добавляет в плейлист контроллера все файлы из списка paths,
         не прерывая текущее воспроизведение.
 
         Для каждого нового файла:
-        – загружает сигнал через librosa
-        – вычисляет длительность
-        – сохраняет копию «чистого» сигнала и fs
+        – читает длительность, fs и каналы из заголовка (без декодирования)
         – добавляет запись в self.playlist
+        Сигнал загружается позже, при первом открытии трека.
         """
-        import os, librosa
+        # проверяем существование файлов и отсутствие дубликатов
+        new_paths = [p for p in dict.fromkeys(paths)
+                     if os.path.exists(p) and p not in self.playlist]
 
-        for path in paths:
-            # проверяем существование файла и отсутствие дубликатов
-            print(self.playlist)
-            if not os.path.exists(path) or any(t['path'] == path for t in self.playlist):
-                continue
+        # опрашиваем заголовки параллельно
+        for path, info in zip(new_paths, probe_files(new_paths)):
+            if info is not None:
+                self.playlist.append(self._track_from_info(info))
+            else:
+                # формат без читаемого заголовка — декодируем целиком
+                import librosa
+                y, sr = librosa.load(path, sr=None, mono=True)
+                self.playlist.append(self._make_track(path, y, sr))
 
-            # загружаем оригинальный сигнал
-            y, sr = librosa.load(path, sr=None, mono=True)
-            duration = librosa.get_duration(y=y, sr=sr)
-
-            # формируем запись трека
-            track = {
-                'path': path,
-                'title': os.path.basename(path),
-                'duration': duration,
-                'original_data': y.copy(),
-                'original_fs': sr
-            }
-            self.playlist.append(track)
+    def add_entries(self, entries):
+        """
+        Добавляет в плейлист записи индекса библиотеки (словари probe_file),
+        не открывая и не декодируя файлы.
+        """
+        for info in entries:
+            if info['path'] not in self.playlist:
+                self.playlist.append(self._track_from_info(info))
+
+    def _make_track(self, path, y, sr, title=None):
+        """
+        Создаёт запись Track по декодированному сигналу,
+        заполняя метаданные файла (size, mtime) для кэша плейлиста.
+        """
+        import librosa
+        size, mtime = file_signature(path) or (None, None)
+        return Track(path, title or os.path.basename(path),
+                     librosa.get_duration(y=y, sr=sr), y.copy(), sr,
+                     mtime=mtime, size=size)
+
+    @staticmethod
+    def _track_from_info(info: dict, title=None) -> Track:
+        """Создаёт запись Track по метаданным из probe_file, без сигнала."""
+        return Track(info['path'], title or os.path.basename(info['path']),
+                     info['duration'], None, info['sr'], channels=info['channels'],
+                     mtime=info['mtime'], size=info['size'])
+
+    def restore_track(self, rec: dict) -> Track:
+        """
+        Восстанавливает трек из записи плейлиста и добавляет его в self.playlist.
+        Если файл не менялся с момента сохранения, берутся кэшированные
+        метаданные; иначе они перечитываются из заголовка файла.
+        Сигнал загрузится при первом открытии трека.
+        """
+        if is_track_unchanged(rec):
+            track = Track(rec['path'], rec.get('title'), rec.get('duration', 0.0),
+                          None, rec.get('sr'), channels=rec.get('channels'),
+                          mtime=rec.get('mtime'), size=rec.get('size'),
+                          loudness=rec.get('loudness'))
+        else:
+            info = probe_file(rec['path'])
+            if info is not None:
+                track = self._track_from_info(info, rec.get('title'))
+            else:
+                import librosa
+                y, sr = librosa.load(rec['path'], sr=None, mono=True)
+                track = self._make_track(rec['path'], y, sr, rec.get('title'))
+        return self.playlist.append(track)
 
     def _set_media(self, path):
         """
@@ -106,6 +264,73 @@ class AudioController:
         # но мы можем попытаться получить её сразу
         self.duration = self.player.duration()
 
+    # --Громкость--
+    def set_volume(self, v):
+        """Громкость ползунка 0–100; поправка трека добавляется в apply_volume."""
+        self.volume = v
+        self.apply_volume()
+
+    def set_loudness_match(self, enabled: bool):
+        """
+        Включает выравнивание громкости: треки приводятся к TARGET_LUFS
+        простым усилением при воспроизведении. При включении в фоне
+        анализируются все треки плейлиста, у которых ещё нет результата.
+        """
+        self.loudness_match = enabled
+        if enabled:
+            self.analyze_loudness_async(range(len(self.playlist)))
+        self.apply_volume()
+
+    def track_gain_db(self, idx=None) -> float:
+        """Поправка громкости трека в дБ (0, если выравнивание выключено или не готово)."""
+        idx = self.current_index if idx is None else idx
+        if not self.loudness_match or idx is None or not (0 <= idx < len(self.playlist)):
+            return 0.0
+        info = self.playlist[idx].loudness
+        return info['gain_db'] if info else 0.0
+
+    def apply_volume(self):
+        """
+        Выставляет громкость плеера: ползунок × поправка трека × поправка рендера.
+        Сигнал не пересчитывается — усиление применяет сам QMediaPlayer.
+        """
+        gain = db_to_gain(self.track_gain_db() + self._render_db)
+        self.player.setVolume(int(np.clip(round(self.volume * gain), 0, 100)))
+
+    def analyze_loudness_async(self, idxs, y=None, sr=None):
+        """
+        Ставит в фоновую очередь анализ громкости треков idxs, у которых
+        его ещё нет. y, sr — уже декодированный сигнал (для одного трека),
+        чтобы не декодировать файл повторно.
+        """
+        if self._loudness_pool is None:
+            self._loudness_pool = ThreadPoolExecutor(max_workers=1,
+                                                     thread_name_prefix='loudness')
+        for idx in idxs:
+            tr = self.playlist[idx]
+            if tr.loudness is not None or tr.path in self._loudness_jobs:
+                continue
+            data = y if y is not None else tr.original_data
+            fs   = sr if y is not None else tr.original_fs
+            fut = self._loudness_pool.submit(self._measure_loudness, tr, data, fs)
+            self._loudness_jobs[tr.path] = fut
+            fut.add_done_callback(lambda f, path=tr.path: self._loudness_done(path, f))
+
+    @staticmethod
+    def _measure_loudness(tr, y, sr):
+        if y is None or not sr:
+            import librosa
+            y, sr = librosa.load(tr.path, sr=None, mono=True)
+        tr.loudness = analyze_loudness(y, sr)
+        return tr.loudness
+
+    def _loudness_done(self, path, fut):
+        self._loudness_jobs.pop(path, None)
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        if self.on_loudness is not None:
+            self.on_loudness(path)
+
     def play(self):
         self.player.play()
 
@@ -143,50 +368,294 @@ class AudioController:
 
     def set_position(self, ms):
         """
-        Устанавливает позицию воспроизведения (в миллисекундах).
+        Устанавливает позицию воспроизведения (в миллисекундах исходного трека).
         Вызывается из главного слайдера.
         """
-        self.player.setPosition(ms)
+        self.player.setPosition(max(0, int((ms - self._media_offset) / self.stretch_rate)))
+
+    def set_skip_silence(self, enabled: bool):
+        self.skip_silence = bool(enabled)
+        # Паузы проматываются по positionChanged: чаще сигнал — раньше перемотка
+        self.player.setNotifyInterval(SKIP_NOTIFY_MS if self.skip_silence else 1000)
+
+    def activity_map(self, rms=None, hop: int = ACTIVITY_HOP, source=None):
+        """
+        Карта активности текущего трека (кэшируется по файлу) или None.
+        rms — уже посчитанная огибающая сигнала source с шагом hop (график
+        громкости); она используется, только если source — исходный сигнал
+        трека, а не результат эквалайзера.
+        """
+        if self.current_index is None or self.data is None:
+            return None
+        tr = self.playlist[self.current_index]
+        y = tr.original_data if tr.original_data is not None else self.data
+        if source is not y:
+            rms = None
+        return activity_for(y, self.fs, tr.path, rms, hop)
+
+    def skip_silence_step(self) -> bool:
+        """
+        Если включён пропуск тишины и плейхед в паузе — перематывает
+        к следующему звучащему участку (или в конец трека). True, если перемотал.
+        """
+        if not self.skip_silence or self.player.state() != QMediaPlayer.PlayingState:
+            return False
+        amap = self.activity_map()
+        target = amap.next_active(self.position() / 1000.0) if amap is not None else None
+        if target is None:
+            return False
+        perf.count('activity.playback_skips')
+        self.set_position(int(target * 1000))
+        return True
 
     def seek(self, sec):
         """
         Перематывает на заданное время в секундах
         """
-        self.player.setPosition(int(sec * 1000))
+        self.set_position(int(sec * 1000))
+
+    def position(self) -> int:
+        """Позиция воспроизведения в миллисекундах исходного трека."""
+        return self.source_ms(self.player.position())
+
+    def source_ms(self, player_ms) -> int:
+        """Переводит время играющего файла во время исходного трека."""
+        return int(player_ms * self.stretch_rate) + self._media_offset
+
+    def source_duration(self, player_dur) -> int:
+        """
+        Длительность исходного трека, мс, по длительности играющего файла.
+        Рендер фрагмента короче трека — тогда длительность берётся по сигналу.
+        """
+        if self._media_segment and self.data is not None and self.fs:
+            return int(len(self.data) * 1000 / self.fs)
+        return int(player_dur * self.stretch_rate)
+
+    # --Темп--
+    def _set_base_media(self, path, eq_key, offset_ms: int = 0, segment: bool = False):
+        """Ставит исходный (или отрендеренный эквалайзером) файл с темпом 1.0."""
+        self._base_media, self._eq_key = path, eq_key
+        self._media_offset = offset_ms
+        self._media_segment = segment
+        self.stretch_rate = 1.0
+        self._set_media(path)
+
+    def _stretch_key(self, rate):
+        """
+        Ключ рендера темпа: трек, вариант эквалайзера, темп и усиление,
+        с которым отфильтрованный сигнал пишется в WAV (то же, что у рендера
+        эквалайзера, — иначе подъём полос клиппирует и громкость скачет).
+        """
+        if self.current_index is None:
+            return None
+        return (self.playlist[self.current_index].path, self._eq_key, round(rate, 2),
+                round(-self._render_db, 2))
+
+    def set_rate(self, rate: float):
+        """
+        Меняет темп без изменения высоты тона. Готовый рендер из кэша
+        включается сразу, иначе рендер запускается в фоне, а до его готовности
+        играет текущий файл.
+        """
+        self.rate = round(rate, 2)
+        self._request_stretch()
+
+    def _request_stretch(self):
+        key = self._stretch_key(self.rate)
+        # Фрагмент эквалайзера длинного трека играет без растяжения
+        if key is None or self._base_media is None or self._media_segment:
+            return
+        if self.rate == 1.0:
+            self._cancel_stretch()
+            if self.stretch_rate != 1.0:
+                self._switch_media(self._base_media, 1.0)
+            return
+        cached = self._stretch_cache.get(key)
+        if cached is not None:
+            self._cancel_stretch()
+            self._switch_media(cached, self.rate)
+            return
+        if self._stretch_job is not None and self._stretch_job[0] == key:
+            return
+        if self.data is None or self.fs is None:
+            return   # сигнал ещё декодируется — повторим в finish_stream
+        self._cancel_stretch()
+        if self._stretch_pool is None:
+            self._stretch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stretch')
+        cancel = threading.Event()
+        out = self._stretch_cache.new_file()
+        # Рендер эквалайзера записан с усилением scale_db (его компенсирует
+        # _render_db в apply_volume) — растянутый файл пишется так же
+        y, fs, gain = self.data, self.fs, db_to_gain(key[3])
+        fut = self._stretch_pool.submit(
+            lambda: render_stretched(y * gain if gain != 1.0 else y, fs, key[2], out, cancel))
+        self._stretch_job = (key, fut, cancel)
+        fut.add_done_callback(lambda f: self._stretch_done(key, out, f))
+
+    def _stretch_done(self, key, out, fut):
+        if fut.cancelled() or fut.exception() is not None or not fut.result():
+            if os.path.exists(out):
+                os.remove(out)
+            return
+        self._stretch_cache.put(key, out)
+        if self.on_stretch_ready is not None:
+            self.on_stretch_ready(key)
+
+    def apply_stretch(self, key) -> bool:
+        """
+        Включает готовый рендер key, если он всё ещё нужен
+        (вызывается из GUI-потока по on_stretch_ready).
+        """
+        if key != self._stretch_key(self.rate):
+            return False
+        self._stretch_job = None
+        path = self._stretch_cache.get(key)
+        if path is None:
+            return False
+        self._switch_media(path, self.rate)
+        return True
+
+    def _switch_media(self, path, rate):
+        """Переключает файл, сохраняя позицию в исходном треке и состояние паузы."""
+        pos = self.position()
+        playing = self.player.state() == QMediaPlayer.PlayingState
+        self._set_media(path)
+        self.stretch_rate = rate
+        self.set_position(pos)
+        if playing:
+            self.player.play()
 
-    def apply_eq(self, gains, eq_bands):
+    def _cancel_stretch(self):
+        if self._stretch_job is not None:
+            _, fut, cancel = self._stretch_job
+            cancel.set()
+            fut.cancel()
+            self._stretch_job = None
+
+    @perf.timed('audio.apply_eq')
+    def apply_eq(self, gains, eq_bands, segment=None) -> bool:
         """
-        Применяет эквалайзер к self.data и воспроизводит результат.
+        Применяет эквалайзер к исходному сигналу текущего трека и
+        воспроизводит результат с той же позиции.
         gains     — список усилений дБ для каждой полосы eq_bands.
         eq_bands  — список центральных частот.
+        segment   — (начало, конец) в секундах: если трек слишком длинный
+                    для кэша, рендерится только этот фрагмент.
+        Рендеры кэшируются, поэтому повторный выбор тех же усилений
+        (снимка) переключается мгновенно — тогда возвращается True.
+        Новый рендер идёт в пуле процессов (незавершённый предыдущий
+        отменяется) и возвращается False; по готовности вызывается колбэк
+        on_eq_ready(key, render) из фонового потока, а включает рендер
+        finish_eq в GUI-потоке.
         """
         if self.data is None or self.fs is None:
-            return
+            return False
 
         tr = self.playlist[self.current_index]
-        
+        # Графики дальше строятся по отфильтрованному сигналу, а не по пирамиде
+        self.stream = None
+        gains = tuple(gains)
+        if not any(gains):
+            self.reset_eq()
+            return True
+
         # Фильтруем исходный сигнал
-        y_orig = tr.get('original_data', self.data)
+        y_orig = tr.original_data if tr.original_data is not None else self.data
+        if segment is not None:
+            start, end = sorted(segment)
+            # Фрагментом рендерится только выделение строго меньше трека
+            segment = (round(max(start, 0.0), 2), round(min(end, len(y_orig) / self.fs), 2))
+            if segment[0] <= 0.0 and segment[1] >= round(len(y_orig) / self.fs, 2):
+                segment = None
+        if segment is not None and self._eq_cache.fits_full(len(y_orig)):
+            segment = None
+        key = (tr.path, gains, tuple(eq_bands), segment)
+        entry = self._eq_cache.get(key)
+        if entry is not None:
+            self._cancel_eq()
+            self._use_eq_render(key, entry)
+            return True
+        if self._eq_job is not None and self._eq_job[0] == key:
+            return False
+        self._cancel_eq()
+        job = self.submit_eq_render(tr, y_orig, gains, eq_bands, segment)
+        self._eq_job = (key, job)
+        job.future.add_done_callback(lambda f: self._eq_done(key, f))
+        return False
 
-        # Применяем фильтр
-        y_eq = apply_equalizer(y_orig, gains, self.fs, eq_bands)
-        self.data = y_eq
+    def _eq_done(self, key, fut):
+        if fut.cancelled() or fut.exception() is not None:
+            return
+        if self.on_eq_ready is not None:
+            self.on_eq_ready(key, fut.result())
 
-        # Нормируем и сохраняем во временный WAV
-        y_norm = y_eq / np.max(np.abs(y_eq))
-        int_data = np.int16(y_norm * 32767)
-        fd, tmp = tempfile.mkstemp(suffix='.wav')
-        os.close(fd)
-        wavfile.write(tmp, self.fs, int_data)
-        
-        # Очистка предыдущего фильтрованного файла
-        if hasattr(self, 'filtered_path') and os.path.exists(self.filtered_path):
-            os.remove(self.filtered_path)
-        self.filtered_path = tmp
-        
-        # Ставим новый медиа и играем
-        self._set_media(tmp)
+    def finish_eq(self, key, entry: EqRender) -> bool:
+        """
+        Кладёт готовый рендер в кэш и включает его, если он всё ещё
+        нужен (вызывается из GUI-потока по on_eq_ready). True — включён.
+        """
+        current = self._eq_job is not None and self._eq_job[0] == key
+        if current:
+            self._eq_job = None
+        self._eq_cache.put(key, entry, keep=self._base_media)
+        if not current or self.current_index is None \
+                or self.playlist[self.current_index].path != key[0]:
+            return False
+        self._use_eq_render(key, entry)
+        return True
+
+    def _use_eq_render(self, key, entry: EqRender):
+        """Переключает плеер и сигнал графиков на рендер key."""
+        tr = self.playlist[self.current_index]
+        y_orig = tr.original_data if tr.original_data is not None else self.data
+        self.data = entry.data if entry.data is not None else y_orig
+        # Ослабление рендера компенсируется громкостью плеера
+        self._render_db = -entry.scale_db
+        self._switch_base_media(entry.wav, key[1], int(entry.offset * 1000), key[3] is not None)
+
+    def _cancel_eq(self):
+        if self._eq_job is not None:
+            self._eq_job[1].cancel()
+            self._eq_job = None
+
+    def reset_eq(self):
+        """Возвращает исходный сигнал и файл трека, сохраняя позицию."""
+        if self.current_index is None:
+            return
+        self._cancel_eq()
+        tr = self.playlist[self.current_index]
+        if tr.original_data is not None:
+            self.data, self.fs = tr.original_data, tr.original_fs
+        self._render_db = 0.0
+        self._switch_base_media(tr.path, None, 0)
+
+    def _switch_base_media(self, path, eq_key, offset_ms: int, segment: bool = False):
+        """Переключает базовый файл (снимок эквалайзера), не сбрасывая позицию."""
+        pos = self.position()
+        self._cancel_stretch()
+        self._set_base_media(path, eq_key, offset_ms, segment)
+        self.set_position(pos)
+        self.apply_volume()
         self.player.play()
+        self._request_stretch()
+
+    def save_eq_snapshot(self, name: str, gains):
+        """Запоминает усиления полос под именем name."""
+        self.eq_snapshots[name] = tuple(gains)
+
+    @staticmethod
+    def _render_scale_db(tr, gains):
+        """
+        Усиление рендера эквалайзера в дБ. Если громкость трека уже
+        проанализирована, запас берётся из кэшированного истинного пика
+        плюс максимальный подъём полос — без прохода по сигналу.
+        Иначе None: рендер нормируется по пику (job_eq).
+        """
+        info = tr.loudness
+        if info and info.get('true_peak') is not None:
+            peak_db = info['true_peak'] + max(0.0, max(gains, default=0.0))
+            return min(0.0, MAX_TRUE_PEAK - peak_db)
+        return None
 
     def get_segment(self, start_sec, end_sec):
         """
@@ -205,7 +674,230 @@ class AudioController:
         end_idx   = int(e * self.fs)
         return self.data[start_idx:end_idx], self.fs, s, e
 
+    @perf.timed('audio.similarity')
     def compute_similarity_indices(self, ref_idx: int, comp_idxs: list[int]) -> dict[int, float]:
-        return _sim_idx(self.playlist, ref_idx, comp_idxs)
-    
-  
\ No newline at end of file
+        idxs, dtw, chroma = self.similarity_components(ref_idx, comp_idxs)
+        return dict(zip(idxs.tolist(), combine_scores(dtw, chroma).tolist()))
+
+    @property
+    def scores(self):
+        """Хранилище оценок пар; открывается при первом обращении."""
+        if self._scores is None:
+            from score_store import PairScoreStore
+            self._scores = PairScoreStore(version=SCORE_VERSION)
+        return self._scores
+
+    def _track_key(self, idx):
+        """Ключ кэша трека (путь, размер, mtime) или None, если файл недоступен."""
+        # Подпись берётся с диска: сохранённые в треке size/mtime могли устареть
+        tr = self.playlist[idx]
+        sig = file_signature(tr.path)
+        return track_cache_key(tr.path, *sig) if sig else None
+
+    def _similarity_request(self, ref_idx: int, comp_idxs: list[int]) -> dict:
+        """Запрос сравнения: пары, уже лежащие в хранилище, и недостающие пары."""
+        n = len(self.playlist)
+        if ref_idx is None or not (0 <= ref_idx < n):
+            comps, ref_key, keys = [], None, {}
+        else:
+            comps = [i for i in dict.fromkeys(comp_idxs) if i is not None and 0 <= i < n]
+            ref_key = self._track_key(ref_idx)
+            keys = {i: self._track_key(i) for i in comps}
+
+        stored = {}
+        if ref_key is not None:
+            stored = self.scores.get_many(ref_key, [k for k in keys.values() if k])
+        raw = {i: stored[keys[i]] for i in comps if keys[i] in stored}
+        missing = [i for i in comps if i not in raw]
+        perf.count('pair_scores.hit', len(raw))
+        perf.count('pair_scores.miss', len(missing))
+        return {'ref': ref_idx, 'comps': comps, 'ref_key': ref_key, 'keys': keys,
+                'raw': raw, 'missing': missing, 'future': None}
+
+    def _submit_pairs(self, ref_idx: int, idxs: list[int]):
+        """Ставит пары (ref_idx, i) в пул; Future со словарём {i: (DTW, хрома)}."""
+        from workers import job_pair_similarity, gather, PRIORITY_QUERY
+        jobs = {i: self.pool.submit(job_pair_similarity, self._source(ref_idx), self._source(i),
+                                    priority=PRIORITY_QUERY, tag='similarity')
+                for i in idxs}
+        return gather(jobs)
+
+    def _similarity_result(self, req: dict, computed: dict):
+        """Сохраняет посчитанные пары и собирает (индексы, DTW, хрома)."""
+        raw, keys = req['raw'], req['keys']
+        raw.update(computed)
+        if req['ref_key'] is not None and computed:
+            self.scores.put_many(req['ref_key'], {keys[i]: v for i, v in computed.items() if keys[i]})
+
+        # Упавшие в пуле пары в результат не попадают
+        comps = [i for i in req['comps'] if i in raw]
+        idxs = np.array(comps, dtype=np.int64)
+        dtw = np.array([raw[i][0] for i in comps], dtype=np.float64)
+        chroma = np.array([raw[i][1] for i in comps], dtype=np.float64)
+        return idxs, dtw, chroma
+
+    def similarity_components(self, ref_idx: int, comp_idxs: list[int]):
+        """
+        Сырые компоненты сходства трека ref_idx с comp_idxs:
+        (индексы, DTW-расстояния, косинусы хрома) — numpy-массивы.
+        Уже посчитанные пары берутся из хранилища, остальные считаются
+        (несколько — параллельно в пуле процессов) и сохраняются.
+        Блокирует до готовности; из интерфейса — request_similarity.
+        """
+        req = self._similarity_request(ref_idx, comp_idxs)
+        missing = req['missing']
+        if len(missing) > 1:
+            computed = self._submit_pairs(ref_idx, missing).result()
+        else:
+            ref_path = self.playlist[ref_idx].path if missing else None
+            computed = {i: pair_components(ref_path, self.playlist[i].path) for i in missing}
+        return self._similarity_result(req, computed)
+
+    def request_similarity(self, ref_idx: int, comp_idxs: list[int]) -> dict:
+        """
+        Неблокирующий similarity_components: пары из хранилища берутся сразу,
+        недостающие считаются в пуле. По готовности вызывается колбэк
+        on_similarity_ready(request) из фонового потока, а компоненты
+        отдаёт finish_similarity(request) в GUI-потоке.
+        """
+        req = self._similarity_request(ref_idx, comp_idxs)
+        req['future'] = self._submit_pairs(ref_idx, req['missing'])
+        req['future'].add_done_callback(
+            lambda _f: self.on_similarity_ready(req) if self.on_similarity_ready is not None else None)
+        return req
+
+    def finish_similarity(self, req: dict):
+        """Компоненты готового запроса request_similarity (вызывается из GUI-потока)."""
+        fut = req['future']
+        computed = {} if fut is None or fut.cancelled() else fut.result()
+        return self._similarity_result(req, computed)
+
+    # --Пул анализа--
+    @property
+    def pool(self):
+        """Постоянный пул процессов анализа; создаётся при первом обращении."""
+        if self._pool is None:
+            from workers import AnalysisPool
+            self._pool = AnalysisPool()
+        return self._pool
+
+    def _source(self, idx: int) -> dict:
+        """Источник сигнала трека для задачи пула (общая память или путь)."""
+        tr = self.playlist[idx]
+        return self.pool.source(tr.path, tr.original_data, tr.original_fs)
+
+    def submit_eq_render(self, tr, y, gains, eq_bands, segment=None, priority=None):
+        """
+        Ставит рендер эквалайзера трека tr (сигнал y) в пул: весь сигнал
+        (тишина не фильтруется — только активные участки) или фрагмент
+        segment с разгоном фильтра EQ_PREROLL_SEC. Исходный сигнал и
+        результат лежат в общей памяти, WAV пишет рабочий процесс.
+        Future задачи возвращает EqRender.
+        """
+        from multiprocessing import shared_memory
+        from workers import job_eq, PRIORITY_INTERACTIVE
+        prio = PRIORITY_INTERACTIVE if priority is None else priority
+        regions = bounds = out = None
+        offset = 0.0
+        if segment is None:
+            amap = activity_for(y, self.fs, tr.path)
+            if amap.active_fraction < ACTIVE_SKIP_FRACTION:
+                regions = amap.regions()
+            out = shared_memory.SharedMemory(create=True, size=max(1, len(y) * 4))
+        else:
+            start, end = segment
+            pre = min(start, EQ_PREROLL_SEC)
+            bounds = (int((start - pre) * self.fs), int(end * self.fs), int(pre * self.fs))
+            offset = start
+        fd, wav = tempfile.mkstemp(suffix='.wav', prefix='eq-')
+        os.close(fd)
+        n = len(y)
+
+        def collect(scale_db):
+            data = None
+            if out is not None:
+                data = np.ndarray((n,), dtype=np.float32, buffer=out.buf).copy()
+            return EqRender(wav, data, scale_db, offset)
+
+        def cleanup(job):
+            # Выходной блок и WAV неудачного или отменённого рендера удаляются,
+            # когда процесс закончил с ними работать
+            if out is not None:
+                out.close()
+                out.unlink()
+            fut = job.future
+            if (fut.cancelled() or fut.exception() is not None) and os.path.exists(wav):
+                os.remove(wav)
+
+        return self.pool.submit(job_eq, self.pool.source(tr.path, y, self.fs), wav, list(gains),
+                                self.fs, list(eq_bands), regions, bounds,
+                                self._render_scale_db(tr, gains),
+                                None if out is None else out.name,
+                                priority=prio, transform=collect, tag='eq', cleanup=cleanup)
+
+    def _pool_vectors(self, paths):
+        """
+        Векторы треков для кластеризации (как clustering.track_vectors) из
+        пула процессов: файлы декодируются и считаются параллельно на всех
+        ядрах. Возвращает (пути, матрица (N, n_mfcc + 12)); упавшие пропускаются.
+        """
+        from workers import job_track_vector, gather, PRIORITY_BACKGROUND
+        jobs = {p: self.pool.submit(job_track_vector, self.pool.source(p),
+                                    priority=PRIORITY_BACKGROUND, tag='features')
+                for p in paths}
+        vectors = gather(jobs).result()
+        ok = [p for p in paths if p in vectors]
+        if not ok:
+            return ok, np.zeros((0, 25), dtype=np.float32)
+        return ok, np.stack([vectors[p] for p in ok]).astype(np.float32)
+
+    def shutdown(self):
+        """Останавливает пул анализа и освобождает общую память."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._scores is not None:
+            self._scores.close()
+            self._scores = None
+        self._cancel_stream()
+        self._cancel_stretch()
+        if self._stretch_pool is not None:
+            self._stretch_pool.shutdown(wait=False, cancel_futures=True)
+            self._stretch_pool = None
+        self._stretch_cache.clear()
+        self._eq_cache.clear()
+        if self._loudness_pool is not None:
+            self._loudness_pool.shutdown(wait=False, cancel_futures=True)
+            self._loudness_pool = None
+
+    def find_segment(self, y_seg, sr, paths, top_k: int = 20, on_progress=None) -> list[tuple]:
+        """
+        Ищет фрагмент y_seg во всех треках paths.
+        Возвращает [(путь трека, смещение в секундах, сходство)].
+        Вызывается из фонового потока; paths — снимок плейлиста.
+        """
+        from segment_search import search_segment
+        if y_seg is None or len(y_seg) == 0:
+            return []
+        hits = search_segment(y_seg, sr, paths, top_k, on_progress=on_progress)
+        return [(paths[idx], offset, sim) for idx, offset, sim in hits]
+
+    @perf.timed('audio.cluster_tracks')
+    def cluster_tracks(self, paths, k: int = DEFAULT_CLUSTERS) -> list[list[str]]:
+        """
+        Группирует треки paths по сходству. Модель и векторы сохраняются
+        между вызовами: при том же k считаются только новые файлы.
+        Вызывается из фонового потока; paths — снимок плейлиста.
+        """
+        if self.clusters is None or self.clusters.k != k:
+            self.clusters = TrackClusters(k, vectorize=self._pool_vectors)
+        self.clusters.add(paths)
+        return self.clusters.groups(paths)
+
+    @perf.timed('audio.find_duplicates')
+    def find_duplicates(self, paths) -> list[list[str]]:
+        """
+        Ищет среди paths дубликаты и перекодировки по акустическим отпечаткам.
+        Возвращает группы путей. Вызывается из фонового потока; paths — снимок плейлиста.
+        """
+        return [[paths[i] for i in group] for group in find_duplicate_groups(paths)]
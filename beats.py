@@ -0,0 +1,98 @@
+# beats.py
+
+import os
+import numpy as np
+import perf
+from features import FEAT_HOP
+
+# Пулинг кадров перед DTW (GSA_DTW_POOLING): '' — покадрово,
+# 'beats' — по долям (с окнами для неритмичного материала), 'window' — окнами
+POOLING_MODES = ('', 'beats', 'window')
+DTW_POOLING = os.environ.get('GSA_DTW_POOLING', '')
+if DTW_POOLING not in POOLING_MODES:
+    DTW_POOLING = ''
+# Длина окна пулинга для неритмичного материала и режима 'window', сек
+POOL_WINDOW_SEC = 0.5
+# Меньше долей — материал считается неритмичным
+MIN_BEATS = 8
+# Коэффициент вариации межударных интервалов, выше которого сетка долей не используется
+MAX_BEAT_CV = 0.35
+# Версия дискового кэша долей: меняется вместе с SIMILARITY_VERSION
+# (доли считаются по тем же кадрам, сейчас — по сигналу без тишины)
+BEATS_VERSION = 2
+
+# Кэш долей: path -> кадры долей (int32)
+_beat_cache: dict[str, np.ndarray] = {}
+_disk_cache = None
+
+
+def _store():
+    global _disk_cache
+    if _disk_cache is None:
+        from feature_cache import FeatureCache
+        _disk_cache = FeatureCache(kind='beats', version=BEATS_VERSION)
+    return _disk_cache
+
+
+def estimate_beats(onset: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Кадры долей (сетка FEAT_HOP) по огибающей атак onset; пустой массив,
+    если доли не найдены или сетка слишком неровная.
+    """
+    import librosa
+    with perf.span('beats.track'):
+        _, beats = librosa.beat.beat_track(onset_envelope=onset, sr=sr, hop_length=FEAT_HOP)
+    beats = np.unique(np.asarray(beats, dtype=np.int32))
+    if len(beats) < MIN_BEATS:
+        return beats[:0]
+    ibi = np.diff(beats)
+    if ibi.std() > MAX_BEAT_CV * ibi.mean():
+        return beats[:0]
+    return beats
+
+
+def track_beats(onset: np.ndarray, sr: int, path: str = None) -> np.ndarray:
+    """Доли трека: из памяти или с диска по path, иначе оцениваются по onset и кэшируются."""
+    if path is not None:
+        beats = _beat_cache.get(path)
+        if beats is None:
+            cached = _store().get(path)
+            beats = None if cached is None else cached['beats']
+        if beats is not None:
+            perf.cache_hit('beats')
+            _beat_cache[path] = beats
+            return beats
+        perf.cache_miss('beats')
+    beats = estimate_beats(onset, sr)
+    if path is not None:
+        _beat_cache[path] = beats
+        try:
+            _store().put(path, {'beats': beats})
+        except OSError:
+            pass
+    return beats
+
+
+def segment_bounds(n_frames: int, sr: int, beats=None) -> np.ndarray:
+    """
+    Начала сегментов пулинга: доли, если они есть, иначе окна
+    POOL_WINDOW_SEC. Первый сегмент всегда начинается с кадра 0.
+    """
+    if beats is not None and len(beats):
+        bounds = beats[(beats > 0) & (beats < n_frames)]
+    else:
+        step = max(1, int(round(POOL_WINDOW_SEC * sr / FEAT_HOP)))
+        bounds = np.arange(step, n_frames, step)
+    return np.concatenate([[0], bounds]).astype(np.int64)
+
+
+def pool_frames(X: np.ndarray, bounds: np.ndarray):
+    """
+    Средние кадров X (T, D) по сегментам [bounds[i], bounds[i+1]).
+    Возвращает (пулированные кадры, средняя длина сегмента в кадрах).
+    """
+    if len(X) == 0:
+        return X, 1.0
+    pooled = np.add.reduceat(X, bounds, axis=0)
+    sizes = np.diff(np.append(bounds, len(X)))
+    return (pooled / sizes[:, None]).astype(np.float32), len(X) / len(bounds)
@@ -0,0 +1,187 @@
+# bench.py
+
+"""
+Бенчмарки горячих путей: декодирование, эквалайзер, подготовка графиков,
+спектр/спектрограмма, признаки, DTW и сходство по плейлисту.
+
+Работает без дисплея и аудиоустройства:
+    python bench.py --out bench.json
+    python bench.py --baseline bench_baseline.json     # сравнить с эталоном
+    python bench.py --save-baseline bench_baseline.json
+"""
+
+import os, sys, json, time, argparse, tempfile, tracemalloc, platform, statistics
+
+# Без дисплея: Qt-модули импортируются, но окна не создаются
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+import scipy.io.wavfile as wavfile
+
+# Конфигурации синтетических фикстур: (длительность, sr, каналы)
+QUICK_FIXTURES = [(5, 22050, 1), (30, 44100, 2)]
+FULL_FIXTURES  = [(5, 22050, 1), (30, 22050, 1), (30, 44100, 2), (180, 44100, 2)]
+
+EQ_BANDS = [60, 250, 1000, 4000, 16000]
+EQ_GAINS = [6, -3, 2, 4, -6]
+
+
+def make_fixture(duration: float, sr: int, channels: int, seed: int = 0) -> np.ndarray:
+    """
+    Детерминированный синтетический сигнал: аккорд из синусов с огибающей,
+    слабый шум и паузы — похоже на музыку, но одинаково на любой машине.
+    Возвращает float32-массив shape (n,) или (n, channels).
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration * sr)
+    t = np.arange(n) / sr
+    y = np.zeros(n, dtype=np.float64)
+    for f0 in rng.uniform(80, 2000, size=6):
+        y += np.sin(2 * np.pi * f0 * t) * (0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(0.1, 2) * t))
+    y /= 6
+    y += 0.01 * rng.standard_normal(n)
+    # Паузы по 0.5 с каждые 5 с
+    y[(t % 5) > 4.5] *= 0.001
+    if channels > 1:
+        y = np.stack([np.roll(y, k * 17) for k in range(channels)], axis=1)
+    return (0.8 * y).astype(np.float32)
+
+
+def write_fixtures(configs, directory: str) -> list[dict]:
+    """Пишет WAV-фикстуры в directory, возвращает их описания."""
+    fixtures = []
+    for i, (duration, sr, ch) in enumerate(configs):
+        y = make_fixture(duration, sr, ch, seed=i)
+        path = os.path.join(directory, f"fixture_{duration}s_{sr}_{ch}ch.wav")
+        wavfile.write(path, sr, np.int16(y * 32767))
+        fixtures.append({'name': f"{duration}s/{sr}Hz/{ch}ch", 'path': path,
+                         'duration': duration, 'sr': sr, 'channels': ch})
+    return fixtures
+
+
+def measure(fn, repeat: int = 3) -> dict:
+    """
+    Запускает fn repeat раз. Время — медиана и минимум,
+    память — пик tracemalloc за отдельный прогон.
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'median_s': statistics.median(times), 'min_s': min(times),
+            'peak_mem_mb': peak / 2**20}
+
+
+def run_benchmarks(fixtures, repeat: int = 3) -> dict:
+    import librosa
+    import similarity
+    from eq import apply_equalizer
+    from plotting import waveform_data, spectrum_data, spectrogram_data
+    from playlist import Playlist, Track
+
+    def clear_caches():
+        similarity._mfcc_cache.clear()
+        similarity._chroma_cache.clear()
+        similarity._track_features_cache.clear()
+
+    results = {}
+    decoded = []
+    for fx in fixtures:
+        name, path = fx['name'], fx['path']
+        y, sr = librosa.load(path, sr=None, mono=True)
+        decoded.append((path, y, sr))
+
+        cases = {
+            'decode':       lambda: librosa.load(path, sr=None, mono=True),
+            'eq_full':      lambda: apply_equalizer(y, EQ_GAINS, sr, EQ_BANDS),
+            'waveform_rms': lambda: waveform_data(y, sr),
+            'spectrum':     lambda: spectrum_data(y, sr),
+            'spectrogram':  lambda: spectrogram_data(y),
+            'features':     lambda: (clear_caches(), similarity.extract_mfcc(path),
+                                     similarity.extract_chroma(path)),
+        }
+        for case, fn in cases.items():
+            key = f"{case}[{name}]"
+            results[key] = measure(fn, repeat)
+            print(f"{key:36s} {results[key]['median_s']:.4f} s", file=sys.stderr)
+
+    # Признаки всех фикстур одним батчем (один STFT на трек)
+    paths = [p for p, _, _ in decoded]
+    results['features[batch]'] = measure(lambda: (clear_caches(), similarity.extract_many(paths)),
+                                         repeat)
+
+    # DTW между первой парой фикстур и сходство по всему «плейлисту»
+    if len(decoded) >= 2:
+        p1, p2 = decoded[0][0], decoded[1][0]
+        results['dtw[pair]'] = measure(lambda: (clear_caches(), similarity.mfcc_dtw_distance(p1, p2)),
+                                       repeat)
+        playlist = Playlist(Track(p, None, len(y) / sr, None, sr) for p, y, sr in decoded)
+        comps = list(range(1, len(playlist)))
+        results['similarity[playlist]'] = measure(
+            lambda: (clear_caches(), similarity.compute_similarity_indices(playlist, 0, comps)),
+            repeat)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Сравнивает медианы с эталоном. Возвращает список регрессий —
+    случаев, ставших медленнее больше чем на tolerance (доля).
+    """
+    regressions = []
+    base = baseline.get('results', baseline)
+    for case, res in results.items():
+        old = base.get(case)
+        if not old:
+            continue
+        ratio = res['median_s'] / max(old['median_s'], 1e-9)
+        if ratio > 1 + tolerance:
+            regressions.append(f"{case}: {old['median_s']:.4f} s -> {res['median_s']:.4f} s "
+                               f"(x{ratio:.2f})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки gui-sound-app")
+    parser.add_argument('--full', action='store_true', help="длинные фикстуры (до 3 минут)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', help="куда записать результаты JSON")
+    parser.add_argument('--baseline', help="эталон для сравнения")
+    parser.add_argument('--save-baseline', help="сохранить результаты как эталон")
+    parser.add_argument('--tolerance', type=float, default=0.15,
+                        help="допустимое замедление (доля), по умолчанию 0.15")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='gsa-bench-') as tmp:
+        fixtures = write_fixtures(FULL_FIXTURES if args.full else QUICK_FIXTURES, tmp)
+        results = run_benchmarks(fixtures, args.repeat)
+
+    report = {
+        'python':   platform.python_version(),
+        'machine':  platform.machine(),
+        'numpy':    np.__version__,
+        'created':  time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results':  results,
+    }
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,216 @@
+# checks.py
+
+"""
+Проверки корректности оптимизированных путей: результат сверяется
+с эталонной (медленной или библиотечной) реализацией на синтетических
+сигналах из bench.make_fixture.
+
+Работает без дисплея и аудиоустройства:
+    python checks.py                # все проверки
+    python checks.py features pyramid
+Код возврата 1, если хотя бы одна проверка не прошла.
+"""
+
+import os, sys, argparse, tempfile, traceback, warnings
+
+# Без дисплея: Qt-модули импортируются, но окна не создаются
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+
+from bench import make_fixture
+
+# Допуск MFCC/хромы относительно librosa: доля от размаха эталона
+FEATURE_TOLERANCE = 1e-3
+
+
+def _close(actual, expected, tol: float, what: str):
+    """Максимальное отклонение не больше tol от размаха expected."""
+    actual, expected = np.asarray(actual, np.float64), np.asarray(expected, np.float64)
+    assert actual.shape == expected.shape, f"{what}: форма {actual.shape} != {expected.shape}"
+    scale = max(float(np.abs(expected).max()), 1e-9) if expected.size else 1.0
+    err = float(np.abs(actual - expected).max()) / scale if expected.size else 0.0
+    assert err <= tol, f"{what}: отклонение {err:.2e} > {tol:.0e}"
+
+
+def check_features():
+    """MFCC и хрома frame_features (один STFT на трек) против librosa."""
+    import librosa
+    from features import frame_features, FEAT_N_FFT, FEAT_HOP
+    signals = [(make_fixture(5, 22050, 1, seed=0), 22050),
+               (make_fixture(3, 44100, 1, seed=1), 44100),
+               (make_fixture(0.05, 22050, 1, seed=2), 22050)]
+    batch = frame_features(signals, n_mfcc=13)
+    # features._chunks центрирует кадры отражением, как librosa до 0.10
+    stft = dict(n_fft=FEAT_N_FFT, hop_length=FEAT_HOP, pad_mode='reflect')
+    for (y, sr), feats in zip(signals, batch):
+        with warnings.catch_warnings():
+            # Короткий сигнал: librosa предупреждает, что n_fft длиннее входа
+            warnings.simplefilter('ignore', UserWarning)
+            mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13, **stft)
+            chroma = librosa.feature.chroma_stft(y=y, sr=sr, tuning=0.0, **stft)
+        _close(feats['mfcc'], mfcc, FEATURE_TOLERANCE, f"mfcc[{len(y)}@{sr}]")
+        _close(feats['chroma'], chroma, FEATURE_TOLERANCE, f"chroma[{len(y)}@{sr}]")
+    # Батч не должен влиять на результат трека
+    for sig, feats in zip(signals, batch):
+        alone = frame_features([sig], n_mfcc=13)[0]
+        for name in feats:
+            np.testing.assert_array_equal(feats[name], alone[name], err_msg=name)
+
+
+def check_score_store():
+    """PairScoreStore: пары симметричны, версия отделяет оценки, большие запросы режутся."""
+    from score_store import PairScoreStore
+    tmp = tempfile.TemporaryDirectory(prefix='gsa-checks-')
+    path = os.path.join(tmp.name, 'scores.sqlite')
+    store = PairScoreStore(path, version=1)
+    store.put_many('b', {'a': (1.5, 0.25), 'c': (2.0, 0.5)})
+    assert store.get_many('a', ['b', 'c']) == {'b': (1.5, 0.25)}
+    assert store.get_many('b', ['a', 'c', 'a']) == {'a': (1.5, 0.25), 'c': (2.0, 0.5)}
+    store.put_many('a', {'b': (3.0, 0.75)})
+    assert store.get_many('b', ['a']) == {'a': (3.0, 0.75)}
+    keys = [f"k{i:04d}" for i in range(1200)]
+    store.put_many('ref', {k: (float(i), 0.0) for i, k in enumerate(keys)})
+    found = store.get_many('ref', keys + ['missing'])
+    assert len(found) == len(keys) and found['k1199'] == (1199.0, 0.0)
+    # Оценки другой версии признаков не видны и не затирают текущие
+    newer = PairScoreStore(path, version=2)
+    assert newer.get_many('a', ['b']) == {}
+    newer.put_many('a', {'b': (9.0, 0.0)})
+    assert store.get_many('a', ['b']) == {'b': (3.0, 0.75)}
+    newer.close()
+    store.close()
+    tmp.cleanup()
+
+
+def check_pyramid():
+    """LevelPyramid, заполненная блоками разной длины, против прямого расчёта по окнам."""
+    from streaming import LevelPyramid
+    sr, base, factor = 22050, 512, 4
+    y = make_fixture(7, sr, 1, seed=3)
+    pyr = LevelPyramid(sr, total_frames=len(y) // 3, base=base, factor=factor, levels=4)
+    rng = np.random.default_rng(0)
+    pos = 0
+    while pos < len(y):
+        step = int(rng.integers(1, 20000))
+        pyr.append(y[pos:pos + step])
+        pos += step
+    for k in range(4):
+        width = base * factor ** k
+        n = len(y) // base // factor ** k
+        w = y[:n * width].reshape(n, width)
+        times, mins, maxs, rms = pyr.view(n)
+        assert len(mins) == n, f"уровень {k}: {len(mins)} окон вместо {n}"
+        _close(times, (np.arange(n) + 0.5) * width / sr, 1e-9, f"times[{k}]")
+        np.testing.assert_array_equal(mins, w.min(axis=1))
+        np.testing.assert_array_equal(maxs, w.max(axis=1))
+        _close(rms, np.sqrt(np.mean(w.astype(np.float64) ** 2, axis=1)), 1e-5, f"rms[{k}]")
+
+
+def check_pool_frames():
+    """pool_frames: средние по сегментам и средняя длина сегмента."""
+    from beats import pool_frames
+    X = np.random.default_rng(1).standard_normal((10, 3)).astype(np.float32)
+    bounds = np.array([0, 3, 4, 9])
+    pooled, avg = pool_frames(X, bounds)
+    expected = [X[0:3].mean(0), X[3:4].mean(0), X[4:9].mean(0), X[9:].mean(0)]
+    _close(pooled, np.stack(expected), 1e-6, "pooled")
+    assert pooled.dtype == np.float32 and avg == 2.5
+    empty, avg = pool_frames(np.zeros((0, 3), np.float32), np.array([0]))
+    assert len(empty) == 0 and avg == 1.0
+
+
+def check_activity():
+    """ActivityMap: длинная пауза разделяет участки, короткая — нет; срез согласован."""
+    from activity import ActivityMap, rms_envelope, ACTIVITY_HOP, ACTIVITY_PAD_SEC
+    sr = 22050
+    tone = (0.5 * np.sin(2 * np.pi * 440 * np.arange(3 * sr) / sr)).astype(np.float32)
+    gap_long, gap_short = np.zeros(3 * sr, np.float32), np.zeros(sr // 2, np.float32)
+    y = np.concatenate([tone, gap_long, tone, gap_short, tone])
+    amap = ActivityMap.from_rms(rms_envelope(y), sr, ACTIVITY_HOP, len(y))
+    regions = amap.regions()
+    assert len(regions) == 2, f"участков {len(regions)}, ожидалось 2"
+    pad = int(ACTIVITY_PAD_SEC * sr / ACTIVITY_HOP) * ACTIVITY_HOP
+    hop = ACTIVITY_HOP
+    assert regions[0, 0] == 0 and abs(regions[0, 1] - (len(tone) + pad)) <= hop
+    assert abs(regions[1, 0] - (len(tone) + len(gap_long) - pad)) <= hop
+    assert regions[1, 1] == len(y)
+    assert amap.next_active(4.0) is not None and amap.next_active(1.0) is None
+    part = amap.slice(2.0, 8.0)
+    np.testing.assert_array_equal(part.mask, amap.mask[2 * sr // hop:-(-8 * sr // hop)])
+
+
+def check_fingerprint_index():
+    """FingerprintIndex: совпадения считаются по самому частому сдвигу, частые хэши пропускаются."""
+    from fingerprint import FingerprintIndex
+    rng = np.random.default_rng(2)
+    hashes = rng.choice(2 ** 30, size=500, replace=False).astype(np.uint32)
+    times = np.sort(rng.integers(0, 5000, size=500)).astype(np.int32)
+    index = FingerprintIndex(max_postings=3)
+    index.add(0, hashes, times)
+    index.add(1, hashes[:200], times[:200] + 40)
+    index.add(2, rng.choice(2 ** 30, size=300).astype(np.uint32), times[:300])
+    common = np.full(10, 7, dtype=np.uint32)
+    for tid in (3, 4, 5, 6):
+        index.add(tid, common, np.arange(10, dtype=np.int32))
+    index.build()
+    best = index.query(hashes, times)
+    assert best.get(0) == 500 and best.get(1) == 200, best
+    assert best.get(2, 0) < 5, best
+    assert index.query(common[:1], np.zeros(1, np.int32)) == {}
+
+
+def check_time_stretch():
+    """time_stretch_blocks: при rate=1 сигнал восстанавливается, длина меняется в 1/rate раз."""
+    from stretch import time_stretch_blocks, STRETCH_N_FFT
+    y = make_fixture(4, 22050, 1, seed=5)
+    same = np.concatenate(list(time_stretch_blocks(y, 1.0)))
+    assert abs(len(same) - len(y)) <= STRETCH_N_FFT, f"длина {len(same)} != {len(y)}"
+    edge = STRETCH_N_FFT
+    _close(same[edge:len(y) - edge], y[edge:len(y) - edge], 1e-3, "rate=1")
+    for rate in (0.5, 2.0):
+        out = np.concatenate(list(time_stretch_blocks(y, rate)))
+        expected = len(y) / rate
+        assert abs(len(out) - expected) <= 2 * STRETCH_N_FFT, f"rate={rate}: длина {len(out)}"
+        assert np.isfinite(out).all()
+
+
+CHECKS = {
+    'features':    check_features,
+    'score_store': check_score_store,
+    'pyramid':     check_pyramid,
+    'pool_frames': check_pool_frames,
+    'activity':    check_activity,
+    'fingerprint': check_fingerprint_index,
+    'stretch':     check_time_stretch,
+}
+
+
+def run_checks(names=None) -> list[str]:
+    """Запускает проверки names (по умолчанию все). Возвращает имена непрошедших."""
+    failed = []
+    for name in names or CHECKS:
+        try:
+            CHECKS[name]()
+        except Exception:
+            failed.append(name)
+            print(f"FAIL {name}", file=sys.stderr)
+            traceback.print_exc()
+        else:
+            print(f"ok   {name}", file=sys.stderr)
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Проверки корректности gui-sound-app")
+    parser.add_argument('names', nargs='*',
+                        help=f"какие проверки запустить: {', '.join(CHECKS)} (по умолчанию все)")
+    args = parser.parse_args(argv)
+    unknown = [n for n in args.names if n not in CHECKS]
+    if unknown:
+        parser.error(f"неизвестные проверки: {', '.join(unknown)}")
+    return 1 if run_checks(args.names) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
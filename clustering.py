@@ -0,0 +1,204 @@
+# clustering.py
+
+import numpy as np
+import perf
+
+# Число групп по умолчанию
+DEFAULT_CLUSTERS = 8
+# Треков в одном мини-батче k-means
+CLUSTER_BATCH = 1024
+# Проходов по данным при первом обучении (дальше — один проход по новым трекам)
+INIT_EPOCHS = 5
+# Треков в одном батче извлечения признаков
+FEATURE_BATCH = 8
+
+
+def track_vectors(paths, batch: int = FEATURE_BATCH):
+    """
+    Векторы треков для кластеризации — средний MFCC и хрома из similarity
+    (те же кэши, что у поиска похожих и индекса библиотеки).
+    Возвращает (пути, матрица (N, n_mfcc + 12)); нечитаемые файлы пропускаются.
+    """
+    from similarity import extract_many, extract_mfcc, extract_chroma
+    paths = list(paths)
+    ok, rows = [], []
+    for start in range(0, len(paths), batch):
+        group = paths[start:start + batch]
+        try:
+            extract_many(group)
+        except Exception:
+            pass  # ниже треки группы извлекаются по одному
+        for path in group:
+            try:
+                rows.append(np.concatenate([extract_mfcc(path), extract_chroma(path)]))
+            except Exception:
+                continue
+            ok.append(path)
+    X = np.stack(rows).astype(np.float32) if rows else np.zeros((0, 25), dtype=np.float32)
+    return ok, X
+
+
+class MiniBatchKMeans:
+    """
+    Мини-батч k-means (Sculley, 2010): центры обновляются порциями как
+    скользящее среднее назначенных им треков, поэтому новые треки
+    дообучают модель без пересчёта всей библиотеки, а матрица всех пар
+    не строится — только расстояния до k центров.
+    MFCC-часть стандартизуется по среднему и дисперсии первого обучения
+    (дальше они заморожены: иначе уже обученные центры оказались бы
+    в другом пространстве), обе части нормируются и взвешиваются
+    как в combined_similarity.
+    """
+
+    def __init__(self, k: int = DEFAULT_CLUSTERS, n_mfcc: int = 13,
+                 w_mfcc: float = 0.6, w_chroma: float = 0.4, seed: int = 0):
+        self.k        = k
+        self.n_mfcc   = n_mfcc
+        self.w_mfcc   = w_mfcc
+        self.w_chroma = w_chroma
+        self.centers  = None
+        self.counts   = None
+        self._n    = 0
+        self._mean = None
+        self._m2   = None
+        self._rng  = np.random.default_rng(seed)
+
+    def _update_stats(self, X: np.ndarray):
+        """Дополняет среднее и сумму квадратов отклонений MFCC-части (формула Чана)."""
+        mf = X[:, :self.n_mfcc].astype(np.float64)
+        n_b = len(mf)
+        mean_b = mf.mean(axis=0)
+        m2_b = ((mf - mean_b) ** 2).sum(axis=0)
+        if self._n == 0:
+            self._mean, self._m2 = mean_b, m2_b
+        else:
+            n = self._n + n_b
+            delta = mean_b - self._mean
+            self._mean = self._mean + delta * n_b / n
+            self._m2 = self._m2 + m2_b + delta ** 2 * self._n * n_b / n
+        self._n += n_b
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """Векторы треков -> пространство кластеризации (float32)."""
+        X = np.asarray(X, dtype=np.float32)
+        sigma = np.sqrt(self._m2 / max(self._n, 1)) + 1e-9
+        mf = (X[:, :self.n_mfcc] - self._mean) / sigma
+        parts = []
+        for block, w in ((mf, self.w_mfcc), (X[:, self.n_mfcc:], self.w_chroma)):
+            block = block / (np.linalg.norm(block, axis=1, keepdims=True) + 1e-9)
+            parts.append(np.sqrt(w) * block)
+        return np.hstack(parts).astype(np.float32)
+
+    def _seed_centers(self, Z: np.ndarray):
+        """Добирает центры до k по k-means++ из батча Z (первый батч мог быть меньше k)."""
+        centers = [] if self.centers is None else list(self.centers)
+        if not centers:
+            centers.append(Z[self._rng.integers(len(Z))])
+        d2 = np.min([((Z - c) ** 2).sum(axis=1) for c in centers], axis=0)
+        while len(centers) < self.k and d2.sum() > 0:
+            c = Z[self._rng.choice(len(Z), p=d2 / d2.sum())]
+            centers.append(c)
+            d2 = np.minimum(d2, ((Z - c) ** 2).sum(axis=1))
+        added = len(centers) - (0 if self.centers is None else len(self.centers))
+        self.centers = np.stack(centers).astype(np.float32)
+        self.counts = np.concatenate([self.counts if self.counts is not None else np.zeros(0),
+                                      np.zeros(added)])
+
+    def _assign(self, Z: np.ndarray) -> np.ndarray:
+        # |z - c|² = |z|² - 2 z·c + |c|², |z|² для строки постоянно
+        d = (self.centers ** 2).sum(axis=1) - 2.0 * (Z @ self.centers.T)
+        return np.argmin(d, axis=1)
+
+    @perf.timed('clusters.partial_fit')
+    def partial_fit(self, X: np.ndarray, epochs: int = 1):
+        """Дообучает модель на векторах X (N, D) мини-батчами по CLUSTER_BATCH."""
+        if len(X) == 0:
+            return self
+        # Статистики стандартизации — только до появления центров
+        if self.centers is None:
+            self._update_stats(X)
+        Z = self.transform(X)
+        for _ in range(epochs):
+            order = self._rng.permutation(len(Z))
+            for start in range(0, len(Z), CLUSTER_BATCH):
+                B = Z[order[start:start + CLUSTER_BATCH]]
+                if self.centers is None or len(self.centers) < self.k:
+                    self._seed_centers(B)
+                labels = self._assign(B)
+                # Для каждого центра: c += (m / count) * (среднее батча - c),
+                # то же, что поштучное обновление с шагом 1/count
+                for j in np.unique(labels):
+                    members = B[labels == j]
+                    self.counts[j] += len(members)
+                    self.centers[j] += len(members) / self.counts[j] * (members.mean(axis=0) - self.centers[j])
+        return self
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Номер кластера для каждой строки X."""
+        out = np.empty(len(X), dtype=np.int32)
+        for start in range(0, len(X), CLUSTER_BATCH):
+            out[start:start + CLUSTER_BATCH] = self._assign(self.transform(X[start:start + CLUSTER_BATCH]))
+        return out
+
+
+class TrackClusters:
+    """
+    Кластеры библиотеки: векторы треков по путям и модель k-means,
+    которые дополняются при добавлении файлов. Метки пересчитываются
+    по всем векторам (N × k расстояний), так что старые треки
+    переходят в сдвинувшиеся группы. vectorize(paths) -> (пути, матрица)
+    извлекает векторы (по умолчанию track_vectors в этом процессе).
+    """
+
+    def __init__(self, k: int = DEFAULT_CLUSTERS, vectorize=None):
+        self.k     = k
+        self.model = MiniBatchKMeans(k)
+        self.vectorize = vectorize or track_vectors
+        self.paths: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._X = np.zeros((0, 25), dtype=np.float32)
+        self._labels = None
+        # Нечитаемые файлы: path -> (size, mtime); повторно пробуются, только если файл изменился
+        self._failed: dict[str, tuple] = {}
+
+    def __len__(self):
+        return len(self.paths)
+
+    def add(self, paths) -> int:
+        """Извлекает векторы новых треков и дообучает модель. Возвращает число добавленных."""
+        from utils import file_signature
+        new = [p for p in dict.fromkeys(paths) if p not in self._rows
+               and (p not in self._failed or self._failed[p] != file_signature(p))]
+        if not new:
+            return 0
+        ok, X = self.vectorize(new)
+        done = set(ok)
+        for p in new:
+            if p in done:
+                self._failed.pop(p, None)
+            else:
+                self._failed[p] = file_signature(p)
+        if not ok:
+            return 0
+        self.model.partial_fit(X, epochs=INIT_EPOCHS if not self.paths else 1)
+        for p in ok:
+            self._rows[p] = len(self.paths)
+            self.paths.append(p)
+        self._X = np.vstack([self._X, X]) if len(self._X) else X
+        self._labels = None
+        return len(ok)
+
+    def labels(self) -> np.ndarray:
+        if self._labels is None:
+            self._labels = self.model.predict(self._X)
+        return self._labels
+
+    def groups(self, paths) -> list[list[str]]:
+        """Пути из paths по группам (по убыванию размера); треки без векторов пропускаются."""
+        labels = self.labels()
+        by_label: dict[int, list[str]] = {}
+        for p in paths:
+            row = self._rows.get(p)
+            if row is not None:
+                by_label.setdefault(int(labels[row]), []).append(p)
+        return sorted(by_label.values(), key=len, reverse=True)
@@ -3,17 +3,26 @@
 from PyQt5.QtWidgets import (
     QDialog, QVBoxLayout, QTabWidget, QWidget,
     QTableWidget, QTableWidgetItem, QHeaderView, QLineEdit,
-    QPushButton, QSizePolicy, QLabel
+    QPushButton, QSizePolicy, QLabel, QTreeWidget, QTreeWidgetItem,
+    QHBoxLayout, QCheckBox, QFileDialog, QDoubleSpinBox
 )
 from PyQt5.QtCore import Qt
 import pyqtgraph as pg
 from utils import format_time
+import perf
 
 class SimilarityTableDialog(QDialog):
-    def __init__(self, parent, ref_idx: int, results: dict[int, float], playlist: list[dict]):
+    def __init__(self, parent, ref_idx: int, results: dict[int, float], playlist: list[dict],
+                 components=None):
+        """
+        components — (индексы, DTW-расстояния, косинусы хрома) из
+        AudioController.similarity_components; если заданы, веса и alpha
+        можно менять прямо в окне, таблица пересчитывается без анализа.
+        """
         super().__init__(parent)
         self.playlist = playlist
         self.ref_idx = ref_idx
+        self.components = components
 
         self.setWindowTitle("Сходство треков")
         self.resize(800, 600)
@@ -26,16 +35,21 @@ class SimilarityTableDialog(QDialog):
         lbl.setStyleSheet("font-weight: bold; font-size: 16px;")
         lo.addWidget(lbl)
 
+        # Веса метрики
+        if components is not None:
+            weights = QHBoxLayout()
+            self.w_mfcc   = self._spin(weights, "MFCC (DTW):", 0.6, 0.0, 1.0, 0.05, 2)
+            self.w_chroma = self._spin(weights, "Хрома:", 0.4, 0.0, 1.0, 0.05, 2)
+            self.alpha    = self._spin(weights, "alpha:", 0.0005, 0.0, 0.1, 0.0001, 5)
+            lo.addLayout(weights)
+
         # Поиск
         self.search = QLineEdit(self)
         self.search.setPlaceholderText("Поиск по названию...")
         lo.addWidget(self.search)
 
-        # Подготовка данных
-        self.sorted_items = sorted(results.items(), key=lambda x: -x[1])
-
         # Таблица: Трек, Длительность, Сходство
-        self.table = QTableWidget(len(self.sorted_items), 3, self)
+        self.table = QTableWidget(len(results), 3, self)
         self.table.setHorizontalHeaderLabels(["Трек", "Длительность", "Сходство"])
         self.table.setEditTriggers(QTableWidget.NoEditTriggers)
         self.table.setSelectionBehavior(QTableWidget.SelectRows)
@@ -47,9 +61,38 @@ class SimilarityTableDialog(QDialog):
         hdr = self.table.horizontalHeader()
         hdr.setSectionResizeMode(QHeaderView.Stretch)
 
-        # Заполнение
+        self._populate(results)
+        
+        lo.addWidget(self.table)
+
+        # Закрыть
+        btn = QPushButton("Закрыть", self)
+        btn.clicked.connect(self.accept)
+        lo.addWidget(btn)
+
+        # Сигналы
+        self.search.textChanged.connect(self._filter_rows)
+        self.table.itemDoubleClicked.connect(self._on_double_click)
+        if components is not None:
+            for spin in (self.w_mfcc, self.w_chroma, self.alpha):
+                spin.valueChanged.connect(self._reweight)
+
+    def _spin(self, layout, text, value, lo, hi, step, decimals):
+        spin = QDoubleSpinBox(self)
+        spin.setRange(lo, hi)
+        spin.setDecimals(decimals)
+        spin.setSingleStep(step)
+        spin.setValue(value)
+        layout.addWidget(QLabel(text, self))
+        layout.addWidget(spin)
+        return spin
+
+    def _populate(self, results: dict[int, float]):
+        """Заполняет таблицу оценками {idx: score}, по убыванию сходства."""
+        self.sorted_items = sorted(results.items(), key=lambda x: -x[1])
+        self.table.setSortingEnabled(False)
         for row, (idx, score) in enumerate(self.sorted_items):
-            tr = playlist[idx]
+            tr = self.playlist[idx]
             title = tr["title"]
             dur_ms = int(tr["duration"] * 1000)
             perc = f"{score*100:.1f}%"
@@ -66,7 +109,199 @@ class SimilarityTableDialog(QDialog):
 
         self.table.setSortingEnabled(True)
         self.table.sortItems(2, Qt.DescendingOrder)
-        
+        self._filter_rows(self.search.text())
+
+    def _reweight(self):
+        """Пересчитывает оценки из сырых компонент с новыми весами и alpha."""
+        from similarity import combine_scores
+        idxs, dtw, chroma = self.components
+        scores = combine_scores(dtw, chroma, self.w_mfcc.value(),
+                                self.w_chroma.value(), self.alpha.value())
+        self._populate(dict(zip(idxs.tolist(), scores.tolist())))
+
+    def _filter_rows(self, text: str):
+        matched = set(self.playlist.filter_title(text).tolist())
+        for row in range(self.table.rowCount()):
+            idx = self.table.item(row, 0).data(Qt.UserRole)
+            self.table.setRowHidden(row, idx not in matched)
+
+    def _on_double_click(self, item: QTableWidgetItem):
+        idx = self.table.item(item.row(), 0).data(Qt.UserRole)
+        self.parent().play_track_at(idx, 0)
+        self.accept()
+
+
+class DuplicateGroupsDialog(QDialog):
+    def __init__(self, parent, groups: list[list[int]], playlist):
+        super().__init__(parent)
+        self.playlist = playlist
+
+        self.setWindowTitle("Дубликаты")
+        self.resize(800, 600)
+
+        lo = QVBoxLayout(self)
+
+        lbl = QLabel(f"Найдено групп: {len(groups)}", self)
+        lbl.setAlignment(Qt.AlignCenter)
+        lbl.setStyleSheet("font-weight: bold; font-size: 16px;")
+        lo.addWidget(lbl)
+
+        # Дерево: группа -> треки
+        self.tree = QTreeWidget(self)
+        self.tree.setHeaderLabels(["Трек", "Длительность", "Путь"])
+        self.tree.setAlternatingRowColors(True)
+        self.tree.header().setSectionResizeMode(QHeaderView.ResizeToContents)
+        for n, group in enumerate(groups, start=1):
+            parent_item = QTreeWidgetItem([f"Группа {n} ({len(group)})", "", ""])
+            for idx in group:
+                tr = playlist[idx]
+                dur_ms = int(tr["duration"] * 1000)
+                item = QTreeWidgetItem([tr["title"], format_time(dur_ms), tr["path"]])
+                item.setData(0, Qt.UserRole, idx)
+                parent_item.addChild(item)
+            self.tree.addTopLevelItem(parent_item)
+        self.tree.expandAll()
+        lo.addWidget(self.tree)
+
+        # Закрыть
+        btn = QPushButton("Закрыть", self)
+        btn.clicked.connect(self.accept)
+        lo.addWidget(btn)
+
+        self.tree.itemDoubleClicked.connect(self._on_double_click)
+
+    def _on_double_click(self, item: QTreeWidgetItem, column: int):
+        idx = item.data(0, Qt.UserRole)
+        if idx is None:
+            return
+        self.parent().play_track_at(idx, 0)
+        self.accept()
+
+
+class PerformanceDialog(QDialog):
+    """
+    Сводка инструментовки perf: время тяжёлых операций и счётчики кэшей.
+    """
+    COLUMNS = ["Операция", "Вызовов", "Всего, мс", "Среднее, мс", "Макс, мс", "МБ"]
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setWindowTitle("Производительность")
+        self.resize(800, 600)
+
+        lo = QVBoxLayout(self)
+
+        self.enabled_box = QCheckBox("Включить измерения", self)
+        self.enabled_box.setChecked(perf.is_enabled())
+        lo.addWidget(self.enabled_box)
+
+        # Интервалы
+        self.table = QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setAlternatingRowColors(True)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        lo.addWidget(self.table, stretch=3)
+
+        # Счётчики (попадания/промахи кэшей, байты)
+        self.counters = QTableWidget(0, 2, self)
+        self.counters.setHorizontalHeaderLabels(["Счётчик", "Значение"])
+        self.counters.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.counters.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        lo.addWidget(self.counters, stretch=1)
+
+        # Задержки цикла событий от сторожа GUI-потока (если он запущен)
+        self.watchdog = getattr(parent, 'watchdog', None)
+        if self.watchdog is not None:
+            self.latency_label = QLabel(self)
+            self.latency_label.setWordWrap(True)
+            lo.addWidget(self.latency_label)
+
+        buttons = QHBoxLayout()
+        refresh_btn = QPushButton("Обновить", self)
+        reset_btn   = QPushButton("Сбросить", self)
+        export_btn  = QPushButton("Экспорт трассы...", self)
+        close_btn   = QPushButton("Закрыть", self)
+        for btn in (refresh_btn, reset_btn, export_btn, close_btn):
+            buttons.addWidget(btn)
+        lo.addLayout(buttons)
+
+        self.enabled_box.toggled.connect(perf.enable)
+        refresh_btn.clicked.connect(self.refresh)
+        reset_btn.clicked.connect(self._on_reset)
+        export_btn.clicked.connect(self._on_export)
+        close_btn.clicked.connect(self.accept)
+
+        self.refresh()
+
+    def refresh(self):
+        rows = perf.summary()
+        self.table.setRowCount(len(rows))
+        for row, r in enumerate(rows):
+            values = [r['name'], str(r['calls']), f"{r['total_ms']:.1f}",
+                      f"{r['mean_ms']:.2f}", f"{r['max_ms']:.1f}", f"{r['mbytes']:.1f}"]
+            for col, v in enumerate(values):
+                self.table.setItem(row, col, QTableWidgetItem(v))
+
+        cnt = sorted(perf.counters().items())
+        self.counters.setRowCount(len(cnt))
+        for row, (name, value) in enumerate(cnt):
+            self.counters.setItem(row, 0, QTableWidgetItem(name))
+            self.counters.setItem(row, 1, QTableWidgetItem(str(value)))
+
+        if self.watchdog is not None:
+            hist = ", ".join(f"{label}: {n}" for label, n in self.watchdog.histogram_rows() if n)
+            stalls = [f"{s['slot']} — {s['duration_ms']:.0f} мс" for s in list(self.watchdog.stalls)[-5:]]
+            text = (f"Задержка цикла событий (макс. {self.watchdog.max_latency_ms:.0f} мс): {hist}"
+                    f"\nЗависания: {len(self.watchdog.stalls)}")
+            if stalls:
+                text += "\n" + "\n".join(stalls)
+            self.latency_label.setText(text)
+
+    def _on_reset(self):
+        perf.reset()
+        self.refresh()
+
+    def _on_export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Trace", "trace.json",
+                                              "Chrome Trace (*.json)")
+        if path:
+            perf.export_chrome_trace(path)
+
+
+class SegmentSearchDialog(QDialog):
+    def __init__(self, parent, hits: list[tuple], playlist):
+        super().__init__(parent)
+        self.playlist = playlist
+
+        self.setWindowTitle("Поиск фрагмента")
+        self.resize(800, 600)
+
+        lo = QVBoxLayout(self)
+
+        lbl = QLabel(f"Найдено совпадений: {len(hits)}", self)
+        lbl.setAlignment(Qt.AlignCenter)
+        lbl.setStyleSheet("font-weight: bold; font-size: 16px;")
+        lo.addWidget(lbl)
+
+        # Таблица: Трек, Позиция, Сходство (уже по убыванию сходства)
+        self.table = QTableWidget(len(hits), 3, self)
+        self.table.setHorizontalHeaderLabels(["Трек", "Позиция", "Сходство"])
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setAlternatingRowColors(True)
+        self.table.verticalHeader().setDefaultSectionSize(30)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+
+        for row, (idx, offset, score) in enumerate(hits):
+            item_t = QTableWidgetItem(playlist[idx]["title"])
+            item_t.setData(Qt.UserRole, (idx, offset))
+            item_p = QTableWidgetItem(format_time(int(offset * 1000)))
+            item_s = QTableWidgetItem(f"{score*100:.1f}%")
+            item_s.setToolTip(f"{score:.4f}")
+            self.table.setItem(row, 0, item_t)
+            self.table.setItem(row, 1, item_p)
+            self.table.setItem(row, 2, item_s)
         lo.addWidget(self.table)
 
         # Закрыть
@@ -74,18 +309,8 @@ class SimilarityTableDialog(QDialog):
         btn.clicked.connect(self.accept)
         lo.addWidget(btn)
 
-        # Сигналы
-        self.search.textChanged.connect(self._filter_rows)
         self.table.itemDoubleClicked.connect(self._on_double_click)
 
-    def _filter_rows(self, text: str):
-        text = text.lower().strip()
-        for row, (idx, _) in enumerate(self.sorted_items):
-            title = self.playlist[idx]["title"].lower()
-            self.table.setRowHidden(row, text not in title)
-
     def _on_double_click(self, item: QTableWidgetItem):
-        idx = self.table.item(item.row(), 0).data(Qt.UserRole)
-        self.parent().playlistWidget.setCurrentRow(idx)
-        self.parent().update_ui_for_current_track()
-        self.accept()
\ No newline at end of file
+        idx, offset = self.table.item(item.row(), 0).data(Qt.UserRole)
+        self.parent().play_track_at(idx, offset)
@@ -0,0 +1,205 @@
+# embedding_index.py
+
+"""
+Компактный индекс эмбеддингов треков для поиска похожих в больших библиотеках
+(строится через analyze.py --index).
+
+    python embedding_index.py results/index /mnt/share/music/song.flac --top-k 10
+
+Папка индекса: vectors.npy — одна непрерывная матрица (float16 или int8)
+читается через memmap, scales.npy — масштабы строк для int8,
+meta.json — параметры эмбеддинга (стандартизация, веса, PCA) и таблица путей
+(строка матрицы i соответствует paths[i]).
+"""
+
+import os, sys, json, argparse
+import numpy as np
+
+INDEX_VERSION = 1
+# Строк матрицы на один блок скалярных произведений
+QUERY_BLOCK = 65536
+
+
+def fit_embedding(feats: list[dict]) -> dict:
+    """Параметры стандартизации MFCC-статистик по набору сводных признаков."""
+    mf = np.stack([np.concatenate([f['mfcc_mean'], f['mfcc_std']]) for f in feats])
+    return {'mu': mf.mean(axis=0), 'sigma': mf.std(axis=0) + 1e-9}
+
+
+def embed(feats: list[dict], params: dict, w_mfcc: float = 0.6, w_chroma: float = 0.4) -> np.ndarray:
+    """
+    Нормированные float32-векторы для косинусного сходства: стандартизованные
+    MFCC-статистики и хрома, каждая часть нормирована и взвешена как
+    в combined_similarity.
+    """
+    mf = np.stack([np.concatenate([f['mfcc_mean'], f['mfcc_std']]) for f in feats])
+    mf = (mf - params['mu']) / params['sigma']
+    ch = np.stack([f['chroma_mean'] for f in feats])
+    parts = []
+    for block, w in ((mf, w_mfcc), (ch, w_chroma)):
+        block = block / (np.linalg.norm(block, axis=1, keepdims=True) + 1e-9)
+        parts.append(np.sqrt(w) * block)
+    return np.hstack(parts).astype(np.float32)
+
+
+def _normalize(E: np.ndarray) -> np.ndarray:
+    return E / (np.linalg.norm(E, axis=1, keepdims=True) + 1e-9)
+
+
+def quantize(E: np.ndarray, dtype: str):
+    """(матрица, масштабы строк или None) в формате float16 или int8."""
+    if dtype == 'float16':
+        return E.astype(np.float16), None
+    if dtype == 'int8':
+        scales = np.maximum(np.abs(E).max(axis=1), 1e-9) / 127.0
+        return np.round(E / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"неподдерживаемый тип индекса: {dtype}")
+
+
+class EmbeddingIndex:
+    """
+    Индекс на диске: матрица эмбеддингов открывается через memmap,
+    поэтому в памяти держится только таблица путей, а запросы читают
+    матрицу блоками со скоростью страничного кэша.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        with open(os.path.join(root, 'meta.json'), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version', 0) > INDEX_VERSION:
+            raise ValueError(f"{root}: неподдерживаемая версия индекса {self.meta.get('version')}")
+        self.paths = self.meta['paths']
+        self._rows = {p: i for i, p in enumerate(self.paths)}
+        self.vectors = np.load(os.path.join(root, 'vectors.npy'), mmap_mode='r')
+        scales = os.path.join(root, 'scales.npy')
+        self.scales = np.load(scales, mmap_mode='r') if os.path.exists(scales) else None
+        self.params = {'mu': np.array(self.meta['mu'], dtype=np.float32),
+                       'sigma': np.array(self.meta['sigma'], dtype=np.float32)}
+        pca = self.meta.get('pca')
+        self.pca = None if pca is None else (np.array(pca['mean'], dtype=np.float32),
+                                             np.array(pca['components'], dtype=np.float32))
+
+    @classmethod
+    def build(cls, root: str, paths: list[str], feats: list[dict], dtype: str = 'float16',
+              pca_dim: int = None, w_mfcc: float = 0.6, w_chroma: float = 0.4):
+        """Строит индекс по сводным признакам feats (summary_features) и открывает его."""
+        params = fit_embedding(feats)
+        E = embed(feats, params, w_mfcc, w_chroma)
+        pca = None
+        if pca_dim and pca_dim < E.shape[1]:
+            mean = E.mean(axis=0)
+            _, _, vt = np.linalg.svd(E - mean, full_matrices=False)
+            comps = vt[:pca_dim]
+            E = _normalize((E - mean) @ comps.T).astype(np.float32)
+            pca = {'mean': mean.tolist(), 'components': comps.tolist()}
+        vectors, scales = quantize(E, dtype)
+
+        os.makedirs(root, exist_ok=True)
+        np.save(os.path.join(root, 'vectors.npy'), vectors)
+        if scales is not None:
+            np.save(os.path.join(root, 'scales.npy'), scales)
+        elif os.path.exists(os.path.join(root, 'scales.npy')):
+            os.remove(os.path.join(root, 'scales.npy'))
+        meta = {'version': INDEX_VERSION, 'dtype': dtype, 'dim': int(vectors.shape[1]),
+                'w_mfcc': w_mfcc, 'w_chroma': w_chroma,
+                'mu': params['mu'].tolist(), 'sigma': params['sigma'].tolist(),
+                'pca': pca, 'paths': list(paths)}
+        tmp = os.path.join(root, 'meta.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp, os.path.join(root, 'meta.json'))
+        return cls(root)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def row_of(self, path: str):
+        """Строка матрицы для пути или None."""
+        return self._rows.get(path)
+
+    def rows(self, start: int, stop: int) -> np.ndarray:
+        """Деквантованные строки [start, stop) (float32)."""
+        V = np.asarray(self.vectors[start:stop], dtype=np.float32)
+        return V * np.asarray(self.scales[start:stop])[:, None] if self.scales is not None else V
+
+    def vector(self, row: int) -> np.ndarray:
+        """Деквантованный вектор строки row (float32)."""
+        return self.rows(row, row + 1)[0]
+
+    def embed_features(self, feats: list[dict]) -> np.ndarray:
+        """Эмбеддинги новых треков в пространстве индекса (с тем же PCA)."""
+        E = embed(feats, self.params, self.meta['w_mfcc'], self.meta['w_chroma'])
+        if self.pca is not None:
+            mean, comps = self.pca
+            E = _normalize((E - mean) @ comps.T).astype(np.float32)
+        return E
+
+    def scores(self, Q: np.ndarray) -> np.ndarray:
+        """Косинусное сходство запросов Q (m, dim) со всеми строками: (m, N) float32."""
+        Q = np.atleast_2d(np.asarray(Q, dtype=np.float32))
+        out = np.empty((len(Q), len(self)), dtype=np.float32)
+        for start in range(0, len(self), QUERY_BLOCK):
+            block = np.asarray(self.vectors[start:start + QUERY_BLOCK], dtype=np.float32)
+            S = Q @ block.T
+            if self.scales is not None:
+                S *= self.scales[start:start + QUERY_BLOCK]
+            out[:, start:start + len(block)] = S
+        return out
+
+    def query_many(self, Q: np.ndarray, k: int = 10, exclude=None):
+        """
+        k ближайших строк для каждого запроса: (индексы (m, k), сходство (m, k)).
+        exclude — строки, которые не возвращать (по одной на запрос, например сам трек).
+        """
+        S = self.scores(Q)
+        if exclude is not None:
+            for i, row in enumerate(exclude):
+                if row is not None:
+                    S[i, row] = -np.inf
+        k = min(k, S.shape[1])
+        part = np.argpartition(-S, k - 1, axis=1)[:, :k]
+        vals = np.take_along_axis(S, part, axis=1)
+        order = np.argsort(-vals, axis=1)
+        return np.take_along_axis(part, order, axis=1), np.take_along_axis(vals, order, axis=1)
+
+    def top_k_all(self, k: int = 10, block: int = 1024):
+        """k ближайших для каждой строки индекса (без себя), блоками запросов."""
+        n = len(self)
+        k = min(k, n - 1)
+        idx = np.empty((n, k), dtype=np.int32)
+        score = np.empty((n, k), dtype=np.float32)
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            idx[start:stop], score[start:stop] = self.query_many(
+                self.rows(start, stop), k, exclude=range(start, stop))
+        return idx, score
+
+    def query_path(self, path: str, k: int = 10) -> list[tuple[str, float]]:
+        """Похожие треки для пути: из индекса, если он там есть, иначе по признакам файла."""
+        row = self.row_of(path)
+        if row is not None:
+            q = self.vector(row)
+        else:
+            import librosa
+            from similarity import summary_features
+            y, sr = librosa.load(path, sr=None, mono=True)
+            q = self.embed_features([summary_features(y, sr)])[0]
+        idx, score = self.query_many(q[None, :], k, exclude=[row])
+        return [(self.paths[i], float(s)) for i, s in zip(idx[0], score[0])]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Поиск похожих треков по индексу эмбеддингов")
+    parser.add_argument('index', help="папка индекса (analyze.py --index)")
+    parser.add_argument('path', help="трек-запрос")
+    parser.add_argument('--top-k', type=int, default=10)
+    args = parser.parse_args(argv)
+    index = EmbeddingIndex(args.index)
+    for path, score in index.query_path(args.path, args.top_k):
+        print(f"{score:.4f}\t{path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
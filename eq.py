@@ -2,7 +2,7 @@
 
 import math
 import numpy as np
-import scipy.signal as signal
+import perf
 
 def design_peaking_eq(f0: float, gain_db: float, Q: float, fs: float):
     """
@@ -53,11 +53,52 @@ def apply_equalizer(audio: np.ndarray,
     Возвращает:
         numpy-массив той же длины, что и входной, с отфильтрованным сигналом.
     """
+    import scipy.signal as signal
+
+    with perf.span('eq.apply_equalizer', nbytes=audio.nbytes):
+        y = audio.copy()
+        for gain_db, f0 in zip(gains, bands):
+            if gain_db == 0:
+                continue
+            b, a = design_peaking_eq(f0, gain_db, Q, fs)
+            # Проходим через фильтр
+            y = signal.lfilter(b, a, y)
+    return y
+
+def apply_equalizer_regions(audio: np.ndarray,
+                            gains: list[float],
+                            fs: float,
+                            bands: list[float],
+                            regions,
+                            Q: float = 1.0,
+                            preroll: float = 0.05,
+                            postroll: float = 0.1) -> np.ndarray:
+    """
+    Эквалайзер только по активным участкам regions ((K, 2) — [начало, конец)
+    в отсчётах, см. activity.ActivityMap.regions): тишина между ними
+    копируется как есть, поэтому работа пропорциональна длине звучания.
+    Каждый участок фильтруется с разгоном preroll секунд, чтобы на его
+    начале не было переходного процесса фильтра, и с хвостом postroll
+    секунд: затухание фильтра после конца участка сохраняется и плавно
+    переходит в исходный сигнал. Участки, между которыми меньше
+    preroll + postroll, фильтруются одним куском.
+    """
     y = audio.copy()
-    for gain_db, f0 in zip(gains, bands):
-        if gain_db == 0:
-            continue
-        b, a = design_peaking_eq(f0, gain_db, Q, fs)
-        # Проходим через фильтр
-        y = signal.lfilter(b, a, y)
+    pre, post = int(preroll * fs), int(postroll * fs)
+    merged = []
+    for start, end in regions:
+        if merged and start - merged[-1][1] < pre + post:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    fade = np.linspace(1.0, 0.0, post, endpoint=False)
+    with perf.span('eq.apply_regions', nbytes=audio.nbytes):
+        for start, end in merged:
+            s0 = max(0, start - pre)
+            e1 = min(len(audio), end + post)
+            out = apply_equalizer(audio[s0:e1], gains, fs, bands, Q)
+            y[start:end] = out[start - s0:end - s0]
+            # Хвост: отфильтрованный сигнал переходит в исходный
+            tail = out[end - s0:]
+            y[end:e1] = audio[end:e1] + (tail - audio[end:e1]) * fade[:len(tail)]
     return y
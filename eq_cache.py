@@ -0,0 +1,82 @@
+# eq_cache.py
+
+import os
+from collections import OrderedDict
+import perf
+
+# Предел кэша рендеров эквалайзера, МБ (GSA_EQ_CACHE_MB)
+EQ_CACHE_MB = int(os.environ.get('GSA_EQ_CACHE_MB', 512))
+# Разгон фильтра перед фрагментом, сек: переходный процесс IIR отбрасывается
+EQ_PREROLL_SEC = 0.5
+
+
+class EqRender:
+    """
+    Готовый рендер эквалайзера: WAV для плеера, отфильтрованный сигнал
+    (только для рендера всего трека), усиление рендера в дБ и начало
+    фрагмента в секундах (0 для всего трека).
+    """
+    __slots__ = ('wav', 'data', 'scale_db', 'offset', 'nbytes')
+
+    def __init__(self, wav: str, data, scale_db: float, offset: float = 0.0):
+        self.wav      = wav
+        self.data     = data
+        self.scale_db = scale_db
+        self.offset   = offset
+        size = os.path.getsize(wav) if os.path.exists(wav) else 0
+        self.nbytes   = size + (data.nbytes if data is not None else 0)
+
+
+class EqRenderCache:
+    """
+    LRU-кэш рендеров эквалайзера, ограниченный суммарным объёмом
+    (сигналы в памяти + WAV на диске). Вытесненные WAV удаляются.
+    Ключ — (путь трека, усиления, полосы, фрагмент или None).
+    """
+
+    def __init__(self, max_bytes: int = EQ_CACHE_MB * 2**20):
+        self.max_bytes = max_bytes
+        self.nbytes    = 0
+        self._items: OrderedDict = OrderedDict()
+
+    def fits_full(self, n_samples: int) -> bool:
+        """
+        Поместится ли рендер всего трека из n_samples отсчётов: float32-сигнал
+        (4 байта) плюс 16-битный WAV (2 байта) не должны занимать больше
+        половины кэша, иначе рендерится фрагмент. Оценка не зависит от типа
+        исходного сигнала: рендер всегда хранится во float32.
+        """
+        return n_samples * 6 <= self.max_bytes / 2
+
+    def get(self, key):
+        entry = self._items.get(key)
+        if entry is None or not os.path.exists(entry.wav):
+            if entry is not None:
+                self._drop(key)
+            perf.cache_miss('eq_render')
+            return None
+        self._items.move_to_end(key)
+        perf.cache_hit('eq_render')
+        return entry
+
+    def put(self, key, entry: EqRender, keep=None):
+        """Добавляет рендер; keep — WAV, который нельзя вытеснять (сейчас играет)."""
+        if key in self._items:
+            self._drop(key)
+        self._items[key] = entry
+        self.nbytes += entry.nbytes
+        for old in list(self._items):
+            if self.nbytes <= self.max_bytes or old == key:
+                break
+            if self._items[old].wav != keep:
+                self._drop(old)
+
+    def _drop(self, key):
+        entry = self._items.pop(key)
+        self.nbytes -= entry.nbytes
+        if os.path.exists(entry.wav):
+            os.remove(entry.wav)
+
+    def clear(self):
+        for key in list(self._items):
+            self._drop(key)
@@ -0,0 +1,55 @@
+# feature_cache.py
+
+import os, tempfile
+import numpy as np
+from utils import file_signature, track_cache_key
+
+# Папка кэша по умолчанию
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.gui-sound-app', 'features')
+
+
+class FeatureCache:
+    """
+    Дисковый кэш признаков треков: по одному .npz на (трек, набор признаков).
+    Ключ строится из пути, размера и mtime файла (track_cache_key) и версии
+    набора, поэтому изменённый файл или новая версия извлечения
+    автоматически дают промах.
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, kind: str = 'summary', version: int = 1):
+        self.root    = root
+        self.kind    = kind
+        self.version = version
+
+    def key_for(self, path: str):
+        """Ключ кэша для файла или None, если файл недоступен."""
+        sig = file_signature(path)
+        if sig is None:
+            return None
+        return f"{track_cache_key(path, *sig)}-{self.kind}-v{self.version}"
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + '.npz')
+
+    def get(self, path: str):
+        """Словарь массивов из кэша или None."""
+        key = self.key_for(path)
+        if key is None:
+            return None
+        try:
+            with np.load(self._file(key)) as data:
+                return {name: data[name] for name in data.files}
+        except (OSError, ValueError):
+            return None
+
+    def put(self, path: str, feats: dict):
+        """Атомарно записывает словарь массивов feats для файла path."""
+        key = self.key_for(path)
+        if key is None:
+            return
+        target = self._file(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(target))
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **feats)
+        os.replace(tmp, target)
@@ -0,0 +1,148 @@
+# features.py
+
+import numpy as np
+import perf
+
+# Параметры STFT признаков (как у librosa.feature по умолчанию)
+FEAT_N_FFT = 2048
+FEAT_HOP   = 512
+N_MELS     = 128
+# Кадров STFT в одном чанке и чанков в одном батче БПФ
+CHUNK_FRAMES = 256
+BATCH_CHUNKS = 16
+
+# Банки фильтров и оси частот по sr
+_filters: dict[int, tuple] = {}
+
+
+def _filterbanks(sr: int):
+    """(mel-банк, хрома-банк, частоты бинов) для sr, с кэшированием."""
+    fb = _filters.get(sr)
+    if fb is None:
+        import librosa
+        fb = (librosa.filters.mel(sr=sr, n_fft=FEAT_N_FFT, n_mels=N_MELS).astype(np.float32),
+              librosa.filters.chroma(sr=sr, n_fft=FEAT_N_FFT, tuning=0.0).astype(np.float32),
+              np.fft.rfftfreq(FEAT_N_FFT, 1.0 / sr).astype(np.float32))
+        _filters[sr] = fb
+    return fb
+
+
+def _chunks(y: np.ndarray):
+    """
+    Режет сигнал (с центрированием, как librosa.stft) на чанки одинаковой
+    длины по CHUNK_FRAMES кадров. Возвращает (массив чанков, число кадров).
+    """
+    half = FEAT_N_FFT // 2
+    y = np.pad(np.asarray(y, dtype=np.float32), half, mode='reflect' if len(y) > half else 'constant')
+    n_frames = 1 + (len(y) - FEAT_N_FFT) // FEAT_HOP
+    span = (CHUNK_FRAMES - 1) * FEAT_HOP + FEAT_N_FFT
+    n_chunks = -(-n_frames // CHUNK_FRAMES)
+    need = (n_chunks - 1) * CHUNK_FRAMES * FEAT_HOP + span
+    if len(y) < need:
+        y = np.pad(y, (0, need - len(y)))
+    starts = np.arange(n_chunks) * CHUNK_FRAMES * FEAT_HOP
+    return y[starts[:, None] + np.arange(span)], n_frames
+
+
+def _power_frames(chunks: np.ndarray, window: np.ndarray) -> np.ndarray:
+    """Спектр мощности для стопки чанков: (N, CHUNK_FRAMES, бины) одним БПФ."""
+    from numpy.lib.stride_tricks import sliding_window_view
+    frames = sliding_window_view(chunks, FEAT_N_FFT, axis=1)[:, ::FEAT_HOP]
+    spec = np.fft.rfft(frames * window, axis=-1)
+    return (spec.real ** 2 + spec.imag ** 2).astype(np.float32)
+
+
+def _frame_features(P: np.ndarray, sr: int, n_mfcc: int) -> dict:
+    """Покадровые признаки из спектра мощности P (T, бины) одного трека."""
+    from scipy.fft import dct
+    mel_fb, chroma_fb, freqs = _filterbanks(sr)
+    # MFCC: лог-мел (power_to_db, top_db=80) и DCT-II
+    mel = P @ mel_fb.T
+    log_mel = 10.0 * np.log10(np.maximum(mel, 1e-10))
+    log_mel = np.maximum(log_mel, log_mel.max() - 80.0)
+    mfcc = dct(log_mel, type=2, norm='ortho', axis=1)[:, :n_mfcc]
+    # Огибающая атак: средний положительный прирост лог-мел (как onset_strength)
+    onset = np.concatenate([[0.0], np.maximum(np.diff(log_mel, axis=0), 0.0).mean(axis=1)])
+    # Хрома: банк по спектру мощности, нормировка кадра по максимуму
+    chroma = P @ chroma_fb.T
+    chroma /= np.maximum(chroma.max(axis=1, keepdims=True), 1e-10)
+    # RMS по спектру (равенство Парсеваля, как librosa.feature.rms(S=...))
+    Pw = P.copy()
+    Pw[:, 0] *= 0.5
+    Pw[:, -1] *= 0.5
+    rms = np.sqrt(2.0 * Pw.sum(axis=1) / FEAT_N_FFT ** 2)
+    # Спектральные центроид, ширина и спад 85 % по амплитуде
+    S = np.sqrt(P)
+    total = np.maximum(S.sum(axis=1, keepdims=True), 1e-10)
+    norm_S = S / total
+    centroid = norm_S @ freqs
+    bandwidth = np.sqrt(np.sum(norm_S * (freqs - centroid[:, None]) ** 2, axis=1))
+    rolloff = freqs[np.argmax(np.cumsum(S, axis=1) >= 0.85 * total, axis=1)]
+    return {'mfcc': mfcc.T.astype(np.float32), 'chroma': chroma.T.astype(np.float32),
+            'rms': rms.astype(np.float32), 'centroid': centroid.astype(np.float32),
+            'bandwidth': bandwidth.astype(np.float32), 'rolloff': rolloff.astype(np.float32),
+            'onset': onset.astype(np.float32)}
+
+
+@perf.timed('features.batch')
+def frame_features(signals, n_mfcc: int = 13) -> list[dict]:
+    """
+    Покадровые признаки для нескольких сигналов [(y, sr), ...] с одним
+    STFT на трек: MFCC (n_mfcc, T), хрома (12, T), RMS, спектральные
+    центроид/ширина/спад и огибающая атак (T,). Треки режутся на чанки одинаковой длины,
+    чанки всех треков с одним sr складываются в стопки и проходят
+    БПФ вместе, что окупает накладные расходы на коротких треках.
+    """
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(FEAT_N_FFT) / FEAT_N_FFT)).astype(np.float32)
+    out = [None] * len(signals)
+    by_sr: dict[int, list[int]] = {}
+    for i, (_, sr) in enumerate(signals):
+        by_sr.setdefault(int(sr), []).append(i)
+
+    for sr, idxs in by_sr.items():
+        # Чанки всех треков группы подряд; offsets — начало чанков трека
+        pieces, offsets, n_frames = [], {}, {}
+        total = 0
+        for i in idxs:
+            ch, n_frames[i] = _chunks(signals[i][0])
+            pieces.append(ch)
+            offsets[i] = total
+            total += len(ch)
+        chunks = np.concatenate(pieces)
+        del pieces
+        powers = np.concatenate([_power_frames(chunks[b:b + BATCH_CHUNKS], window)
+                                 for b in range(0, len(chunks), BATCH_CHUNKS)])
+        perf.count('features.fft_chunks', len(chunks))
+        del chunks
+        for i in idxs:
+            # Чанки трека лежат подряд: срез и reshape — виды без копирования
+            o = offsets[i]
+            P = powers[o:o + -(-n_frames[i] // CHUNK_FRAMES)].reshape(-1, powers.shape[-1])[:n_frames[i]]
+            out[i] = _frame_features(P, sr, n_mfcc)
+    return out
+
+
+def deltas(mfcc: np.ndarray) -> np.ndarray:
+    """MFCC с первой и второй дельтами: (3*n_mfcc, T)."""
+    import librosa
+    width = min(9, mfcc.shape[1] - (1 - mfcc.shape[1] % 2))
+    if width < 3:
+        return np.vstack([mfcc, np.zeros_like(mfcc), np.zeros_like(mfcc)])
+    return np.vstack([mfcc, librosa.feature.delta(mfcc, width=width),
+                      librosa.feature.delta(mfcc, width=width, order=2)])
+
+
+def block_deltas(mfcc: np.ndarray, blocks: int = 6) -> np.ndarray:
+    """
+    Делит покадровые MFCC на blocks блоков, считает дельты внутри каждого
+    и склеивает: (T, 3*n_mfcc) — кадры для DTW.
+    """
+    T = mfcc.shape[1]
+    step = max(1, T // blocks)
+    parts = []
+    for i in range(blocks):
+        start = i * step
+        end = T if i == blocks - 1 else (i + 1) * step
+        if end > start:
+            parts.append(deltas(mfcc[:, start:end]))
+    return np.hstack(parts).T
@@ -0,0 +1,211 @@
+# fingerprint.py
+
+import os, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils import file_signature, track_cache_key
+
+# Параметры отпечатка. Сигнал приводится к общей частоте, поэтому
+# MP3 и WAV одной записи дают одинаковую сетку STFT.
+FP_SR        = 11025
+FP_N_FFT     = 1024
+FP_HOP       = 256
+PEAK_NEIGHB  = (15, 15)   # окрестность локального максимума (частота, время)
+PEAK_DB      = -45.0      # порог пика относительно максимума трека, дБ
+PEAKS_PER_SEC = 30        # ограничение плотности пиков
+FAN_OUT      = 5          # пар на один якорный пик
+MAX_DT       = 63         # макс. расстояние якорь-цель в кадрах (6 бит)
+FREQ_SHIFT   = 1          # огрубление частотных бинов (устойчивость к кодекам)
+
+# Сколько отпечатков держать в памяти
+FP_CACHE_SIZE = 128
+
+# Кэш отпечатков (LRU): track_cache_key -> (hashes, times)
+_fp_cache: OrderedDict = OrderedDict()
+_fp_lock = threading.Lock()
+
+
+def fingerprint_peaks(y: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Находит опорные пики (landmarks) спектрограммы.
+    Возвращает массив shape (N, 2) с парами (кадр, частотный бин),
+    отсортированный по времени.
+    """
+    import librosa
+    from scipy.ndimage import maximum_filter
+
+    if sr != FP_SR:
+        y = librosa.resample(y, orig_sr=sr, target_sr=FP_SR)
+    S = np.abs(librosa.stft(y, n_fft=FP_N_FFT, hop_length=FP_HOP))
+    if S.size == 0:
+        return np.empty((0, 2), dtype=np.int32)
+    S_db = librosa.amplitude_to_db(S, ref=np.max)
+
+    # Локальные максимумы выше порога
+    is_peak = (S_db == maximum_filter(S_db, size=PEAK_NEIGHB)) & (S_db > PEAK_DB)
+    f_idx, t_idx = np.nonzero(is_peak)
+    if len(t_idx) == 0:
+        return np.empty((0, 2), dtype=np.int32)
+
+    # Оставляем самые сильные пики, не больше PEAKS_PER_SEC в среднем
+    limit = max(1, int(PEAKS_PER_SEC * S.shape[1] * FP_HOP / FP_SR))
+    if len(t_idx) > limit:
+        strongest = np.argpartition(-S_db[f_idx, t_idx], limit - 1)[:limit]
+        f_idx, t_idx = f_idx[strongest], t_idx[strongest]
+
+    order = np.lexsort((f_idx, t_idx))
+    return np.stack([t_idx[order], f_idx[order]], axis=1).astype(np.int32)
+
+
+def landmark_hashes(peaks: np.ndarray):
+    """
+    Строит хэши пар пиков (f1, f2, dt) для каждого якоря и FAN_OUT следующих пиков.
+    Возвращает (hashes uint32, times int32) — время якорного кадра.
+    """
+    if len(peaks) < 2:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32)
+    t = peaks[:, 0]
+    f = peaks[:, 1] >> FREQ_SHIFT
+    hashes, times = [], []
+    for k in range(1, FAN_OUT + 1):
+        dt = t[k:] - t[:-k]
+        ok = (dt > 0) & (dt <= MAX_DT)
+        if not ok.any():
+            continue
+        f1, f2 = f[:-k][ok], f[k:][ok]
+        # 9 бит f1 | 9 бит f2 | 6 бит dt
+        h = (f1.astype(np.uint32) << 15) | (f2.astype(np.uint32) << 6) | dt[ok].astype(np.uint32)
+        hashes.append(h)
+        times.append(t[:-k][ok])
+    if not hashes:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int32)
+    return np.concatenate(hashes), np.concatenate(times).astype(np.int32)
+
+
+def fingerprint_file(path: str):
+    """Отпечаток файла (hashes, times); кэш по track_cache_key, так что изменённый файл даёт промах."""
+    sig = file_signature(path)
+    key = track_cache_key(path, *sig) if sig else None
+    with _fp_lock:
+        fp = _fp_cache.get(key) if key is not None else None
+        if fp is not None:
+            _fp_cache.move_to_end(key)
+            return fp
+    import librosa
+    y, sr = librosa.load(path, sr=FP_SR, mono=True)
+    fp = landmark_hashes(fingerprint_peaks(y, sr))
+    if key is not None:
+        with _fp_lock:
+            _fp_cache[key] = fp
+            while len(_fp_cache) > FP_CACHE_SIZE:
+                _fp_cache.popitem(last=False)
+    return fp
+
+
+class FingerprintIndex:
+    """
+    Инвертированный индекс хэшей: все (hash, track, time) хранятся
+    в трёх массивах, отсортированных по хэшу; поиск — через searchsorted.
+    """
+
+    def __init__(self, max_postings: int = 200):
+        # Слишком частые хэши (тишина, гул) не различают треки — пропускаем
+        self.max_postings = max_postings
+        self._parts = []
+        self.hashes = self.tracks = self.times = None
+        self.counts: dict[int, int] = {}
+
+    def add(self, track_id: int, hashes: np.ndarray, times: np.ndarray):
+        self._parts.append((hashes, np.full(len(hashes), track_id, dtype=np.int32), times))
+        self.counts[track_id] = len(hashes)
+        self.hashes = None
+
+    def build(self):
+        if not self._parts:
+            self.hashes = np.empty(0, dtype=np.uint32)
+            self.tracks = self.times = np.empty(0, dtype=np.int32)
+            return
+        h, tr, tm = (np.concatenate(col) for col in zip(*self._parts))
+        order = np.argsort(h, kind='stable')
+        self.hashes, self.tracks, self.times = h[order], tr[order], tm[order]
+
+    def query(self, hashes: np.ndarray, times: np.ndarray) -> dict[int, int]:
+        """
+        Ищет совпадения хэшей и для каждого найденного трека возвращает
+        число совпадений с одинаковым временным сдвигом (самый частый сдвиг).
+        """
+        if self.hashes is None:
+            self.build()
+        lo = np.searchsorted(self.hashes, hashes, side='left')
+        hi = np.searchsorted(self.hashes, hashes, side='right')
+        n = hi - lo
+        keep = (n > 0) & (n <= self.max_postings)
+        if not keep.any():
+            return {}
+        lo, n, q_times = lo[keep], n[keep], times[keep]
+
+        # Разворачиваем диапазоны [lo, lo+n) в плоский массив позиций
+        starts = np.repeat(lo - np.concatenate([[0], np.cumsum(n)[:-1]]), n)
+        pos = starts + np.arange(n.sum())
+        offsets = self.times[pos] - np.repeat(q_times, n)
+        tracks = self.tracks[pos].astype(np.int64)
+
+        # Гистограмма (трек, сдвиг) → максимум по каждому треку
+        keys = (tracks << 32) | (offsets.astype(np.int64) & 0xFFFFFFFF)
+        uniq, cnt = np.unique(keys, return_counts=True)
+        best: dict[int, int] = {}
+        for tid, c in zip((uniq >> 32).tolist(), cnt.tolist()):
+            if c > best.get(tid, 0):
+                best[tid] = c
+        return best
+
+
+def find_duplicate_groups(paths: list[str], min_matches: int = 20,
+                          min_ratio: float = 0.05, max_workers: int = None) -> list[list[int]]:
+    """
+    Находит группы дубликатов/перекодировок среди paths.
+    Пара считается дубликатом, если у неё не меньше min_matches хэшей
+    с согласованным сдвигом и это не меньше min_ratio от хэшей меньшего трека.
+    Возвращает список групп индексов (по paths), каждая из 2+ элементов.
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        fps = list(pool.map(_safe_fingerprint, paths))
+
+    index = FingerprintIndex()
+    for i, fp in enumerate(fps):
+        if fp is not None and len(fp[0]):
+            index.add(i, *fp)
+    index.build()
+
+    # Объединение пар через систему непересекающихся множеств
+    parent = list(range(len(paths)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, fp in enumerate(fps):
+        if fp is None or not len(fp[0]):
+            continue
+        for j, score in index.query(*fp).items():
+            if j == i or score < min_matches:
+                continue
+            if score / max(1, min(index.counts[i], index.counts[j])) >= min_ratio:
+                parent[find(i)] = find(j)
+
+    groups: dict[int, list[int]] = {}
+    for i in range(len(paths)):
+        groups.setdefault(find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def _safe_fingerprint(path):
+    try:
+        return fingerprint_file(path)
+    except Exception:
+        return None
@@ -0,0 +1,225 @@
+# library.py
+
+import os, json, argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from probe import probe_files
+from feature_cache import DEFAULT_CACHE_DIR
+
+# Расширения, которые считаются аудиофайлами при сканировании папок
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.ogg', '.m4a', '.aiff', '.aif')
+
+# Индекс библиотеки по умолчанию
+DEFAULT_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.gui-sound-app', 'library.json')
+
+
+def audio_file_filter() -> str:
+    """Строка фильтра для QFileDialog со всеми поддерживаемыми расширениями."""
+    return "Audio Files (" + " ".join(f"*{ext}" for ext in AUDIO_EXTENSIONS) + ")"
+
+
+def _scan_dir(path: str):
+    """
+    Читает одну папку через os.scandir.
+    Возвращает (files, subdirs), где files — список (path, size, mtime).
+    """
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(AUDIO_EXTENSIONS) and entry.is_file():
+                        st = entry.stat()
+                        files.append((entry.path, st.st_size, st.st_mtime))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return files, subdirs
+
+
+def _try(fn, *args) -> bool:
+    try:
+        fn(*args)
+        return True
+    except Exception:
+        return False
+
+
+class LibraryScanner:
+    """
+    Индекс аудиобиблиотеки на диске.
+    – рекурсивно обходит папки пулом потоков (os.scandir на каждую папку)
+    – хранит path, size, mtime и метаданные из заголовка в JSON-индексе
+    – при повторном сканировании опрашивает только новые и изменённые файлы
+    – для новых записей в фоне извлекает признаки для поиска похожих
+    """
+
+    def __init__(self, index_path: str = DEFAULT_INDEX_PATH, max_workers: int = None):
+        self.index_path  = index_path
+        self.max_workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
+        # path -> {"path", "size", "mtime", "duration", "sr", "channels", "bitrate"}
+        self.entries: dict[str, dict] = {}
+        self._feature_pool = None
+        self.load()
+
+    # --Индекс--
+    def load(self):
+        """Загружает индекс с диска (если он есть)."""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.entries = {e['path']: e for e in data.get('entries', [])}
+
+    def save(self):
+        """Атомарно сохраняет индекс на диск."""
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'entries': list(self.entries.values())},
+                      f, ensure_ascii=False)
+        os.replace(tmp, self.index_path)
+
+    def entries_under(self, root: str) -> list[dict]:
+        """Записи индекса, лежащие внутри папки root, отсортированные по пути."""
+        prefix = os.path.join(os.path.abspath(root), '')
+        return sorted((e for p, e in self.entries.items() if p.startswith(prefix)),
+                      key=lambda e: e['path'])
+
+    # --Сканирование--
+    def walk(self, roots) -> list[tuple]:
+        """
+        Рекурсивно обходит папки roots параллельно: каждая найденная
+        подпапка сразу отправляется в пул. Возвращает [(path, size, mtime)].
+        """
+        found = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            pending = {pool.submit(_scan_dir, os.path.abspath(r)) for r in roots}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    files, subdirs = fut.result()
+                    found.extend(files)
+                    pending.update(pool.submit(_scan_dir, d) for d in subdirs)
+        return found
+
+    def scan(self, roots, extract_features: bool = True, cache_root: str = None) -> dict:
+        """
+        Сканирует папки roots и обновляет индекс.
+        Новые и изменённые (по size/mtime) файлы опрашиваются probe_files,
+        исчезнувшие удаляются из индекса. cache_root — см. extract_features_async.
+
+        Возвращает статистику {"total", "new", "changed", "removed", "failed"}.
+        """
+        roots = [os.path.abspath(r) for r in roots]
+        files = self.walk(roots)
+        seen  = {path for path, _, _ in files}
+
+        new, changed = [], []
+        for path, size, mtime in files:
+            old = self.entries.get(path)
+            if old is None:
+                new.append(path)
+            elif old.get('size') != size or old.get('mtime') != mtime:
+                changed.append(path)
+
+        # Удалённые файлы внутри просканированных папок
+        prefixes = tuple(os.path.join(r, '') for r in roots)
+        removed = [p for p in self.entries if p.startswith(prefixes) and p not in seen]
+        for p in removed:
+            del self.entries[p]
+
+        # Опрашиваем заголовки только у новых и изменённых файлов
+        to_probe = new + changed
+        failed = 0
+        for path, info in zip(to_probe, probe_files(to_probe, self.max_workers)):
+            if info is None:
+                self.entries.pop(path, None)
+                failed += 1
+            else:
+                self.entries[path] = info
+        self.save()
+
+        if extract_features and to_probe:
+            self.extract_features_async([p for p in to_probe if p in self.entries], cache_root)
+
+        return {'total': len(files), 'new': len(new), 'changed': len(changed),
+                'removed': len(removed), 'failed': failed}
+
+    # --Признаки--
+    def extract_features_async(self, paths, cache_root: str = None):
+        """
+        Запускает в фоновом потоке извлечение признаков для индекса сходства.
+        Без cache_root признаки попадают в кэши сходства процесса (GUI);
+        с cache_root — сводные признаки пишутся в дисковый FeatureCache,
+        тот же, что у analyze.py, и переживают завершение процесса.
+        Возвращает Future; ошибки отдельных файлов пропускаются.
+        """
+        if self._feature_pool is None:
+            self._feature_pool = ThreadPoolExecutor(max_workers=1,
+                                                    thread_name_prefix='library-features')
+        if cache_root is not None:
+            return self._feature_pool.submit(self._store_features, list(paths), cache_root)
+        return self._feature_pool.submit(self._extract_features, list(paths))
+
+    @staticmethod
+    def _extract_features(paths, batch: int = 8):
+        from similarity import extract_many
+        from segment_search import store_frames
+        done = 0
+        for start in range(0, len(paths), batch):
+            group = paths[start:start + batch]
+            try:
+                extract_many(group)
+            except Exception:
+                # один нечитаемый файл не должен лишать признаков всю группу
+                group = [p for p in group if _try(extract_many, [p])]
+            for path in group:
+                try:
+                    store_frames(path)
+                    done += 1
+                except Exception:
+                    continue
+        return done
+
+    @staticmethod
+    def _store_features(paths, cache_root: str, batch: int = 8):
+        from analyze import analyze_tracks
+        done = 0
+        for start in range(0, len(paths), batch):
+            rows = analyze_tracks(paths[start:start + batch], cache_root)
+            done += sum(1 for _, feats, _, _ in rows if feats is not None)
+        return done
+
+    def wait_features(self):
+        """Дожидается завершения фонового извлечения признаков."""
+        if self._feature_pool is not None:
+            self._feature_pool.shutdown(wait=True)
+            self._feature_pool = None
+
+
+def main(argv=None):
+    """
+    Консольный режим для ночной переиндексации:
+        python library.py /mnt/share/music /mnt/share/voice --index lib.json
+    """
+    parser = argparse.ArgumentParser(description="Индексация аудиобиблиотеки")
+    parser.add_argument('roots', nargs='+', help="папки для сканирования")
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH, help="путь к файлу индекса")
+    parser.add_argument('--workers', type=int, default=None, help="число потоков")
+    parser.add_argument('--features', action='store_true',
+                        help="извлечь признаки для новых файлов в кэш analyze.py")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_DIR, help="папка кэша признаков")
+    args = parser.parse_args(argv)
+
+    scanner = LibraryScanner(args.index, args.workers)
+    stats = scanner.scan(args.roots, extract_features=args.features, cache_root=args.cache)
+    scanner.wait_features()
+    print(json.dumps(stats, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# loudness.py
+
+import math
+import numpy as np
+import perf
+
+# Целевая громкость и потолок истинного пика
+TARGET_LUFS   = -14.0
+MAX_TRUE_PEAK = -1.0     # дБTP
+
+# Стробирование по BS.1770: блоки 400 мс с перекрытием 75 %
+BLOCK_SEC     = 0.4
+BLOCK_HOP_SEC = 0.1
+ABS_GATE      = -70.0    # LUFS
+REL_GATE      = -10.0    # LU относительно негейтированной громкости
+
+
+def _biquad(kind: str, f0: float, gain_db: float, Q: float, fs: float):
+    """Коэффициенты биквадов K-взвешивания (формулы RBJ, как в design_peaking_eq)."""
+    A = 10 ** (gain_db / 40.0)
+    w0 = 2 * math.pi * f0 / fs
+    alpha = math.sin(w0) / (2 * Q)
+    cos_w0 = math.cos(w0)
+    if kind == 'high_shelf':
+        sq = 2 * math.sqrt(A) * alpha
+        b = [A * ((A + 1) + (A - 1) * cos_w0 + sq),
+             -2 * A * ((A - 1) + (A + 1) * cos_w0),
+             A * ((A + 1) + (A - 1) * cos_w0 - sq)]
+        a = [(A + 1) - (A - 1) * cos_w0 + sq,
+             2 * ((A - 1) - (A + 1) * cos_w0),
+             (A + 1) - (A - 1) * cos_w0 - sq]
+    else:  # high_pass
+        b = [(1 + cos_w0) / 2, -(1 + cos_w0), (1 + cos_w0) / 2]
+        a = [1 + alpha, -2 * cos_w0, 1 - alpha]
+    b, a = np.array(b), np.array(a)
+    return b / a[0], a / a[0]
+
+
+def k_weighting(y: np.ndarray, fs: float) -> np.ndarray:
+    """K-взвешивание BS.1770: полка +4 дБ на ВЧ и ФВЧ ~38 Гц."""
+    import scipy.signal as signal
+    b1, a1 = _biquad('high_shelf', 1681.974, 3.999843, 0.7071752, fs)
+    b2, a2 = _biquad('high_pass', 38.13547, 0.0, 0.5003270, fs)
+    return signal.lfilter(b2, a2, signal.lfilter(b1, a1, y))
+
+
+def block_mean_square(y: np.ndarray, fs: float) -> np.ndarray:
+    """
+    Средний квадрат в блоках 400 мс с шагом 100 мс — то же RMS-кадрирование,
+    что и у графика громкости, только через кумулятивные суммы (без копий кадров).
+    """
+    n, hop = int(BLOCK_SEC * fs), int(BLOCK_HOP_SEC * fs)
+    if len(y) < n:
+        return np.array([np.mean(y ** 2)]) if len(y) else np.zeros(0)
+    c = np.concatenate([[0.0], np.cumsum(y.astype(np.float64) ** 2)])
+    starts = np.arange(0, len(y) - n + 1, hop)
+    return (c[starts + n] - c[starts]) / n
+
+
+def integrated_loudness(y: np.ndarray, fs: float) -> float:
+    """Интегральная громкость по BS.1770 (LUFS) с абсолютным и относительным гейтом."""
+    ms = block_mean_square(k_weighting(y, fs), fs)
+    with np.errstate(divide='ignore'):
+        lk = -0.691 + 10 * np.log10(ms)
+    ms = ms[lk > ABS_GATE]
+    if len(ms) == 0:
+        return -np.inf
+    rel = -0.691 + 10 * np.log10(ms.mean()) + REL_GATE
+    with np.errstate(divide='ignore'):
+        ms = ms[-0.691 + 10 * np.log10(ms) > rel]
+    return float(-0.691 + 10 * np.log10(ms.mean())) if len(ms) else -np.inf
+
+
+def true_peak_db(y: np.ndarray, oversample: int = 4) -> float:
+    """Истинный пик (дБTP) по сигналу с oversample-кратной передискретизацией."""
+    import scipy.signal as signal
+    if len(y) == 0:
+        return -np.inf
+    peak = np.max(np.abs(signal.resample_poly(y, oversample, 1)))
+    return float(20 * np.log10(peak)) if peak > 0 else -np.inf
+
+
+@perf.timed('loudness.analyze')
+def analyze_loudness(y: np.ndarray, fs: float, target: float = TARGET_LUFS) -> dict:
+    """
+    Анализ громкости трека: {"lufs", "true_peak", "gain_db"}.
+    gain_db приводит трек к target LUFS, но не поднимает истинный пик
+    выше MAX_TRUE_PEAK. Для тишины lufs/true_peak — None, gain_db — 0
+    (словарь сохраняется в плейлист как JSON).
+    """
+    lufs = integrated_loudness(y, fs)
+    tp = true_peak_db(y)
+    if not np.isfinite(lufs):
+        gain = 0.0
+    else:
+        gain = target - lufs
+        if np.isfinite(tp):
+            gain = min(gain, MAX_TRUE_PEAK - tp)
+    return {'lufs':      lufs if np.isfinite(lufs) else None,
+            'true_peak': tp if np.isfinite(tp) else None,
+            'gain_db':   float(gain)}
+
+
+def db_to_gain(db: float) -> float:
+    return 10 ** (db / 20.0)
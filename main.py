@@ -1,8 +1,53 @@
+import time
+_T0 = time.perf_counter()
+
+import os, sys, json, logging
 from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
+_T_QT = time.perf_counter()
 from ui import AudioPlayer
-import sys
+from watchdog import UiWatchdog
+from utils import warm_up_imports
+_T_UI = time.perf_counter()
+
+# Модули, которые не должны грузиться до появления окна
+HEAVY_MODULES = ('librosa', 'matplotlib', 'scipy.signal', 'fastdtw', 'soundfile')
+
+
+def report_startup(t_window):
+    """
+    Режим измерения старта (--startup-timing или GSA_STARTUP_TIMING=1):
+    печатает в stderr JSON с временами импорта и первой отрисовки окна,
+    а также список тяжёлых модулей, загруженных к этому моменту.
+    С GSA_STARTUP_TIMING=exit приложение закрывается сразу после отчёта.
+    """
+    t_paint = time.perf_counter()
+    report = {
+        'import_qt_ms':     (_T_QT - _T0) * 1000,
+        'import_ui_ms':     (_T_UI - _T_QT) * 1000,
+        'build_window_ms':  (t_window - _T_UI) * 1000,
+        'first_paint_ms':   (t_paint - _T0) * 1000,
+        'heavy_loaded':     [m for m in HEAVY_MODULES if m in sys.modules],
+    }
+    print(json.dumps(report), file=sys.stderr)
+    if os.environ.get('GSA_STARTUP_TIMING') == 'exit':
+        QApplication.quit()
+
+
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING,
+                        format="%(asctime)s %(name)s %(levelname)s: %(message)s")
+    timing = '--startup-timing' in sys.argv or os.environ.get('GSA_STARTUP_TIMING')
     app = QApplication(sys.argv)
     player = AudioPlayer()
+    t_window = time.perf_counter()
+    # Сторож GUI-потока: логирует слоты, блокирующие интерфейс
+    player.watchdog = UiWatchdog(player)
+    player.watchdog.start()
     player.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    if timing:
+        # Срабатывает на первой итерации цикла событий, после отрисовки окна
+        QTimer.singleShot(0, lambda: report_startup(t_window))
+    # Тяжёлые библиотеки подгружаются в фоне уже после появления окна
+    QTimer.singleShot(0, warm_up_imports)
+    sys.exit(app.exec_())
@@ -0,0 +1,171 @@
+# meters.py
+
+import numpy as np
+from PyQt5.QtCore import QObject
+from PyQt5.QtGui import QPainter, QColor
+from PyQt5.QtWidgets import QWidget
+
+# Уровень, начиная с которого отсчёт считается клиппингом
+CLIP_LEVEL = 0.999
+# Нижняя граница шкалы, дБFS
+METER_FLOOR_DB = -60.0
+# Окно сигнала для запасного режима (уровень по self.data у позиции), сек
+FALLBACK_WINDOW_SEC = 0.05
+# Скорость спада пикового индикатора, дБ/с
+PEAK_DECAY_DB_S = 20.0
+# Сколько горит индикатор клиппинга после последнего перегруза, сек
+CLIP_HOLD_SEC = 1.0
+
+
+def block_levels(pcm: np.ndarray) -> np.ndarray:
+    """
+    Уровни блока PCM (кадры × каналы, float в [-1, 1]) одним векторным
+    проходом: массив (3,) — пик, RMS и число клиппированных отсчётов.
+    """
+    if pcm.size == 0:
+        return np.zeros(3, dtype=np.float32)
+    a = np.abs(pcm)
+    return np.array([a.max(), np.sqrt(np.mean(np.square(pcm, dtype=np.float32))),
+                     np.count_nonzero(a >= CLIP_LEVEL)], dtype=np.float32)
+
+
+class LevelRing:
+    """
+    Кольцевой буфер уровней блоков без блокировок: один писатель
+    (обработчик аудиобуферов) пишет строку и только потом сдвигает
+    счётчик, читатель (GUI) берёт строки до снимка счётчика.
+    """
+
+    def __init__(self, size: int = 256):
+        self._rows    = np.zeros((size, 3), dtype=np.float32)
+        self._written = 0
+
+    def push(self, levels: np.ndarray):
+        self._rows[self._written % len(self._rows)] = levels
+        self._written += 1
+
+    def read_since(self, seen: int):
+        """Строки, записанные после seen, и новый счётчик."""
+        written = self._written
+        n = min(written - seen, len(self._rows))
+        if n <= 0:
+            return self._rows[:0], written
+        idx = np.arange(written - n, written) % len(self._rows)
+        return self._rows[idx].copy(), written
+
+
+def _buffer_to_array(buf) -> np.ndarray:
+    """QAudioBuffer -> float32 (кадры × каналы) в [-1, 1]."""
+    from PyQt5.QtMultimedia import QAudioFormat
+    fmt = buf.format()
+    raw = buf.constData().asstring(buf.byteCount())
+    size, kind = fmt.sampleSize(), fmt.sampleType()
+    if kind == QAudioFormat.Float and size == 32:
+        x = np.frombuffer(raw, dtype=np.float32)
+    elif kind == QAudioFormat.SignedInt and size == 16:
+        x = np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+    elif kind == QAudioFormat.SignedInt and size == 32:
+        x = np.frombuffer(raw, dtype=np.int32).astype(np.float32) / 2147483648.0
+    elif kind == QAudioFormat.UnSignedInt and size == 8:
+        x = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    else:
+        return np.zeros((0, 1), dtype=np.float32)
+    channels = max(1, fmt.channelCount())
+    return x[:len(x) // channels * channels].reshape(-1, channels)
+
+
+class LevelMeter(QObject):
+    """
+    Измеритель уровня выходного сигнала.
+    – если бэкенд поддерживает QAudioProbe, уровни считаются по каждому
+      PCM-буферу, который уходит на вывод, и складываются в LevelRing
+    – иначе уровни берутся из controller.data в окне у текущей позиции
+      (отражает эквалайзер, но не работу самого бэкенда)
+    GUI опрашивает poll() с частотой кадров.
+    """
+
+    def __init__(self, controller, parent=None):
+        super().__init__(parent)
+        self.controller = controller
+        self.ring  = LevelRing()
+        self._seen = 0
+        self.probe = None
+        self.peak_hold = METER_FLOOR_DB
+        self.clips = 0
+        self._clip_left = 0.0
+        try:
+            from PyQt5.QtMultimedia import QAudioProbe
+            probe = QAudioProbe(self)
+            if probe.setSource(controller.player):
+                probe.audioBufferProbed.connect(self._on_buffer)
+                self.probe = probe
+        except ImportError:
+            pass
+
+    @property
+    def live(self) -> bool:
+        """True, если уровни идут из реального выходного потока."""
+        return self.probe is not None
+
+    def _on_buffer(self, buf):
+        self.ring.push(block_levels(_buffer_to_array(buf)))
+
+    def _fallback_levels(self) -> np.ndarray:
+        c = self.controller
+        if c.data is None or not c.fs:
+            return np.zeros((0, 3), dtype=np.float32)
+        i = int(c.position() / 1000.0 * c.fs)
+        n = int(FALLBACK_WINDOW_SEC * c.fs)
+        return block_levels(c.data[max(0, i - n):i, None])[None, :]
+
+    def poll(self, dt: float):
+        """
+        Уровни для отображения: (пик, RMS, удерживаемый пик) в дБFS
+        и признак недавнего клиппинга. dt — время с прошлого опроса,
+        для спада удерживаемого пика и индикатора клиппинга.
+        """
+        if self.live:
+            rows, self._seen = self.ring.read_since(self._seen)
+        else:
+            rows = self._fallback_levels()
+        if len(rows):
+            peak, rms = float(rows[:, 0].max()), float(np.sqrt(np.mean(rows[:, 1] ** 2)))
+            clipped = int(rows[:, 2].sum())
+        else:
+            peak = rms = 0.0
+            clipped = 0
+        self.clips += clipped
+        self._clip_left = CLIP_HOLD_SEC if clipped else max(0.0, self._clip_left - dt)
+        to_db = lambda v: max(METER_FLOOR_DB, 20 * np.log10(v)) if v > 0 else METER_FLOOR_DB
+        peak_db, rms_db = to_db(peak), to_db(rms)
+        self.peak_hold = max(peak_db, self.peak_hold - PEAK_DECAY_DB_S * dt)
+        return peak_db, rms_db, self.peak_hold, self._clip_left > 0
+
+
+class LevelMeterWidget(QWidget):
+    """Горизонтальный индикатор: полоса RMS, полоса пика, метка пика и клиппинга."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumSize(150, 14)
+        self.levels = (METER_FLOOR_DB, METER_FLOOR_DB, METER_FLOOR_DB)
+        self.clipped = False
+
+    def set_levels(self, peak_db, rms_db, hold_db, clipped: bool):
+        levels = (round(peak_db, 1), round(rms_db, 1), round(hold_db, 1))
+        if levels != self.levels or clipped != self.clipped:
+            self.levels, self.clipped = levels, clipped
+            self.update()
+
+    def paintEvent(self, event):
+        p = QPainter(self)
+        w, h = self.width() - 6, self.height()
+        frac = lambda db: (db - METER_FLOOR_DB) / -METER_FLOOR_DB
+        peak_db, rms_db, hold_db = self.levels
+        p.fillRect(0, 0, w, h, QColor('#e0e0e0'))
+        p.fillRect(0, 0, int(w * frac(peak_db)), h, QColor('#9ecae1'))
+        p.fillRect(0, h // 4, int(w * frac(rms_db)), h // 2, QColor('#0077cc'))
+        x = int(w * frac(hold_db))
+        p.fillRect(min(x, w - 2), 0, 2, h, QColor('#333333'))
+        p.fillRect(w + 2, 0, 4, h, QColor('#cc0000') if self.clipped else QColor('#bbbbbb'))
+        p.end()
@@ -0,0 +1,188 @@
+# perf.py
+
+"""
+Лёгкая инструментовка горячих путей.
+
+    with perf.span('audio.decode', nbytes=y.nbytes): ...
+    @perf.timed('plot.waveform')
+    perf.cache_hit('mfcc') / perf.cache_miss('mfcc')
+
+Включается переменной окружения GSA_PERF=1 или perf.enable(). В выключенном
+состоянии span() возвращает общий пустой объект, а timed() — одну проверку
+флага, так что накладные расходы близки к нулю.
+
+GSA_PROFILE=<действие> (или '*') сохраняет дамп cProfile вокруг
+profile_action(<действие>) в GSA_PROFILE_DIR (по умолчанию — текущая папка).
+"""
+
+import os, time, json, threading, functools
+from collections import defaultdict
+
+_enabled = os.environ.get('GSA_PERF', '') not in ('', '0')
+_lock = threading.Lock()
+_t0 = time.perf_counter_ns()
+# Завершённые интервалы: (name, start_ns, dur_ns, thread_id, nbytes)
+_events: list[tuple] = []
+_counters: dict[str, int] = defaultdict(int)
+# Ограничение на число хранимых интервалов, чтобы долгая сессия не росла бесконечно
+MAX_EVENTS = 200_000
+
+
+def enable(flag: bool = True):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _events.clear()
+        _counters.clear()
+
+
+class _Span:
+    __slots__ = ('name', 'nbytes', 'start')
+
+    def __init__(self, name, nbytes):
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, self.start, time.perf_counter_ns() - self.start, self.nbytes)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def _record(name, start, dur, nbytes=None):
+    with _lock:
+        if len(_events) < MAX_EVENTS:
+            _events.append((name, start - _t0, dur, threading.get_ident(), nbytes))
+
+
+def span(name: str, nbytes: int = None):
+    """Контекстный менеджер, измеряющий время блока (и объём данных nbytes)."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, nbytes)
+
+
+def timed(name: str = None):
+    """Декоратор: измеряет время каждого вызова функции."""
+    def decorator(fn):
+        label = name or f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(label, start, time.perf_counter_ns() - start)
+        return wrapper
+    return decorator
+
+
+def count(name: str, n: int = 1):
+    if _enabled:
+        with _lock:
+            _counters[name] += n
+
+
+def cache_hit(cache: str):
+    count(f"{cache}.hit")
+
+
+def cache_miss(cache: str):
+    count(f"{cache}.miss")
+
+
+def summary() -> list[dict]:
+    """
+    Сводка по именам интервалов, отсортированная по суммарному времени:
+    [{"name", "calls", "total_ms", "mean_ms", "max_ms", "mbytes"}].
+    """
+    agg: dict[str, list] = {}
+    with _lock:
+        events = list(_events)
+    for name, _, dur, _, nbytes in events:
+        a = agg.setdefault(name, [0, 0, 0, 0])
+        a[0] += 1
+        a[1] += dur
+        a[2] = max(a[2], dur)
+        a[3] += nbytes or 0
+    rows = [{'name': name, 'calls': calls, 'total_ms': total / 1e6,
+             'mean_ms': total / calls / 1e6, 'max_ms': mx / 1e6, 'mbytes': nb / 2**20}
+            for name, (calls, total, mx, nb) in agg.items()]
+    return sorted(rows, key=lambda r: -r['total_ms'])
+
+
+def counters() -> dict[str, int]:
+    with _lock:
+        return dict(_counters)
+
+
+def export_chrome_trace(path: str):
+    """
+    Пишет интервалы в формате Chrome Trace Event (chrome://tracing, Perfetto);
+    счётчики кладутся в metadata.
+    """
+    pid = os.getpid()
+    with _lock:
+        events = list(_events)
+        cnt = dict(_counters)
+    trace = [{'name': name, 'ph': 'X', 'ts': start / 1000, 'dur': dur / 1000,
+              'pid': pid, 'tid': tid, 'args': {'bytes': nbytes} if nbytes else {}}
+             for name, start, dur, tid, nbytes in events]
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms',
+                   'metadata': {'counters': cnt}}, f)
+
+
+class profile_action:
+    """
+    Контекстный менеджер: если GSA_PROFILE совпадает с именем действия
+    (или равен '*'), пишет дамп cProfile в <GSA_PROFILE_DIR>/<action>-<время>.prof.
+    """
+    __slots__ = ('action', 'profiler')
+
+    def __init__(self, action: str):
+        self.action = action
+        self.profiler = None
+
+    def __enter__(self):
+        target = os.environ.get('GSA_PROFILE')
+        if target and target in ('*', self.action):
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc):
+        if self.profiler is not None:
+            self.profiler.disable()
+            out_dir = os.environ.get('GSA_PROFILE_DIR', '.')
+            stamp = time.strftime('%Y%m%d-%H%M%S')
+            self.profiler.dump_stats(os.path.join(out_dir, f"{self.action}-{stamp}.prof"))
+            self.profiler = None
+        return False
@@ -0,0 +1,200 @@
+# playlist.py
+
+import os, sys
+import numpy as np
+
+
+class Track:
+    """
+    Запись трека плейлиста.
+    Хранит путь, название, длительность (сек), исходный сигнал и его частоту
+    дискретизации. Поддерживает доступ по ключу (tr['path'], tr.get('title')),
+    чтобы старый код, написанный под словари, продолжал работать.
+    """
+    __slots__ = ('_path', '_title', '_duration', 'original_data', '_fs',
+                 'channels', 'mtime', 'size', 'loudness', '_owner')
+
+    _KEYS = ('path', 'title', 'duration', 'original_data', 'original_fs',
+             'channels', 'mtime', 'size', 'loudness')
+
+    def __init__(self, path: str, title: str = None, duration: float = 0.0,
+                 original_data: np.ndarray = None, original_fs: int = None,
+                 channels: int = None, mtime: float = None, size: int = None,
+                 loudness: dict = None):
+        self._path         = sys.intern(path)
+        self._title        = sys.intern(title if title is not None else os.path.basename(path))
+        self._duration     = float(duration or 0.0)
+        self.original_data = original_data
+        self._fs           = int(original_fs) if original_fs else 0
+        # Метаданные файла для кэша: каналы, время изменения и размер
+        self.channels      = channels
+        self.mtime         = mtime
+        self.size          = size
+        # Результат analyze_loudness: {"lufs", "true_peak", "gain_db"} или None
+        self.loudness      = loudness
+        self._owner        = None
+
+    # Путь — ключ индекса плейлиста, поэтому после создания не меняется
+    @property
+    def path(self) -> str:
+        return self._path
+
+    # Название участвует в колоночном поиске плейлиста,
+    # поэтому при изменении сбрасываем его кэш
+    @property
+    def title(self) -> str:
+        return self._title
+
+    @title.setter
+    def title(self, value):
+        self._title = sys.intern(value if value is not None else os.path.basename(self.path))
+        if self._owner is not None:
+            self._owner._invalidate()
+
+    @property
+    def duration(self) -> float:
+        return self._duration
+
+    @duration.setter
+    def duration(self, value):
+        self._duration = float(value or 0.0)
+
+    @property
+    def original_fs(self):
+        return self._fs or None
+
+    @original_fs.setter
+    def original_fs(self, value):
+        self._fs = int(value) if value else 0
+
+    # --Совместимость со словарём--
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._KEYS and getattr(self, key) is not None
+
+    def get(self, key, default=None):
+        value = getattr(self, key, None) if key in self._KEYS else None
+        return default if value is None else value
+
+    def keys(self):
+        return self._KEYS
+
+    def __repr__(self):
+        return f"Track({self.path!r}, duration={self._duration:.2f})"
+
+
+class Playlist:
+    """
+    Плейлист из записей Track.
+    – O(1) поиск по пути (index_of, in); путь трека только для чтения,
+      поэтому индекс не расходится с записями
+    – векторный фильтр по названию (filter_title) по колонке названий,
+      которая строится лениво и сбрасывается при изменениях
+    Индексация и итерация ведут себя как у списка, поэтому вызывающий код
+    (SimilarityTableDialog, save_playlist_json и т.д.) работает без изменений.
+    """
+
+    def __init__(self, tracks=None):
+        self._tracks: list[Track] = []
+        self._by_path: dict[str, int] = {}
+        self._invalidate()
+        if tracks:
+            self.extend(tracks)
+
+    # --Служебное--
+    def _invalidate(self):
+        self._titles = None
+
+    def _reindex(self):
+        self._by_path = {tr.path: i for i, tr in enumerate(self._tracks)}
+        self._invalidate()
+
+    @staticmethod
+    def _as_track(tr) -> Track:
+        if isinstance(tr, Track):
+            return tr
+        return Track(tr['path'], tr.get('title'), tr.get('duration', 0.0),
+                     tr.get('original_data'), tr.get('original_fs'))
+
+    # --Поведение списка--
+    def __len__(self):
+        return len(self._tracks)
+
+    def __iter__(self):
+        return iter(self._tracks)
+
+    def __getitem__(self, idx):
+        return self._tracks[idx]
+
+    def __contains__(self, path):
+        return path in self._by_path
+
+    def __bool__(self):
+        return bool(self._tracks)
+
+    def __repr__(self):
+        return f"Playlist({len(self._tracks)} tracks)"
+
+    def append(self, tr) -> Track:
+        """
+        Добавляет трек (Track или словарь). Дубликаты по пути не добавляются —
+        возвращается уже существующая запись.
+        """
+        tr = self._as_track(tr)
+        idx = self._by_path.get(tr.path)
+        if idx is not None:
+            return self._tracks[idx]
+        tr._owner = self
+        self._by_path[tr.path] = len(self._tracks)
+        self._tracks.append(tr)
+        self._invalidate()
+        return tr
+
+    def extend(self, tracks):
+        for tr in tracks:
+            self.append(tr)
+
+    def pop(self, idx: int = -1) -> Track:
+        tr = self._tracks.pop(idx)
+        tr._owner = None
+        self._reindex()
+        return tr
+
+    def clear(self):
+        for tr in self._tracks:
+            tr._owner = None
+        self._tracks.clear()
+        self._reindex()
+
+    # --Поиск--
+    def index_of(self, path: str):
+        """Индекс трека по пути или None."""
+        return self._by_path.get(path)
+
+    def get(self, path: str, default=None):
+        idx = self._by_path.get(path)
+        return default if idx is None else self._tracks[idx]
+
+    # --Поиск по названию--
+    @property
+    def titles(self) -> np.ndarray:
+        """Названия в нижнем регистре для векторного поиска."""
+        if self._titles is None:
+            self._titles = np.array([tr.title.lower() for tr in self._tracks], dtype=str)
+        return self._titles
+
+    def filter_title(self, text: str) -> np.ndarray:
+        """Индексы треков, в названии которых встречается text (без учёта регистра)."""
+        text = text.lower().strip()
+        if not text or not self._tracks:
+            return np.arange(len(self._tracks))
+        return np.flatnonzero(np.char.find(self.titles, text) >= 0)
@@ -1,16 +1,66 @@
 # plotting.py
 
 import numpy as np
-import librosa
 import pyqtgraph as pg
 from PyQt5.QtCore import QRectF
+import perf
+from activity import active_signal
 
 
 
+# Параметры STFT для спектра и спектрограммы
+N_FFT      = 2048
+HOP_LENGTH = 512
+# Параметры RMS-огибающей
+RMS_FRAME  = 1024
+RMS_HOP    = 512
+# Сколько точек формы волны отдавать в график
+WAVEFORM_POINTS = 50000
+
+
+@perf.timed('plot.waveform_data')
+def waveform_data(y: np.ndarray, sr: int):
+    """
+    Готовит данные для графиков формы волны и громкости без отрисовки.
+    Возвращает (t, y_ds, rms_times, rms): прореженную форму волны и RMS-огибающую.
+    """
+    import librosa
+    step = max(1, len(y) // WAVEFORM_POINTS)
+    t = np.arange(0, len(y), step) / sr
+    rms = librosa.feature.rms(y=y, frame_length=RMS_FRAME, hop_length=RMS_HOP)[0]
+    times = librosa.frames_to_time(np.arange(len(rms)), sr=sr, hop_length=RMS_HOP)
+    return t, y[::step], times, rms
+
+
+@perf.timed('plot.spectrum_data')
+def spectrum_data(y: np.ndarray, sr: int):
+    """Усреднённая амплитуда STFT: возвращает (freqs, mag_mean)."""
+    import librosa
+    D = librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    mag_mean = np.mean(np.abs(D), axis=1)
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=N_FFT)
+    return freqs, mag_mean
+
+
+@perf.timed('plot.spectrogram_data')
+def spectrogram_data(y: np.ndarray):
+    """Спектрограмма в дБ относительно максимума."""
+    import librosa
+    D = librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH)
+    return librosa.amplitude_to_db(np.abs(D), ref=np.max)
+
+
+@perf.timed('plot.waveform')
 def plot_waveform(ui):
     """
     Рисует форму волны и RMS-график громкости.
+    Пока длинный файл декодируется потоково (и после, до применения
+    эквалайзера), график строится по пирамиде пиков и RMS.
     """
+    stream = ui.controller.stream
+    if stream is not None:
+        plot_waveform_stream(ui, stream)
+        return
     y = ui.controller.data
     sr = ui.controller.fs
     if y is None or sr is None:
@@ -18,19 +68,32 @@ def plot_waveform(ui):
 
     # Подготовка данных
     duration = len(y) / sr
-    t = np.linspace(0, duration, num=len(y))
-    step = max(1, len(y) // 50000)
+    t, y_ds, times, rms = waveform_data(y, sr)
+    # Огибающая уже посчитана — по ней же строится карта активности трека,
+    # если на графике исходный сигнал (после эквалайзера карта считается по исходному)
+    ui.controller.activity_map(rms, RMS_HOP, source=y)
 
     # Получаем PlotItem вместо прямого PlotWidget
     plot_item = ui.plot_widget.getPlotItem()
     plot_item.clear()
-    plot_item.plot(t[::step], y[::step], pen=pg.mkPen('#0077cc'), downsample=True, clipToView=True)
+    plot_item.plot(t, y_ds, pen=pg.mkPen('#0077cc'), downsample=True, clipToView=True)
     plot_item.setLabel('bottom', 'Time', units='s')
     plot_item.setLabel('left', 'Amplitude')
   
 
     # Линии
-    ui.playhead.setPos(0) 
+    _setup_lines(ui, duration)
+    # RMS громкости
+    vol_item = ui.vol_plot_widget.getPlotItem()
+    vol_item.clear()
+    vol_item.plot(times, rms, pen=pg.mkPen('#cc0000'))
+    vol_item.setLabel('bottom', 'Time', units='s')
+    vol_item.setLabel('left', 'RMS')
+  
+
+def _setup_lines(ui, duration):
+    """Ставит playhead и маркеры выделения на график формы волны."""
+    ui.playhead.setPos(0)
     ui.start_line.setPos(0)
     ui.end_line.setPos(duration)
     ui.playhead.setVisible(True)
@@ -39,17 +102,43 @@ def plot_waveform(ui):
     ui.plot_widget.addItem(ui.start_line)
     ui.plot_widget.addItem(ui.end_line)
     ui.plot_widget.addItem(ui.playhead)
-    # RMS громкости
-    rms = librosa.feature.rms(y=y, frame_length=1024, hop_length=512)[0]
-    times = librosa.frames_to_time(np.arange(len(rms)), sr=sr, hop_length=512)
 
-    vol_item = ui.vol_plot_widget.getPlotItem()
-    vol_item.clear()
-    vol_item.plot(times, rms, pen=pg.mkPen('#cc0000'))
-    vol_item.setLabel('bottom', 'Time', units='s')
-    vol_item.setLabel('left', 'RMS')
-  
 
+@perf.timed('plot.waveform_stream')
+def plot_waveform_stream(ui, stream):
+    """
+    Рисует огибающую min/max и RMS по пирамиде StreamingDecode.
+    При первом вызове для потока создаёт кривые и оси на всю длительность
+    файла, при следующих только обновляет данные кривых.
+    """
+    pyramid = stream.pyramid
+    if pyramid is None:
+        return
+    items = getattr(ui, '_stream_items', None)
+    # Кривые пересоздаются для нового потока или если график успели очистить
+    if items is None or items[0] is not stream or items[1].scene() is None:
+        plot_item = ui.plot_widget.getPlotItem()
+        plot_item.clear()
+        wave = plot_item.plot(pen=pg.mkPen('#0077cc'))
+        plot_item.setLabel('bottom', 'Time', units='s')
+        plot_item.setLabel('left', 'Amplitude')
+        plot_item.setXRange(0, stream.duration, padding=0)
+        _setup_lines(ui, stream.duration)
+        vol_item = ui.vol_plot_widget.getPlotItem()
+        vol_item.clear()
+        rms_curve = vol_item.plot(pen=pg.mkPen('#cc0000'))
+        vol_item.setLabel('bottom', 'Time', units='s')
+        vol_item.setLabel('left', 'RMS')
+        vol_item.setXRange(0, stream.duration, padding=0)
+        items = ui._stream_items = (stream, wave, rms_curve)
+
+    times, mins, maxs, rms = pyramid.view(WAVEFORM_POINTS // 2)
+    # Вертикальный отрезок min..max на каждое окно
+    items[1].setData(np.repeat(times, 2), np.column_stack([mins, maxs]).ravel(), connect='pairs')
+    items[2].setData(times, rms)
+
+
+@perf.timed('plot.spectrum')
 def plot_spectrum(ui):
     """
     Рисует спектр (усреднённая амплитуда STFT) выбранного сегмента в ui.plot_widget.
@@ -60,13 +149,14 @@ def plot_spectrum(ui):
     if y_seg is None or sr is None:
         return
 
-    # STFT
-    n_fft = 2048
-    hop_length = 512
-    D = librosa.stft(y_seg, n_fft=n_fft, hop_length=hop_length)
-    S_mag = np.abs(D)
-    mag_mean = np.mean(S_mag, axis=1)
-    freqs = librosa.fft_frequencies(sr=sr, n_fft=n_fft)
+    # STFT только по звучащим кадрам: тишина не тянет спектр вниз
+    # Во фрагменте целиком из тишины (или короче окна) остаётся весь фрагмент
+    amap = ui.controller.activity_map()
+    if amap is not None:
+        y_act = active_signal(y_seg, amap.slice(start_sec, end_sec))
+        if len(y_act) >= N_FFT:
+            y_seg = y_act
+    freqs, mag_mean = spectrum_data(y_seg, sr)
 
     # Отрисовка
     widget = ui.plot_widget
@@ -119,17 +209,18 @@ def plot_spectrum(ui):
 #     plot_item.setLabel('left', 'Frequency', units='Hz')
 #     plot_item.setTitle('Spectrogram')
 #     plot_item.getViewBox().enableAutoRange(False)
+@perf.timed('plot.spectrogram')
 def plot_spectrogram(ui):
     ui.spec_ax.clear()
     y_seg, sr, start_sec, end_sec = ui.controller.get_segment(ui.start_line.value(),ui.end_line.value())
     if y_seg is None: 
         return
-    D = librosa.stft(y_seg, n_fft=2048, hop_length=512)
-    S_db = librosa.amplitude_to_db(np.abs(D), ref=np.max)
+    S_db = spectrogram_data(y_seg)
+    import librosa.display
     librosa.display.specshow(
         S_db,
         sr=sr,
-        hop_length=512,
+        hop_length=HOP_LENGTH,
         x_axis='time',
         y_axis='hz',
         cmap='inferno',
@@ -137,3 +228,77 @@ def plot_spectrogram(ui):
     )
     ui.spec_ax.set_ylim(0, sr/2)
     ui.spec_canvas.draw()
+
+
+# Сколько плиток вида «Структура» держать на сцене
+STRUCTURE_ITEMS = 128
+
+
+def plot_structure(ui):
+    """
+    Вид «Структура»: матрица самоподобия текущего трека. Кадры признаков
+    и плитки считаются в фоне (ui.structure_thread); здесь только сброс
+    сцены и запрос кадров для нового трека.
+    """
+    c = ui.controller
+    if c.current_index is None or c.data is None:
+        return
+    tr = c.playlist[c.current_index]
+    state = ui._structure
+    if state is not None and state['path'] == tr.path:
+        ui.render.invalidate('structure')
+        return
+    ui._structure = {'path': tr.path, 'tiles': None, 'items': {}}
+    ui.structure_widget.getPlotItem().clear()
+    y = tr.original_data if tr.original_data is not None else c.data
+    ui.structure_thread.load(tr.path, y, c.fs)
+
+
+def structure_loaded(ui, path, tiles):
+    """Кадры трека готовы: оси на всю длительность и запрос видимых плиток."""
+    state = ui._structure
+    if state is None or state['path'] != path:
+        return
+    state['tiles'] = tiles
+    ui.structure_widget.getPlotItem().setRange(xRange=(0, tiles.duration),
+                                               yRange=(0, tiles.duration), padding=0)
+    ui.render.invalidate('structure')
+
+
+@perf.timed('plot.structure')
+def render_structure(ui):
+    """
+    Запрашивает плитки видимой области на уровне пулинга, соответствующем
+    масштабу. Уже показанные плитки не пересчитываются; лишние (вне
+    области) убираются со сцены, когда их больше STRUCTURE_ITEMS.
+    """
+    state = ui._structure
+    if state is None or state['tiles'] is None or not ui.structure_widget.isVisible():
+        return
+    tiles, items = state['tiles'], state['items']
+    vb = ui.structure_widget.getViewBox()
+    (x0, x1), (y0, y1) = vb.viewRange()
+    level = tiles.pick_level(max(x1 - x0, y1 - y0), max(vb.width(), vb.height()))
+    coords = tiles.visible(level, x0, x1, y0, y1)
+    missing = [ij for ij in coords if (level, *ij) not in items]
+    if missing:
+        ui.structure_thread.request(tiles, level, missing)
+    if len(items) > STRUCTURE_ITEMS:
+        keep = {(level, *ij) for ij in coords}
+        for key in [k for k in items if k not in keep]:
+            ui.structure_widget.removeItem(items.pop(key))
+
+
+def add_structure_tile(ui, tiles, level, i, j, img):
+    """Ставит готовую плитку на сцену; более мелкий уровень рисуется поверх."""
+    from structure import TILE
+    state = ui._structure
+    if state is None or state['tiles'] is not tiles or (level, i, j) in state['items']:
+        return
+    step = tiles.tile_sec(level)
+    h, w = img.shape
+    item = pg.ImageItem(img, axisOrder='row-major', levels=(0, 255))
+    item.setRect(QRectF(j * step, i * step, w / TILE * step, h / TILE * step))
+    item.setZValue(-level)
+    ui.structure_widget.addItem(item)
+    state['items'][(level, i, j)] = item
@@ -0,0 +1,60 @@
+# probe.py
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def probe_file(path: str):
+    """
+    Читает метаданные аудиофайла из заголовка, не декодируя PCM.
+    Сначала пробует soundfile (WAV/FLAC/OGG, MP3 в новых libsndfile),
+    затем audioread (ffmpeg/gstreamer) для остальных форматов.
+
+    Возвращает словарь {"path", "duration", "sr", "channels", "bitrate",
+    "size", "mtime"} или None, если файл прочитать не удалось.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+
+    duration = sr = channels = None
+    try:
+        import soundfile as sf
+        info = sf.info(path)
+        sr, channels = info.samplerate, info.channels
+        duration = info.frames / sr if sr else info.duration
+    except Exception:
+        try:
+            import audioread
+            with audioread.audio_open(path) as f:
+                duration, sr, channels = f.duration, f.samplerate, f.channels
+        except Exception:
+            return None
+
+    # Средний битрейт по размеру файла — для WAV совпадает с sr*channels*bits
+    bitrate = int(st.st_size * 8 / duration) if duration else None
+    return {
+        'path':     path,
+        'duration': float(duration or 0.0),
+        'sr':       int(sr) if sr else None,
+        'channels': int(channels) if channels else None,
+        'bitrate':  bitrate,
+        'size':     st.st_size,
+        'mtime':    st.st_mtime,
+    }
+
+
+def probe_files(paths, max_workers: int = None) -> list:
+    """
+    Параллельно опрашивает заголовки файлов из paths (пул потоков:
+    работа упирается в ввод-вывод). Порядок результатов совпадает с paths,
+    для нечитаемых файлов в списке стоит None.
+    """
+    paths = list(paths)
+    if len(paths) <= 1:
+        return [probe_file(p) for p in paths]
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(probe_file, paths))
@@ -0,0 +1,82 @@
+# scheduler.py
+
+import os
+from PyQt5.QtCore import QObject, QTimer
+import perf
+
+# Верхняя граница частоты перерисовки, кадров/с (GSA_MAX_FPS)
+MAX_FPS = int(os.environ.get('GSA_MAX_FPS', 30))
+
+
+class RenderScheduler(QObject):
+    """
+    Единая точка перерисовки интерфейса.
+    – invalidate(name) только помечает обработчик «грязным»; все пометки
+      за кадр сливаются в один вызов каждого обработчика
+    – анимируемые обработчики (playhead во время воспроизведения)
+      вызываются раз в кадр, пока анимация включена
+    – пока окно скрыто или свёрнуто, кадры не планируются вовсе;
+      resume() из showEvent/changeEvent догоняет отложенные пометки
+    """
+
+    def __init__(self, window, fps: int = None):
+        super().__init__(window)
+        self._window    = window
+        self._handlers  = {}
+        self._dirty     = set()
+        self._animating = set()
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.frame_interval(fps))
+        self._timer.timeout.connect(self._flush)
+
+    @staticmethod
+    def frame_interval(fps: int = None) -> int:
+        """Интервал кадра в мс: частота экрана, но не выше MAX_FPS."""
+        if fps is None:
+            from PyQt5.QtGui import QGuiApplication
+            screen = QGuiApplication.primaryScreen()
+            fps = screen.refreshRate() if screen is not None else 60
+        return max(1, int(1000 / max(1, min(fps, MAX_FPS))))
+
+    def register(self, name: str, handler):
+        self._handlers[name] = handler
+
+    def invalidate(self, name: str):
+        """Просит перерисовать name в ближайшем кадре."""
+        self._dirty.add(name)
+        self._schedule()
+
+    def set_animating(self, name: str, enabled: bool):
+        """Включает/выключает покадровый вызов обработчика name."""
+        if enabled:
+            self._animating.add(name)
+            self._schedule()
+        else:
+            self._animating.discard(name)
+
+    def resume(self):
+        """Окно снова видно: планирует кадр, если есть что рисовать."""
+        if self._dirty or self._animating:
+            self._schedule()
+
+    def _can_paint(self) -> bool:
+        w = self._window
+        return w.isVisible() and not w.isMinimized()
+
+    def _schedule(self):
+        if not self._timer.isActive() and self._can_paint():
+            self._timer.start()
+
+    def _flush(self):
+        if not self._can_paint():
+            return
+        names = self._dirty | self._animating
+        self._dirty.clear()
+        for name in names:
+            handler = self._handlers.get(name)
+            if handler is not None:
+                handler()
+        perf.count('render.frames')
+        if self._animating or self._dirty:
+            self._timer.start()
@@ -0,0 +1,64 @@
+# score_store.py
+
+import os, sqlite3
+
+# Хранилище по умолчанию
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser('~'), '.gui-sound-app', 'scores.sqlite')
+
+
+class PairScoreStore:
+    """
+    Симметричное хранилище сырых оценок сходства пар треков в SQLite:
+    DTW-расстояние MFCC-кадров и косинус хрома-векторов — отдельно,
+    без весов и alpha, чтобы итоговую оценку можно было пересчитать
+    с любыми параметрами. Ключ трека — track_cache_key (путь, размер,
+    mtime), плюс версия признаков: изменённый файл или новая версия
+    извлечения дают промах.
+    """
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH, version: int = 1):
+        self.path    = path
+        self.version = version
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pairs (
+                key_a   TEXT NOT NULL,
+                key_b   TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                dtw     REAL NOT NULL,
+                chroma  REAL NOT NULL,
+                PRIMARY KEY (key_a, key_b, version)
+            ) WITHOUT ROWID""")
+        self._db.commit()
+
+    @staticmethod
+    def _pair(a: str, b: str):
+        return (a, b) if a <= b else (b, a)
+
+    def get_many(self, ref_key: str, keys) -> dict:
+        """{key: (dtw, chroma)} для пар (ref_key, key), которые уже есть в хранилище."""
+        keys = list(set(keys))
+        found = {}
+        # Пара хранится один раз, поэтому ищем ref_key с обеих сторон
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            marks = ','.join('?' * len(chunk))
+            rows = self._db.execute(
+                f"SELECT key_a, key_b, dtw, chroma FROM pairs WHERE version = ? AND "
+                f"((key_a = ? AND key_b IN ({marks})) OR (key_b = ? AND key_a IN ({marks})))",
+                [self.version, ref_key, *chunk, ref_key, *chunk]).fetchall()
+            for a, b, dtw, chroma in rows:
+                found[b if a == ref_key else a] = (dtw, chroma)
+        return found
+
+    def put_many(self, ref_key: str, scores: dict):
+        """Сохраняет {key: (dtw, chroma)} для пар (ref_key, key)."""
+        rows = [(*self._pair(ref_key, k), self.version, float(d), float(c))
+                for k, (d, c) in scores.items()]
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO pairs VALUES (?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        self._db.close()
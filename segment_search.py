@@ -0,0 +1,219 @@
+# segment_search.py
+
+import os, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import perf
+from utils import file_signature, track_cache_key
+
+# Сетка кадров поиска: все треки приводятся к одной частоте
+SEARCH_SR  = 22050
+SEARCH_HOP = 512
+N_MFCC     = 20
+
+# Версия дискового кэша кадров поиска
+FRAMES_VERSION = 1
+# Сколько треков держать в памяти; остальные читаются из FeatureCache
+FRAME_CACHE_SIZE = 64
+
+# Кэш покадровых признаков (LRU): track_cache_key -> float32 (T, D)
+_frame_cache: OrderedDict = OrderedDict()
+_frame_lock = threading.Lock()
+_disk_cache = None
+
+
+def _store():
+    global _disk_cache
+    if _disk_cache is None:
+        from feature_cache import FeatureCache
+        _disk_cache = FeatureCache(kind='segment_frames', version=FRAMES_VERSION)
+    return _disk_cache
+
+
+def segment_frames(y: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Покадровые признаки для поиска: MFCC 1..N_MFCC-1 (без c0, чтобы громкость
+    не влияла на совпадение). Возвращает float32 (T, D).
+    """
+    import librosa
+    if sr != SEARCH_SR:
+        y = librosa.resample(y, orig_sr=sr, target_sr=SEARCH_SR)
+    mfcc = librosa.feature.mfcc(y=y, sr=SEARCH_SR, n_mfcc=N_MFCC, hop_length=SEARCH_HOP)
+    return np.ascontiguousarray(mfcc[1:].T, dtype=np.float32)
+
+
+def _load_frames(path: str) -> np.ndarray:
+    """Кадры трека с диска (FeatureCache) или из файла — тогда они сохраняются на диск."""
+    cached = _store().get(path)
+    if cached is not None:
+        perf.cache_hit('segment_frames')
+        return cached['frames']
+    perf.cache_miss('segment_frames')
+    import librosa
+    y, _ = librosa.load(path, sr=SEARCH_SR, mono=True)
+    feats = segment_frames(y, SEARCH_SR)
+    try:
+        _store().put(path, {'frames': feats})
+    except OSError:
+        pass
+    return feats
+
+
+def store_frames(path: str) -> None:
+    """Предрасчёт кадров на диск без заполнения памяти (для сканирования библиотеки)."""
+    store = _store()
+    key = store.key_for(path)
+    if key is None:
+        raise OSError(f"файл недоступен: {path}")
+    if not os.path.exists(store._file(key)):
+        _load_frames(path)
+
+
+def track_frames(path: str) -> np.ndarray:
+    """Покадровые признаки трека: из памяти (LRU по track_cache_key) или через _load_frames."""
+    sig = file_signature(path)
+    key = track_cache_key(path, *sig) if sig else None
+    with _frame_lock:
+        feats = _frame_cache.get(key) if key is not None else None
+        if feats is not None:
+            _frame_cache.move_to_end(key)
+    if feats is not None:
+        perf.cache_hit('segment_frames')
+        return feats
+    feats = _load_frames(path)
+    if key is not None:
+        with _frame_lock:
+            _frame_cache[key] = feats
+            while len(_frame_cache) > FRAME_CACHE_SIZE:
+                _frame_cache.popitem(last=False)
+    return feats
+    cached = _store().get(path) if key is not None else None
+    if cached is not None:
+        perf.cache_hit('segment_frames')
+        feats = cached['frames']
+    else:
+        perf.cache_miss('segment_frames')
+        import librosa
+        y, _ = librosa.load(path, sr=SEARCH_SR, mono=True)
+        feats = segment_frames(y, SEARCH_SR)
+        try:
+            _store().put(path, {'frames': feats})
+        except OSError:
+            pass
+    if key is not None:
+        with _frame_lock:
+            _frame_cache[key] = feats
+            while len(_frame_cache) > FRAME_CACHE_SIZE:
+                _frame_cache.popitem(last=False)
+    return feats
+
+
+def _window_sums(x: np.ndarray, m: int) -> np.ndarray:
+    """Суммы по скользящему окну длины m вдоль оси 0 (через кумулятивные суммы)."""
+    c = np.cumsum(np.concatenate([np.zeros((1,) + x.shape[1:]), x], axis=0), axis=0)
+    return c[m:] - c[:-m]
+
+
+def lower_bounds(q: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    Нижняя граница квадрата евклидова расстояния между q (m, D)
+    и каждым окном x[t:t+m]: m*||mean(q) - mean(x_t)||^2 (среднее — проекция).
+    Считается за O(T*D) без перебора окон.
+    """
+    m = len(q)
+    means = _window_sums(x, m) / m
+    return m * np.sum((means - q.mean(axis=0)) ** 2, axis=1)
+
+
+def window_distances(q: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    Квадраты евклидовых расстояний от q (m, D) до всех окон x (T, D):
+    ||q||^2 + ||x_t||^2 - 2<q, x_t>, скалярное произведение — через БПФ.
+    """
+    from scipy.signal import fftconvolve
+    m = len(q)
+    cross = fftconvolve(x, q[::-1], mode='valid', axes=0).sum(axis=1)
+    x_sq = _window_sums(np.sum(x.astype(np.float64) ** 2, axis=1), m)
+    return np.maximum(0.0, np.sum(q.astype(np.float64) ** 2) + x_sq - 2 * cross)
+
+
+def _best_hits(dist: np.ndarray, m: int, k: int) -> list[tuple[int, float]]:
+    """До k лучших позиций, разнесённых не меньше чем на m кадров."""
+    hits = []
+    for pos in np.argsort(dist):
+        if len(hits) >= k:
+            break
+        if all(abs(int(pos) - p) >= m for p, _ in hits):
+            hits.append((int(pos), float(dist[pos])))
+    return hits
+
+
+@perf.timed('segment_search.search')
+def search_segment(y_seg: np.ndarray, sr: int, paths: list[str],
+                   top_k: int = 20, per_track: int = 3, max_workers: int = None,
+                   on_progress=None) -> list[tuple]:
+    """
+    Ищет фрагмент y_seg во всех треках paths.
+    Треки обходятся по возрастанию нижней границы расстояния; трек, чья
+    граница не лучше текущего k-го результата, пропускается без точного расчёта.
+    on_progress(готово, всего) вызывается по мере загрузки признаков треков.
+
+    Возвращает [(индекс трека, смещение в секундах, сходство 0..1)],
+    отсортированный по убыванию сходства.
+    """
+    q = segment_frames(y_seg, sr)
+    m, D = q.shape
+    if m < 2:
+        return []
+
+    # Признаки треков (недостающие — параллельно)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    frames = [None] * len(paths)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_safe_frames, p): i for i, p in enumerate(paths)}
+        for done, fut in enumerate(as_completed(futures), 1):
+            frames[futures[fut]] = fut.result()
+            if on_progress is not None:
+                on_progress(done, len(paths))
+
+    # Нижние границы для каждого трека
+    candidates = []
+    for idx, x in enumerate(frames):
+        if x is None or len(x) < m:
+            continue
+        lb = lower_bounds(q, x)
+        candidates.append((float(lb.min()), idx, lb))
+    candidates.sort(key=lambda c: c[0])
+
+    results: list[tuple[float, int, int]] = []   # (dist, idx, pos)
+    threshold = np.inf
+    pruned = 0
+    for track_lb, idx, lb in candidates:
+        if track_lb >= threshold:
+            pruned += 1
+            continue
+        dist = window_distances(q, frames[idx])
+        # Окна, отсечённые нижней границей, заведомо не лучше порога
+        dist[lb >= threshold] = np.inf
+        for pos, d in _best_hits(dist, m, per_track):
+            if np.isfinite(d):
+                results.append((d, idx, pos))
+        results.sort()
+        del results[top_k:]
+        if len(results) == top_k:
+            threshold = results[-1][0]
+    perf.count('segment_search.pruned_tracks', pruned)
+
+    hop_sec = SEARCH_HOP / SEARCH_SR
+    # Среднее расстояние на кадр и признак переводим в сходство 0..1
+    return [(idx, pos * hop_sec, float(1.0 / (1.0 + d / (m * D))))
+            for d, idx, pos in results]
+
+
+def _safe_frames(path):
+    try:
+        return track_frames(path)
+    except Exception:
+        return None
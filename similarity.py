@@ -1,88 +1,241 @@
 # similarity.py
 
+from collections import OrderedDict
 import numpy as np
-import librosa
 from numpy.linalg import norm
-from fastdtw import fastdtw
-from scipy.spatial.distance import euclidean
+import perf
+from features import frame_features, block_deltas
+from activity import activity_for, active_signal
+from beats import DTW_POOLING, POOLING_MODES, track_beats, segment_bounds, pool_frames
+
+# librosa, fastdtw и scipy импортируются лениво внутри функций:
+# модуль подключается при старте GUI, а признаки нужны не сразу
 
 # Кэш признаков
 _mfcc_cache: dict[str, np.ndarray] = {}
 _chroma_cache: dict[str, np.ndarray] = {}
+# Признаки track_features для сравнения пар в этом процессе (LRU по
+# track_cache_key): каждый трек декодируется и считается один раз,
+# эталон не пересчитывается для каждой пары
+TRACK_FEATURES_SIZE = 32
+_track_features_cache: OrderedDict = OrderedDict()
+
+# Версия извлечения признаков сходства: при изменении сохранённые
+# оценки пар (score_store) перестают совпадать; BEATS_VERSION меняется вместе с ней
+SIMILARITY_VERSION = 4
+# Версия оценок пар в хранилище: DTW-расстояния зависят и от режима пулинга
+SCORE_VERSION = SIMILARITY_VERSION * 10 + POOLING_MODES.index(DTW_POOLING)
+# Версия сводных признаков (дисковый кэш analyze.py)
+SUMMARY_VERSION = 2
+
+def _decode(path: str):
+    """Сигнал трека без тишины (карта активности кэшируется по пути)."""
+    import librosa
+    with perf.span('similarity.decode'):
+        y, sr = librosa.load(path, sr=None, mono=True)
+    return active_signal(y, activity_for(y, sr, path)), sr
+
+def extract_many(paths, n_mfcc: int = 13):
+    """
+    Заполняет кэши среднего MFCC и хрома для paths: каждый трек
+    декодируется один раз, признаки всех треков считаются одним батчем
+    (один STFT на трек).
+    """
+    todo = [p for p in dict.fromkeys(paths) if p not in _mfcc_cache or p not in _chroma_cache]
+    for p in paths:
+        if p in todo:
+            perf.cache_miss('mfcc')
+        else:
+            perf.cache_hit('mfcc')
+    if not todo:
+        return
+    signals = [_decode(p) for p in todo]
+    with perf.span('similarity.features', nbytes=sum(y.nbytes for y, _ in signals)):
+        feats = frame_features(signals, n_mfcc)
+    for p, f in zip(todo, feats):
+        _mfcc_cache[p] = np.mean(f['mfcc'], axis=1)
+        _chroma_cache[p] = np.mean(f['chroma'], axis=1)
 
 def extract_mfcc(path: str, n_mfcc: int = 13) -> np.ndarray:
-    """Средний MFCC вектор по всему треку."""
-    if path in _mfcc_cache:
-        return _mfcc_cache[path]
-    y, sr = librosa.load(path, sr=None, mono=True)
-    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=n_mfcc)
-    vec = np.mean(mfcc, axis=1)
-    _mfcc_cache[path] = vec
-    return vec
+    """Средний MFCC вектор по всему треку (хрома считается тем же проходом)."""
+    extract_many([path], n_mfcc)
+    return _mfcc_cache[path]
 
 def extract_chroma(path: str) -> np.ndarray:
-    """Средний хрома-вектор по всему треку."""
-    if path in _chroma_cache:
-        return _chroma_cache[path]
-    y, sr = librosa.load(path, sr=None, mono=True)
-    c = librosa.feature.chroma_stft(y=y, sr=sr)
-    vec = np.mean(c, axis=1)
-    _chroma_cache[path] = vec
-    return vec
+    """Средний хрома-вектор по всему треку (MFCC считается тем же проходом)."""
+    extract_many([path])
+    return _chroma_cache[path]
+
+def block_frames(y: np.ndarray, sr: int, n_mfcc: int = 13, blocks: int = 6) -> np.ndarray:
+    """
+    Разбивает сигнал на blocks блоков и строит покадровые MFCC+дельты.
+    Возвращает массив shape (T, 3*n_mfcc).
+    """
+    mfcc = frame_features([(y, sr)], n_mfcc)[0]['mfcc']
+    return block_deltas(mfcc, blocks)
+
+def dtw_frames(f: dict, sr: int, blocks: int = 6, path: str = None):
+    """
+    Кадры для DTW из признаков frame_features: MFCC+дельты по блокам.
+    При DTW_POOLING кадры усредняются по долям (доли оцениваются один раз
+    и кэшируются по path) или по окнам POOL_WINDOW_SEC, что сокращает
+    последовательность в 20–50 раз. Возвращает (кадры, средняя длина
+    сегмента в исходных кадрах) — множитель, возвращающий DTW-расстояние
+    к шкале покадрового режима.
+    """
+    X = block_deltas(f['mfcc'], blocks).astype(np.float32)
+    if not DTW_POOLING:
+        return X, 1.0
+    beats = track_beats(f['onset'], sr, path) if DTW_POOLING == 'beats' else None
+    with perf.span('similarity.pool_frames'):
+        return pool_frames(X, segment_bounds(len(X), sr, beats))
+
+def track_features_many(signals, n_mfcc: int = 13, paths=None, blocks: int = 6) -> list[dict]:
+    """track_features для нескольких сигналов [(y, sr), ...] одним батчем."""
+    paths = paths or [None] * len(signals)
+    out = []
+    for (_, sr), f, path in zip(signals, frame_features(signals, n_mfcc), paths):
+        frames, scale = dtw_frames(f, sr, blocks, path)
+        out.append({
+            'mfcc':   np.mean(f['mfcc'], axis=1).astype(np.float32),
+            'chroma': np.mean(f['chroma'], axis=1).astype(np.float32),
+            'frames': frames,
+            'scale':  np.float32(scale),
+        })
+    return out
+
+def track_features(y: np.ndarray, sr: int, n_mfcc: int = 13, path: str = None) -> dict:
+    """
+    Признаки трека по уже загруженному сигналу (для фоновых задач):
+    {"mfcc": средний MFCC, "chroma": средний хрома-вектор,
+     "frames": кадры MFCC+дельт для DTW, "scale": их множитель (dtw_frames)}
+    — компактные float32-массивы. path нужен для кэша долей.
+    """
+    return track_features_many([(y, sr)], n_mfcc, [path])[0]
+
+def path_features(paths, n_mfcc: int = 13, blocks: int = 6) -> list[dict]:
+    """
+    track_features треков по путям из кэша _track_features_cache;
+    недостающие декодируются и считаются одним батчем.
+    """
+    from utils import file_signature, track_cache_key
+    keys = {}
+    for p in dict.fromkeys(paths):
+        sig = file_signature(p)
+        keys[p] = (track_cache_key(p, *sig), n_mfcc, blocks) if sig else None
+    found, todo = {}, []
+    for p, key in keys.items():
+        f = _track_features_cache.get(key) if key is not None else None
+        if f is None:
+            perf.cache_miss('track_features')
+            todo.append(p)
+        else:
+            perf.cache_hit('track_features')
+            _track_features_cache.move_to_end(key)
+            found[p] = f
+    if todo:
+        signals = [_decode(p) for p in todo]
+        with perf.span('similarity.block_feats', nbytes=sum(y.nbytes for y, _ in signals)):
+            feats = track_features_many(signals, n_mfcc, todo, blocks)
+        for p, f in zip(todo, feats):
+            found[p] = f
+            if keys[p] is not None:
+                _track_features_cache[keys[p]] = f
+        while len(_track_features_cache) > TRACK_FEATURES_SIZE:
+            _track_features_cache.popitem(last=False)
+    return [found[p] for p in paths]
+
+def summary_features_many(signals, n_mfcc: int = 20) -> list[dict]:
+    """summary_features для нескольких сигналов [(y, sr), ...] одним батчем."""
+    f32 = lambda v: np.asarray(v, dtype=np.float32)
+    out = []
+    for (y, sr), f in zip(signals, frame_features(signals, n_mfcc)):
+        out.append({
+            'mfcc_mean':   f32(f['mfcc'].mean(axis=1)),
+            'mfcc_std':    f32(f['mfcc'].std(axis=1)),
+            'chroma_mean': f32(f['chroma'].mean(axis=1)),
+            'rms':         f32([f['rms'].mean(), f['rms'].std()]),
+            'spectral':    f32([f['centroid'].mean(), f['bandwidth'].mean(), f['rolloff'].mean()]),
+            'duration':    f32(len(y) / sr),
+        })
+    return out
+
+def summary_features(y: np.ndarray, sr: int, n_mfcc: int = 20) -> dict:
+    """
+    Сводные признаки трека для пакетного анализа (analyze.py):
+    средние и СКО MFCC, средний хрома-вектор, RMS и спектральные
+    центроид/ширина/спад. Все значения — компактные float32-массивы.
+    """
+    return summary_features_many([(y, sr)], n_mfcc)[0]
+
+def frames_dtw_distance(A: np.ndarray, B: np.ndarray) -> float:
+    """DTW расстояние между покадровыми признаками через fastdtw."""
+    from fastdtw import fastdtw
+    from scipy.spatial.distance import euclidean
+    # fastdtw возвращает (distance, path)
+    with perf.span('similarity.fastdtw'):
+        dist, _ = fastdtw(A, B, dist=euclidean)
+    return dist
+
+def features_dtw_distance(a: dict, b: dict) -> float:
+    """DTW-расстояние по признакам track_features в шкале покадрового режима."""
+    scale = (float(a.get('scale', 1.0)) + float(b.get('scale', 1.0))) / 2
+    return frames_dtw_distance(a['frames'], b['frames']) * scale
+
+def cosine_similarity(v1: np.ndarray, v2: np.ndarray) -> float:
+    """Косинусное сходство двух векторов (0 для нулевых)."""
+    denom = norm(v1)*norm(v2)
+    if denom == 0:
+        return 0.0
+    return float(np.dot(v1, v2) / denom)
 
 def mfcc_dtw_distance(path1: str, path2: str,
                       n_mfcc: int = 13, blocks: int = 6) -> float:
     """
     Разбивает треки на blocks блоков, строит MFCC+дельты и
-    считает DTW расстояние через fastdtw.
+    считает DTW расстояние через fastdtw. Признаки берутся из кэша
+    path_features (недостающие считаются одним батчем); при DTW_POOLING
+    кадры пулируются по долям.
     """
-    def block_feats(path):
-        y, sr = librosa.load(path, sr=None, mono=True)
-        L = len(y)
-        step = L // blocks
-        feats = []
-        for i in range(blocks):
-            start = i*step
-            end   = L if i == blocks-1 else (i+1)*step
-            yb = y[start:end]
-            mf = librosa.feature.mfcc(y=yb, sr=sr, n_mfcc=n_mfcc)
-            d1 = librosa.feature.delta(data=mf)
-            d2 = librosa.feature.delta(data=mf, order=2)
-            feats.append(np.vstack([mf, d1, d2]))
-        # получаем массив shape (T, features)
-        return np.hstack(feats).T
-
-    A = block_feats(path1)
-    B = block_feats(path2)
-    # fastdtw возвращает (distance, path)
-    dist, _ = fastdtw(A, B, dist=euclidean)
-    return dist
+    a, b = path_features([path1, path2], n_mfcc, blocks)
+    return features_dtw_distance(a, b)
 
 def dtw_similarity(path1: str, path2: str, alpha: float = 0.0005) -> float:
     """
     Переводим DTW-расстояние в [0..1] через экспоненту.
     Чем меньше dist, тем ближе к 1.
     """
-    d = mfcc_dtw_distance(path1, path2)
+    return dtw_to_similarity(mfcc_dtw_distance(path1, path2), alpha)
+
+def dtw_to_similarity(d: float, alpha: float = 0.0005) -> float:
+    """Переводит DTW-расстояние в [0..1]: exp(-alpha*d)."""
     return float(np.exp(-alpha * d))
 
 def chroma_similarity(path1: str, path2: str) -> float:
     """Косинусное сходство между средними хрома-векторами."""
-    v1 = extract_chroma(path1)
-    v2 = extract_chroma(path2)
-    denom = norm(v1)*norm(v2)
-    if denom == 0:
-        return 0.0
-    return float(np.dot(v1, v2) / denom)
+    return cosine_similarity(extract_chroma(path1), extract_chroma(path2))
+
+def pair_components(path1: str, path2: str) -> tuple[float, float]:
+    """Сырые компоненты сходства пары: (DTW-расстояние, косинус хрома-векторов)."""
+    a, b = path_features([path1, path2])
+    return float(features_dtw_distance(a, b)), cosine_similarity(a['chroma'], b['chroma'])
+
+def combine_scores(dtw, chroma, w_mfcc: float = 0.6, w_chroma: float = 0.4,
+                   alpha: float = 0.0005):
+    """
+    Векторная версия комбинированной метрики для массивов сырых компонент:
+    w_mfcc*exp(-alpha*dtw) + w_chroma*chroma.
+    """
+    return w_mfcc*np.exp(-alpha*np.asarray(dtw, dtype=np.float64)) + \
+        w_chroma*np.asarray(chroma, dtype=np.float64)
 
+@perf.timed('similarity.combined')
 def combined_similarity(path1: str, path2: str,
                         w_mfcc: float = 0.6, w_chroma: float = 0.4) -> float:
     """
     Комбинированная метрика: w_mfcc*DTW_sim + w_chroma*Chroma_sim
     """
-    m = dtw_similarity(path1, path2)
-    c = chroma_similarity(path1, path2)
-    return w_mfcc*m + w_chroma*c
+    return float(combine_scores(*pair_components(path1, path2), w_mfcc, w_chroma))
 
 def compute_similarity_indices(playlist, ref_idx: int, comp_idxs: list[int]) -> dict[int, float]:
     """
@@ -0,0 +1,200 @@
+# streaming.py
+
+import threading, time
+import numpy as np
+import perf
+
+# Файлы длиннее этого порога (сек) открываются потоково
+STREAM_MIN_DURATION = 600.0
+# Размер блока декодирования в сэмплах
+STREAM_BLOCK = 65536
+# Как часто (сек) сообщать о прогрессе
+PROGRESS_INTERVAL = 0.1
+
+# Пирамида уровней: базовое окно = шаг RMS-графика, каждый уровень в 4 раза грубее
+PYRAMID_BASE   = 512
+PYRAMID_FACTOR = 4
+PYRAMID_LEVELS = 8
+
+
+def open_blocks(path: str, block_frames: int = STREAM_BLOCK):
+    """
+    Открывает файл для поблочного декодирования.
+    Возвращает (sr, total_frames или None, итератор моно-блоков float32).
+    Формат, который soundfile не читает, декодируется librosa целиком
+    и отдаётся одним блоком.
+    """
+    try:
+        import soundfile as sf
+        info = sf.info(path)
+    except Exception:
+        import librosa
+        y, sr = librosa.load(path, sr=None, mono=True)
+        return sr, len(y), iter([y])
+
+    def blocks():
+        for b in sf.blocks(path, blocksize=block_frames, dtype='float32', always_2d=True):
+            yield b.mean(axis=1) if b.shape[1] > 1 else b[:, 0]
+    return info.samplerate, info.frames, blocks()
+
+
+class LevelPyramid:
+    """
+    Пирамида пиков и RMS, которая строится по мере поступления блоков.
+    Уровень 0 — min/max/сумма квадратов по окнам PYRAMID_BASE сэмплов,
+    каждый следующий сворачивает PYRAMID_FACTOR окон предыдущего.
+    Массивы выделяются с запасом и растут удвоением, поэтому добавление
+    блока стоит O(размер блока), а не O(длина файла).
+    """
+
+    def __init__(self, sr: int, total_frames: int = None, base: int = PYRAMID_BASE,
+                 factor: int = PYRAMID_FACTOR, levels: int = PYRAMID_LEVELS):
+        self.sr, self.base, self.factor = sr, base, factor
+        self._lock = threading.Lock()
+        self._tail = np.zeros(0, dtype=np.float32)
+        cap = max(16, (total_frames or 0) // base + 1)
+        self._n    = [0] * levels
+        self._mins = []
+        self._maxs = []
+        self._sq   = []
+        for _ in range(levels):
+            self._mins.append(np.empty(cap, dtype=np.float32))
+            self._maxs.append(np.empty(cap, dtype=np.float32))
+            self._sq.append(np.empty(cap, dtype=np.float64))
+            cap = max(16, cap // factor + 1)
+
+    def _push(self, k: int, mins, maxs, sq):
+        n, m = self._n[k], len(mins)
+        if n + m > len(self._mins[k]):
+            cap = max(2 * len(self._mins[k]), n + m)
+            for arrs in (self._mins, self._maxs, self._sq):
+                grown = np.empty(cap, dtype=arrs[k].dtype)
+                grown[:n] = arrs[k][:n]
+                arrs[k] = grown
+        self._mins[k][n:n + m] = mins
+        self._maxs[k][n:n + m] = maxs
+        self._sq[k][n:n + m]   = sq
+        self._n[k] = n + m
+
+    def append(self, block: np.ndarray):
+        """Добавляет очередной блок сигнала."""
+        x = np.concatenate([self._tail, block]) if len(self._tail) else block
+        full = len(x) // self.base * self.base
+        self._tail = np.array(x[full:], dtype=np.float32)
+        if full == 0:
+            return
+        b = x[:full].reshape(-1, self.base)
+        mins, maxs = b.min(axis=1), b.max(axis=1)
+        sq = np.einsum('ij,ij->i', b, b, dtype=np.float64)
+        f = self.factor
+        with self._lock:
+            self._push(0, mins, maxs, sq)
+            # Досворачиваем готовые группы на верхних уровнях
+            for k in range(1, len(self._n)):
+                done, ready = self._n[k], self._n[k - 1] // f
+                if ready <= done:
+                    break
+                sl = slice(done * f, ready * f)
+                self._push(k,
+                           self._mins[k - 1][sl].reshape(-1, f).min(axis=1),
+                           self._maxs[k - 1][sl].reshape(-1, f).max(axis=1),
+                           self._sq[k - 1][sl].reshape(-1, f).sum(axis=1))
+
+    def view(self, max_points: int):
+        """
+        Самый подробный уровень, где окон не больше max_points.
+        Возвращает (times, mins, maxs, rms) — копии, безопасные для GUI-потока.
+        """
+        with self._lock:
+            k = next((k for k, n in enumerate(self._n) if n <= max_points), len(self._n) - 1)
+            n = self._n[k]
+            width = self.base * self.factor ** k
+            times = (np.arange(n) + 0.5) * width / self.sr
+            rms = np.sqrt(self._sq[k][:n] / width).astype(np.float32)
+            return times, self._mins[k][:n].copy(), self._maxs[k][:n].copy(), rms
+
+
+class StreamingDecode:
+    """
+    Поблочное декодирование файла в фоновом потоке.
+    По мере чтения пополняет LevelPyramid и вызывает on_progress(path)
+    не чаще PROGRESS_INTERVAL; по окончании — on_done(path).
+    Сигнал собирается в том же потоке: при известной из заголовка длине —
+    в заранее выделенный буфер, иначе склейкой блоков перед on_done.
+    Колбэки вызываются из фонового потока.
+    """
+
+    def __init__(self, path: str, on_progress=None, on_done=None,
+                 block_frames: int = STREAM_BLOCK):
+        self.path         = path
+        self.block_frames = block_frames
+        self.on_progress  = on_progress
+        self.on_done      = on_done
+        self.sr           = None
+        self.total_frames = None
+        self.decoded      = 0
+        self.pyramid      = None
+        self.error        = None
+        self.done         = False
+        self._data        = None
+        self._cancel      = threading.Event()
+        self._thread      = threading.Thread(target=self._run, name='stream-decode', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def duration(self) -> float:
+        """Полная длительность файла в секундах (или уже декодированная часть)."""
+        if not self.sr:
+            return 0.0
+        return (self.total_frames or self.decoded) / self.sr
+
+    def _run(self):
+        try:
+            with perf.span('audio.decode_stream'):
+                sr, total, blocks = open_blocks(self.path, self.block_frames)
+                self.sr, self.total_frames = sr, total
+                self.pyramid = LevelPyramid(sr, total)
+                buf = np.empty(total, dtype=np.float32) if total else None
+                chunks = []
+                last = 0.0
+                for block in blocks:
+                    if self._cancel.is_set():
+                        return
+                    n = len(block)
+                    if buf is not None and self.decoded + n <= len(buf):
+                        buf[self.decoded:self.decoded + n] = block
+                    else:
+                        if buf is not None:
+                            # Заголовок занизил длину: дальше копим блоки
+                            chunks.append(buf[:self.decoded])
+                            buf = None
+                        chunks.append(block)
+                    self.pyramid.append(block)
+                    self.decoded += n
+                    now = time.perf_counter()
+                    if self.on_progress is not None and now - last >= PROGRESS_INTERVAL:
+                        last = now
+                        self.on_progress(self.path)
+                if buf is not None:
+                    self._data = buf[:self.decoded]
+                elif len(chunks) == 1:
+                    self._data = chunks[0]
+                else:
+                    self._data = (np.concatenate(chunks) if chunks
+                                  else np.zeros(0, dtype=np.float32))
+            perf.count('audio.decode.bytes', self.decoded * 4)
+            self.done = True
+        except Exception as exc:
+            self.error = exc
+        if self.on_done is not None and not self._cancel.is_set():
+            self.on_done(self.path)
+
+    def result(self) -> np.ndarray:
+        """Весь декодированный сигнал (после завершения; собран в потоке декодирования)."""
+        return self._data
@@ -0,0 +1,133 @@
+# stretch.py
+
+import os, tempfile, wave
+from collections import OrderedDict
+import numpy as np
+import perf
+
+# Параметры фазового вокодера (n_fft должен делиться на hop)
+STRETCH_N_FFT = 2048
+STRETCH_HOP   = 512
+# Сколько кадров STFT обрабатывать за один блок
+STRETCH_BLOCK_FRAMES = 256
+# Сколько отрендеренных вариантов хранить
+STRETCH_CACHE_SIZE = 8
+
+
+def time_stretch_blocks(y: np.ndarray, rate: float, n_fft: int = STRETCH_N_FFT,
+                        hop: int = STRETCH_HOP, block_frames: int = STRETCH_BLOCK_FRAMES):
+    """
+    Фазовый вокодер: меняет темп в rate раз без изменения высоты тона.
+    Генератор блоков float32; STFT считается только для нужных кадров
+    очередного блока, поэтому память не зависит от длины трека.
+    """
+    y = np.asarray(y, dtype=np.float32)
+    half = n_fft // 2
+    y = np.pad(y, (half, half + max(0, n_fft + hop - len(y) - 2 * half)))
+    n_frames = 1 + (len(y) - n_fft) // hop
+    win = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+    # Сумма квадратов окна при перекрытии: нормировка overlap-add
+    norm = np.sum(win ** 2) / hop
+    omega = 2 * np.pi * hop * np.arange(half + 1) / n_fft
+    offsets = np.arange(n_fft)
+    overlap = n_fft // hop
+
+    steps = np.arange(0, n_frames - 1, rate)
+    phase = None
+    tail = np.zeros(n_fft - hop, dtype=np.float32)
+    skip = half
+    for b0 in range(0, len(steps), block_frames):
+        pos = steps[b0:b0 + block_frames]
+        k = pos.astype(np.int64)
+        frac = (pos - k)[:, None]
+        # Кадры k и k+1 для интерполяции амплитуды и разности фаз
+        need = np.unique(np.concatenate([k, k + 1]))
+        S = np.fft.rfft(y[need[:, None] * hop + offsets] * win, axis=1)
+        S0 = S[np.searchsorted(need, k)]
+        S1 = S[np.searchsorted(need, k + 1)]
+        mag = (1 - frac) * np.abs(S0) + frac * np.abs(S1)
+        dphi = np.angle(S1) - np.angle(S0) - omega
+        dphi -= 2 * np.pi * np.round(dphi / (2 * np.pi))
+        dphi += omega
+        if phase is None:
+            phase = np.angle(S0[0])
+        ph = phase + np.vstack([np.zeros_like(phase), np.cumsum(dphi[:-1], axis=0)])
+        phase = ph[-1] + dphi[-1]
+
+        frames = np.fft.irfft(mag * np.exp(1j * ph), n=n_fft, axis=1).astype(np.float32)
+        frames *= win / norm
+        # Overlap-add: кадры сдвинуты на hop, n_fft = overlap * hop
+        m = len(frames)
+        buf = np.zeros(m * hop + n_fft - hop, dtype=np.float32)
+        buf[:len(tail)] += tail
+        parts = frames.reshape(m, overlap, hop)
+        for q in range(overlap):
+            buf[q * hop:q * hop + m * hop] += parts[:, q, :].ravel()
+        out, tail = buf[:m * hop], buf[m * hop:]
+        if skip:
+            out, skip = out[skip:], max(0, skip - len(out))
+        yield out
+    if len(tail) > half:
+        yield tail[:len(tail) - half]
+
+
+@perf.timed('stretch.render')
+def render_stretched(y: np.ndarray, sr: int, rate: float, out_path: str, cancel=None) -> bool:
+    """
+    Рендерит y с темпом rate в 16-битный WAV out_path, записывая блоки
+    по мере готовности. cancel — threading.Event; при отмене файл удаляется
+    и возвращается False.
+    """
+    with wave.open(out_path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(int(sr))
+        for block in time_stretch_blocks(y, rate):
+            if cancel is not None and cancel.is_set():
+                break
+            wf.writeframes(np.int16(np.clip(block, -1.0, 1.0) * 32767).tobytes())
+    if cancel is not None and cancel.is_set():
+        os.remove(out_path)
+        return False
+    return True
+
+
+class StretchCache:
+    """
+    Кэш отрендеренных вариантов: ключ (path, вариант эквалайзера, rate) -> WAV.
+    Хранит не больше max_items файлов; вытесненные удаляются с диска.
+    """
+
+    def __init__(self, max_items: int = STRETCH_CACHE_SIZE):
+        self.max_items = max_items
+        self._files: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        path = self._files.get(key)
+        if path is None or not os.path.exists(path):
+            self._files.pop(key, None)
+            perf.cache_miss('stretch')
+            return None
+        self._files.move_to_end(key)
+        perf.cache_hit('stretch')
+        return path
+
+    def put(self, key, path: str):
+        self._files[key] = path
+        self._files.move_to_end(key)
+        while len(self._files) > self.max_items:
+            _, old = self._files.popitem(last=False)
+            if os.path.exists(old):
+                os.remove(old)
+
+    @staticmethod
+    def new_file() -> str:
+        fd, path = tempfile.mkstemp(suffix='.wav', prefix='stretch-')
+        os.close(fd)
+        return path
+
+    def clear(self):
+        for path in self._files.values():
+            if os.path.exists(path):
+                os.remove(path)
+        self._files.clear()
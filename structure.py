@@ -0,0 +1,168 @@
+# structure.py
+
+import queue, threading
+from collections import OrderedDict
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+import perf
+
+# Сторона плитки в кадрах пулированной сетки (= пикселях изображения)
+TILE = 256
+# Сколько плиток хранить в кэше
+TILE_CACHE_SIZE = 256
+# Признаки считаются кусками по столько секунд, по FRAMES_BATCH кусков за батч
+FRAMES_PIECE_SEC = 60
+FRAMES_BATCH     = 4
+# Предел уровня пирамиды: кадр уровня L — среднее 2^L кадров признаков
+MAX_LEVEL = 12
+
+
+def structure_frames(y: np.ndarray, sr: int):
+    """
+    Кадры для матрицы самоподобия из признаков similarity (frame_features):
+    стандартизованные MFCC без c0 и хрома, каждая часть нормирована, так что
+    скалярное произведение кадров — косинусное сходство.
+    Возвращает (float32 (T, D), длительность кадра в секундах).
+    """
+    from features import frame_features, FEAT_HOP
+    # Длинный трек идёт кусками по FRAMES_PIECE_SEC, чтобы спектры всего
+    # трека не лежали в памяти одновременно; кусок кратен шагу кадров
+    piece = int(FRAMES_PIECE_SEC * sr) // FEAT_HOP * FEAT_HOP
+    signals = [(y[s:s + piece], sr) for s in range(0, len(y), piece)]
+    mfcc, chroma = [], []
+    for b in range(0, len(signals), FRAMES_BATCH):
+        for f in frame_features(signals[b:b + FRAMES_BATCH]):
+            # Центрированный STFT даёт на кусок лишний кадр — отбрасываем
+            mfcc.append(f['mfcc'][1:, :piece // FEAT_HOP].T)
+            chroma.append(f['chroma'][:, :piece // FEAT_HOP].T)
+    mfcc, chroma = np.vstack(mfcc), np.vstack(chroma)
+    mfcc = (mfcc - mfcc.mean(axis=0)) / (mfcc.std(axis=0) + 1e-9)
+    parts = [p / (np.linalg.norm(p, axis=1, keepdims=True) + 1e-9) for p in (mfcc, chroma)]
+    return (np.hstack(parts) * np.sqrt(0.5)).astype(np.float32), FEAT_HOP / sr
+
+
+class StructureTiles:
+    """
+    Матрица самоподобия трека по плиткам. Полная матрица T×T не строится:
+    для масштаба выбирается уровень пирамиды пулинга (кадры усредняются
+    по 2^L), и считаются только видимые плитки TILE×TILE — одно матричное
+    произведение на плитку. Плитки симметричны и кэшируются (LRU).
+    Плитки считает фоновый поток, visible() вызывается из GUI.
+    """
+
+    def __init__(self, X: np.ndarray, frame_sec: float):
+        self.frame_sec = frame_sec
+        self.levels = [X]
+        self._levels_lock = threading.Lock()
+        self._tiles: OrderedDict = OrderedDict()
+
+    @property
+    def duration(self) -> float:
+        return len(self.levels[0]) * self.frame_sec
+
+    def level(self, L: int) -> np.ndarray:
+        """Кадры уровня L (строятся по мере надобности попарным усреднением)."""
+        with self._levels_lock:
+            while len(self.levels) <= L:
+                X = self.levels[-1]
+                if len(X) % 2:
+                    X = np.vstack([X, X[-1:]])
+                X = 0.5 * (X[0::2] + X[1::2])
+                self.levels.append((X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-9)).astype(np.float32))
+            return self.levels[L]
+
+    def level_len(self, L: int) -> int:
+        """Число кадров уровня L без построения самого уровня."""
+        return -(-len(self.levels[0]) // 2 ** L)
+
+    def pick_level(self, span_sec: float, pixels: int) -> int:
+        """Уровень, при котором на пиксель видимой области приходится около кадра."""
+        per_pixel = span_sec / self.frame_sec / max(pixels, 1)
+        return int(np.clip(np.ceil(np.log2(max(per_pixel, 1.0))), 0, MAX_LEVEL))
+
+    def tile_sec(self, L: int) -> float:
+        """Сторона плитки уровня L в секундах."""
+        return TILE * self.frame_sec * 2 ** L
+
+    def visible(self, L: int, x0: float, x1: float, y0: float, y1: float) -> list[tuple]:
+        """Координаты (i, j) плиток уровня L, пересекающих область, от центра к краям."""
+        step = self.tile_sec(L)
+        n = -(-self.level_len(L) // TILE)
+        cols = range(max(0, int(x0 // step)), min(n, int(x1 // step) + 1))
+        rows = range(max(0, int(y0 // step)), min(n, int(y1 // step) + 1))
+        ci, cj = (y0 + y1) / 2 / step, (x0 + x1) / 2 / step
+        return sorted(((i, j) for i in rows for j in cols),
+                      key=lambda ij: (ij[0] + 0.5 - ci) ** 2 + (ij[1] + 0.5 - cj) ** 2)
+
+    def tile(self, L: int, i: int, j: int) -> np.ndarray:
+        """Плитка (i, j) уровня L: uint8-изображение (строки — i, столбцы — j)."""
+        key = (L, min(i, j), max(i, j))
+        img = self._tiles.get(key)
+        if img is None:
+            perf.cache_miss('structure_tile')
+            X = self.level(L)
+            A = X[key[1] * TILE:(key[1] + 1) * TILE]
+            B = X[key[2] * TILE:(key[2] + 1) * TILE]
+            with perf.span('structure.tile'):
+                img = (np.clip(A @ B.T, 0.0, 1.0) * 255).astype(np.uint8)
+            self._tiles[key] = img
+            while len(self._tiles) > TILE_CACHE_SIZE:
+                self._tiles.popitem(last=False)
+        else:
+            perf.cache_hit('structure_tile')
+            self._tiles.move_to_end(key)
+        return img if i <= j else img.T
+
+
+class StructureThread(QThread):
+    """
+    Фоновый поток вида «Структура»: считает признаки трека и плитки.
+    Новый запрос (трек или область) отменяет ещё не посчитанные плитки
+    предыдущего, чтобы при прокрутке и масштабировании не копилась очередь.
+    """
+    # Готовы кадры трека: (метка трека, StructureTiles)
+    loaded     = pyqtSignal(object, object)
+    # Готова плитка: (StructureTiles, уровень, i, j, изображение)
+    tile_ready = pyqtSignal(object, int, int, int, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._queue = queue.Queue()
+        self._generation = 0
+
+    def load(self, tag, y: np.ndarray, sr: int):
+        self._generation += 1
+        self._queue.put(('load', self._generation, tag, y, sr))
+        if not self.isRunning():
+            self.start()
+
+    def request(self, tiles: StructureTiles, L: int, coords):
+        self._generation += 1
+        self._queue.put(('tiles', self._generation, tiles, L, list(coords)))
+        if not self.isRunning():
+            self.start()
+
+    def stop(self):
+        self._generation += 1
+        self._queue.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            kind, gen = job[:2]
+            if gen != self._generation and kind == 'tiles':
+                continue
+            if kind == 'load':
+                tag, y, sr = job[2:]
+                with perf.span('structure.frames', nbytes=y.nbytes):
+                    X, frame_sec = structure_frames(y, sr)
+                self.loaded.emit(tag, StructureTiles(X, frame_sec))
+                continue
+            tiles, L, coords = job[2:]
+            for i, j in coords:
+                if gen != self._generation:
+                    break
+                self.tile_ready.emit(tiles, L, i, j, tiles.tile(L, i, j))
@@ -1,26 +1,118 @@
 
-import os, librosa
+import os, time
 from PyQt5.QtWidgets import (QMainWindow, QWidget,
     QVBoxLayout, QHBoxLayout, QPushButton,
     QFileDialog, QSlider, QLabel, QStyle,
-    QAction, QListWidget, QListWidgetItem, QSizePolicy, QMenu, QMessageBox,  QAbstractItemView
+    QAction, QListWidget, QListWidgetItem, QSizePolicy, QMenu, QMessageBox,  QAbstractItemView,
+    QComboBox, QInputDialog
     # ← добавили сюда
 )
 from PyQt5.QtMultimedia import QMediaPlayer
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QThread, QEvent, pyqtSignal
 import pyqtgraph as pg
 
 from audio import AudioController
-from plotting import plot_waveform, plot_spectrum, plot_spectrogram
-from utils import format_time, save_playlist_json, load_playlist_json
-from dialogs  import SimilarityTableDialog
-
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-
+from plotting import (plot_waveform, plot_spectrum, plot_spectrogram, plot_structure,
+                      structure_loaded, render_structure, add_structure_tile)
+from utils import format_time, save_playlist, iter_playlist
+from itertools import islice
+from dialogs  import (SimilarityTableDialog, DuplicateGroupsDialog, PerformanceDialog,
+                      SegmentSearchDialog)
+from perf import profile_action
+from scheduler import RenderScheduler
+from meters import LevelMeter, LevelMeterWidget, METER_FLOOR_DB
+from library import LibraryScanner, audio_file_filter
+from clustering import DEFAULT_CLUSTERS
+
+
+class LibraryScanThread(QThread):
+    """
+    Сканирует папку библиотеки в фоне и отдаёт найденные записи индекса.
+    """
+    scanned = pyqtSignal(list, dict)
+
+    def __init__(self, scanner, root, parent=None):
+        super().__init__(parent)
+        self.scanner = scanner
+        self.root    = root
+
+    def run(self):
+        stats = self.scanner.scan([self.root])
+        self.scanned.emit(self.scanner.entries_under(self.root), stats)
+
+
+class ClusterThread(QThread):
+    """
+    Группирует треки по сходству в фоне: извлекает векторы новых файлов
+    и дообучает k-means контроллера. Отдаёт группы путей.
+    """
+    clustered = pyqtSignal(list)
+
+    def __init__(self, controller, paths, k, parent=None):
+        super().__init__(parent)
+        self.controller = controller
+        self.paths      = paths
+        self.k          = k
+
+    def run(self):
+        self.clustered.emit(self.controller.cluster_tracks(self.paths, self.k))
+
+
+class DuplicatesThread(QThread):
+    """
+    Ищет дубликаты по акустическим отпечаткам в фоне. Отдаёт группы путей.
+    """
+    found = pyqtSignal(list)
+
+    def __init__(self, controller, paths, parent=None):
+        super().__init__(parent)
+        self.controller = controller
+        self.paths      = paths
+
+    def run(self):
+        with profile_action('duplicates'):
+            groups = self.controller.find_duplicates(self.paths)
+        self.found.emit(groups)
+
+
+class ClipSearchThread(QThread):
+    """
+    Ищет фрагмент во всех треках в фоне. Сообщает прогресс загрузки
+    признаков и отдаёт совпадения [(путь, смещение, сходство)].
+    """
+    progress = pyqtSignal(int, int)
+    found    = pyqtSignal(list)
+
+    def __init__(self, controller, y_seg, sr, paths, parent=None):
+        super().__init__(parent)
+        self.controller = controller
+        self.y_seg      = y_seg
+        self.sr         = sr
+        self.paths      = paths
+
+    def run(self):
+        with profile_action('find-clip'):
+            hits = self.controller.find_segment(self.y_seg, self.sr, self.paths,
+                                                on_progress=self.progress.emit)
+        self.found.emit(hits)
 
 
 class AudioPlayer(QMainWindow):
+    # Готов анализ громкости трека (испускается из фонового потока)
+    loudness_ready = pyqtSignal(str)
+    # Потоковое декодирование: пришли новые блоки / файл декодирован целиком
+    stream_progress = pyqtSignal(str)
+    stream_done     = pyqtSignal(str)
+    # Готов рендер другого темпа (ключ кэша StretchCache)
+    stretch_ready   = pyqtSignal(object)
+    # Посчитаны пары поиска похожих (запрос AudioController.request_similarity)
+    similarity_ready = pyqtSignal(object)
+    # Готов рендер эквалайзера в пуле: (ключ, EqRender)
+    eq_ready = pyqtSignal(object, object)
+
+    # Задержка применения темпа после последнего движения ползунка, мс
+    RATE_DEBOUNCE_MS = 300
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("...")
@@ -28,6 +120,21 @@ class AudioPlayer(QMainWindow):
 
         # Контроллер для логики воспроизведения
         self.controller = AudioController()
+        # Индекс библиотеки (создаётся при первом сканировании)
+        self.library = None
+        self._scan_thread = None
+        # Группы похожих треков: фоновый поток, число групп и группы путей
+        self._cluster_thread = None
+        self._cluster_k      = None
+        self._cluster_groups = []
+        self._cluster_pending = False
+        # Фоновый поиск дубликатов и фрагмента
+        self._duplicates_thread = None
+        self._clip_thread       = None
+        # Поколение загрузки плейлиста: порции прежней загрузки отбрасываются
+        self._playlist_load_gen = 0
+        # Незавершённый запрос поиска похожих (AudioController.request_similarity)
+        self._similarity_req  = None
 
         # UI
         self.init_ui()
@@ -51,7 +158,18 @@ class AudioPlayer(QMainWindow):
         self.add_action = QAction("Добавить в плейлист...", self)
         self.save_action = QAction("Сохранить плейлист...", self)
         self.load_action = QAction("Загрузить плейлист...", self)
-        file_menu.addActions([self.open_action, self.add_action, self.save_action, self.load_action])
+        self.scan_action = QAction("Сканировать папку...", self)
+        file_menu.addActions([self.open_action, self.add_action, self.save_action, self.load_action,
+                              self.scan_action])
+        tools_menu = self.menuBar().addMenu("Инструменты")
+        self.perf_action = QAction("Производительность...", self)
+        self.loudness_action = QAction("Выравнивать громкость (LUFS)", self)
+        self.loudness_action.setCheckable(True)
+        self.silence_action = QAction("Пропускать тишину", self)
+        self.silence_action.setCheckable(True)
+        self.cluster_action = QAction("Сгруппировать по сходству...", self)
+        tools_menu.addActions([self.perf_action, self.loudness_action, self.silence_action,
+                               self.cluster_action])
 
         # Центральный виджет
         central = QWidget()
@@ -69,7 +187,18 @@ class AudioPlayer(QMainWindow):
 
         self.playlistWidget.customContextMenuRequested.connect(self.show_playlist_menu)
 
-        main_layout.addWidget(self.playlistWidget, stretch=1)
+        # Над плейлистом — выбор группы похожих треков (автоплейлисты)
+        self.playlist_panel = QWidget()
+        self.playlist_panel.setFixedWidth(300)
+        playlist_layout = QVBoxLayout(self.playlist_panel)
+        playlist_layout.setContentsMargins(0, 0, 0, 0)
+        playlist_layout.setSpacing(5)
+        self.cluster_box = QComboBox()
+        self.cluster_box.addItem("Все треки")
+        playlist_layout.addWidget(self.cluster_box)
+        playlist_layout.addWidget(self.playlistWidget, stretch=1)
+
+        main_layout.addWidget(self.playlist_panel, stretch=1)
 
         # Правая панель
         right_panel = QWidget()
@@ -108,15 +237,14 @@ class AudioPlayer(QMainWindow):
         right_layout.addWidget(self.vol_plot_widget, stretch=1)
 
 
-        # ... после создания self.plot_widget и self.vol_plot_widget
-        self.spec_fig = Figure(figsize=(5,2))
-        self.spec_canvas = FigureCanvas(self.spec_fig)
-        self.spec_canvas.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        self.spec_ax = self.spec_fig.add_subplot(111)
-        right_layout.addWidget(self.spec_canvas)
-        self.spec_canvas.setVisible(False)
+        # Холст matplotlib для спектрограммы создаётся при первом показе
+        # (см. _ensure_spec_canvas), чтобы не грузить matplotlib при старте
+        self.right_layout = right_layout
+        self.spec_fig = self.spec_canvas = self.spec_ax = None
+        # Вид «Структура» (матрица самоподобия) тоже создаётся при первом показе
+        self.structure_widget = self.structure_thread = None
+        self._structure = None
 
-       
 
         # Вертикальные линии: playhead, segment
         self.start_line = pg.InfiniteLine(pos=0, angle=90, movable=True, pen=pg.mkPen('g', width=4))
@@ -152,14 +280,19 @@ class AudioPlayer(QMainWindow):
         self.waveform_btn = QPushButton("Форма волны")
         self.spectrum_btn = QPushButton("Спектр")
         self.spectrogram_btn = QPushButton("Спектрограмма")
+        self.structure_btn = QPushButton("Структура")
         self.eq_toggle_btn = QPushButton("Эквалайзер")
-        for btn in (self.waveform_btn, self.spectrum_btn, self.spectrogram_btn, self.eq_toggle_btn):
+        self.find_clip_btn = QPushButton("Найти фрагмент")
+        for btn in (self.waveform_btn, self.spectrum_btn, self.spectrogram_btn, self.structure_btn,
+                    self.eq_toggle_btn, self.find_clip_btn):
             btn.setFixedHeight(30)
         spec_layout.addStretch()
         spec_layout.addWidget(self.waveform_btn)
         spec_layout.addWidget(self.spectrum_btn)
         spec_layout.addWidget(self.spectrogram_btn)
+        spec_layout.addWidget(self.structure_btn)
         spec_layout.addWidget(self.eq_toggle_btn)
+        spec_layout.addWidget(self.find_clip_btn)
         spec_layout.addStretch()
         right_layout.addLayout(spec_layout)
 
@@ -199,6 +332,15 @@ class AudioPlayer(QMainWindow):
         buttons_layout.addWidget(self.eq_reset_btn)
         eq_layout.addLayout(buttons_layout)
 
+        # Снимки для A/B-сравнения: выбор снимка сразу включает его рендер
+        snapshot_layout = QHBoxLayout()
+        self.eq_snapshot_box = QComboBox()
+        self.eq_snapshot_box.addItem("Без эквалайзера")
+        self.eq_snapshot_btn = QPushButton("Сохранить снимок")
+        snapshot_layout.addWidget(self.eq_snapshot_box, stretch=1)
+        snapshot_layout.addWidget(self.eq_snapshot_btn)
+        eq_layout.addLayout(snapshot_layout)
+
         self.eq_panel.setVisible(False)
         right_layout.addWidget(self.eq_panel)
         
@@ -225,6 +367,9 @@ class AudioPlayer(QMainWindow):
         vol_layout.addWidget(vol_label)
         vol_layout.addWidget(self.vol_slider)
         vol_layout.addWidget(self.vol_value)
+        # Индикатор уровня выходного сигнала
+        self.level_meter = LevelMeterWidget()
+        vol_layout.addWidget(self.level_meter, stretch=1)
         rate_layout = QHBoxLayout()
         rate_label = QLabel("Скорость")
         self.rate_slider = QSlider(Qt.Horizontal)
@@ -242,10 +387,26 @@ class AudioPlayer(QMainWindow):
 
         main_layout.addWidget(right_panel, stretch=4)
 
-        # Таймер для обновления слайдера
-        self.timer = QTimer(self)
-        self.timer.setInterval(100)
-        self.timer.timeout.connect(self.update_slider)
+        # Темп применяется после паузы в движении ползунка
+        self.rate_timer = QTimer(self)
+        self.rate_timer.setSingleShot(True)
+        self.rate_timer.setInterval(self.RATE_DEBOUNCE_MS)
+        self.rate_timer.timeout.connect(
+            lambda: self.controller.set_rate(self.rate_slider.value() / 100.0))
+
+        # Позиция (метка, слайдер, playhead) и дорисовка потокового графика
+        # обновляются не чаще раза за кадр и не обновляются при свёрнутом окне
+        self.render = RenderScheduler(self)
+        self.render.register('position', self.render_position)
+        self.render.register('waveform', lambda: plot_waveform(self))
+        self._shown_second = None
+
+        # Уровни выходного сигнала опрашиваются раз в кадр во время воспроизведения
+        self.meter = LevelMeter(self.controller, self)
+        self.level_meter.setToolTip("Уровень выхода" if self.meter.live
+                                    else "Уровень по сигналу у позиции (бэкенд не отдаёт PCM)")
+        self.render.register('meters', self.render_meters)
+        self._meter_time = time.perf_counter()
 
     def connect_signals(self):
         self.controller.player.metaDataChanged.connect(self.update_metadata)
@@ -255,17 +416,39 @@ class AudioPlayer(QMainWindow):
         self.add_action.triggered  .connect(self.on_add)
         self.save_action.triggered .connect(self.on_save_playlist)
         self.load_action.triggered .connect(self.on_load_playlist)
+        self.scan_action.triggered .connect(self.on_scan_folder)
+        self.perf_action.triggered .connect(lambda: PerformanceDialog(self).exec_())
+        self.loudness_action.toggled.connect(self.controller.set_loudness_match)
+        self.silence_action.toggled.connect(self.controller.set_skip_silence)
+        self.cluster_action.triggered.connect(self.on_cluster_tracks)
+
+        # Анализ громкости идёт в фоне; сигнал доставляется в GUI-поток
+        self.controller.on_loudness = self.loudness_ready.emit
+        self.loudness_ready.connect(self.on_loudness_ready)
+        self.controller.on_stream_progress = self.stream_progress.emit
+        self.controller.on_stream_done     = self.stream_done.emit
+        self.stream_progress.connect(self.on_stream_progress)
+        self.stream_done.connect(self.on_stream_done)
+        self.controller.on_stretch_ready = self.stretch_ready.emit
+        self.stretch_ready.connect(self.controller.apply_stretch)
+        self.controller.on_eq_ready = self.eq_ready.emit
+        self.eq_ready.connect(self.on_eq_ready)
+        self.controller.on_similarity_ready = self.similarity_ready.emit
+        # Очередью: запрос из хранилища готов сразу, окно откроется после возврата
+        self.similarity_ready.connect(self.on_similarity_ready, Qt.QueuedConnection)
 
 
         # Сигналы QMediaPlayer
         self.controller.player.positionChanged  .connect(self.on_position_changed)
         self.controller.player.durationChanged  .connect(self.on_duration_changed)
         self.controller.player.mediaStatusChanged.connect(self.on_media_status_changed)
+        self.controller.player.stateChanged.connect(self.on_player_state_changed)
 
 
         # Плейлист
         self.playlistWidget.itemDoubleClicked.connect(self.on_playlist_item_double_clicked)
         self.toggle_playlist_btn.clicked.connect(self.toggle_playlist_visibility)
+        self.cluster_box.activated.connect(self.on_cluster_selected)
 
         # Кнопки управления
         self.play_btn.clicked .connect(self.controller.play)
@@ -285,11 +468,15 @@ class AudioPlayer(QMainWindow):
         self.waveform_btn.clicked    .connect(lambda: self.show_view('waveform'))
         self.spectrum_btn.clicked    .connect(lambda: self.show_view('spectrum'))
         self.spectrogram_btn.clicked .connect(lambda: self.show_view('spectrogram'))
+        self.structure_btn.clicked   .connect(lambda: self.show_view('structure'))
         self.eq_toggle_btn.clicked   .connect(lambda: self.eq_panel.setVisible(not self.eq_panel.isVisible()))
+        self.find_clip_btn.clicked   .connect(self.on_find_clip)
 
         # Эквалайзер
         self.eq_apply_btn.clicked    .connect(self.apply_eq_and_refresh)
         self.eq_reset_btn.clicked    .connect(self.reset_eq)
+        self.eq_snapshot_btn.clicked .connect(self.on_save_eq_snapshot)
+        self.eq_snapshot_box.activated.connect(self.on_eq_snapshot_selected)
 
     
     # --- Слоты ---
@@ -302,18 +489,19 @@ class AudioPlayer(QMainWindow):
             self,
             "Open Audio File",
             "",
-            "Audio Files (*.wav *.mp3)"
+            audio_file_filter()
         )
         if not path:
             return
 
-        # Контроллер загрузит и запустит файл, а также добавит его в плейлист
-        self.controller.open_file(path)
-        
-        self.refresh_playlist_widget()
-        
-        # Перерисовка графиков
-        self.update_ui_for_current_track()
+        with profile_action('open'):
+            # Контроллер загрузит и запустит файл, а также добавит его в плейлист
+            self.controller.open_file(path)
+
+            self.refresh_playlist_widget()
+
+            # Перерисовка графиков
+            self.update_ui_for_current_track()
 
     def on_next(self):
         """
@@ -337,12 +525,39 @@ class AudioPlayer(QMainWindow):
 
     def on_add(self):
         paths, _ = QFileDialog.getOpenFileNames(
-            self, "Add Audio Files", "", "Audio Files (*.wav *.mp3)"
+            self, "Add Audio Files", "", audio_file_filter()
         )
         if not paths:
             return
         self.controller.add_files(paths)
         self.refresh_playlist_widget()
+        self._update_clusters()
+
+    def on_scan_folder(self):
+        """
+        Рекурсивно индексирует выбранную папку в фоне и добавляет
+        найденные файлы в плейлист. Повторное сканирование опрашивает
+        только новые и изменённые файлы.
+        """
+        if self._scan_thread is not None and self._scan_thread.isRunning():
+            return
+        root = QFileDialog.getExistingDirectory(self, "Scan Folder")
+        if not root:
+            return
+        if self.library is None:
+            self.library = LibraryScanner()
+        self._scan_thread = LibraryScanThread(self.library, root, self)
+        self._scan_thread.scanned.connect(self.on_folder_scanned)
+        self._scan_thread.start()
+        self.statusBar().showMessage(f"Сканирование {root}...")
+
+    def on_folder_scanned(self, entries, stats):
+        self.controller.add_entries(entries)
+        self.refresh_playlist_widget()
+        self._update_clusters()
+        self.statusBar().showMessage(
+            f"Найдено файлов: {stats['total']}, новых: {stats['new']}, "
+            f"изменённых: {stats['changed']}", 5000)
     
     def on_playlist_item_double_clicked(self, item):
         """
@@ -361,56 +576,122 @@ class AudioPlayer(QMainWindow):
 
         self.update_ui_for_current_track()
 
+    PLAYLIST_FILTER = "Playlist (*.gspl);;JSON Files (*.json)"
+    # Сколько записей плейлиста восстанавливать за один проход цикла событий
+    PLAYLIST_LOAD_BATCH = 500
+
     def on_save_playlist(self):
-        path, _ = QFileDialog.getSaveFileName(self, "Save Playlist", "", "JSON Files (*.json)")
+        path, _ = QFileDialog.getSaveFileName(self, "Save Playlist", "", self.PLAYLIST_FILTER)
         if path:
-            save_playlist_json(path, self.controller.playlist)
+            save_playlist(path, self.controller.playlist)
 
     def on_load_playlist(self):
         path, _ = QFileDialog.getOpenFileName(
-            self, "Load Playlist", "", "JSON Files (*.json)"
+            self, "Load Playlist", "", self.PLAYLIST_FILTER
         )
         if not path:
             return
 
-        # 1) Считаем только сериализуемые поля
-        raw_list = load_playlist_json(path)
+        # 1) Потоковое чтение записей (.gspl или .json)
+        records = iter_playlist(path)
 
-        # 2) Восстанавливаем полный плейлист с оригинальными данными
+        # 2) Очищаем плейлист и восстанавливаем треки порциями,
+        #    чтобы большие плейлисты не блокировали окно
         self.controller.playlist.clear()
-        for tr in raw_list:
-            y, sr = librosa.load(tr['path'], sr=None, mono=True)
-            track = {
-                'path':          tr['path'],
-                'title':         tr['title'],
-                'duration':      tr['duration'],
-                'original_data': y.copy(),
-                'original_fs':   sr
-            }
-            self.controller.playlist.append(track)
-
-        # 3) Обновляем виджет плейлиста
-        self.refresh_playlist_widget()
+        self.playlistWidget.clear()
+        self.cluster_box.setCurrentIndex(0)
+        # Новая загрузка отменяет ещё не восстановленные порции предыдущей
+        self._playlist_load_gen += 1
+        self._load_playlist_batch(records, self._playlist_load_gen)
+
+    def _load_playlist_batch(self, records, gen, skipped=0):
+        """
+        Восстанавливает очередную порцию треков из итератора records
+        и планирует следующую через цикл событий Qt. Записи, которые
+        не удалось восстановить (файл удалён или не читается), пропускаются.
+        """
+        if gen != self._playlist_load_gen:
+            return
+        count = 0
+        for rec in islice(records, self.PLAYLIST_LOAD_BATCH):
+            count += 1
+            try:
+                tr = self.controller.restore_track(rec)
+            except Exception:
+                skipped += 1
+                continue
+            self.playlistWidget.addItem(QListWidgetItem(self._playlist_item_text(tr)))
+
+        if count == self.PLAYLIST_LOAD_BATCH:
+            QTimer.singleShot(0, lambda: self._load_playlist_batch(records, gen, skipped))
+            return
 
-        # 4) Сбрасываем текущий индекс на первый трек и обновляем UI
+        if skipped:
+            self.statusBar().showMessage(f"Не удалось загрузить треков: {skipped}", 5000)
+        # Плейлист загружен: сбрасываем текущий индекс на первый трек и обновляем UI
         self.controller.current_index = 0
         self.update_ui_for_current_track()
+        self._update_clusters()
     
     def on_position_changed(self, pos):
         """
         Слот, вызываемый при каждом изменении позиции плеера.
-        Обновляет метку времени, слайдер и красную линию-плейхед на графиках.
+        Только помечает позицию для перерисовки в ближайшем кадре.
         """
+        # Пауза под плейхедом при включённом пропуске тишины проматывается здесь,
+        # а не в отрисовке: кадры не рисуются, пока окно свёрнуто
+        self.controller.skip_silence_step()
+        self.render.invalidate('position')
+
+    def render_position(self):
+        """
+        Обновляет метку времени, слайдер и красную линию-плейхед на графиках
+        (вызывается планировщиком не чаще раза за кадр). Виджеты трогаются,
+        только если видимое значение действительно изменилось.
+        """
+        # Позиция в миллисекундах исходного трека (с учётом темпа)
+        pos = self.controller.position()
         # Переводим позицию из миллисекунд в секунды
         sec = pos / 1000.0
-        # Делим на минуты и секунды для отображения MM:SS
-        m, s = divmod(int(sec), 60)
-        # Обновляем текст метки вида «текущее / общее»
-        self.time_label.setText(f"{m:02d}:{s:02d} / {format_time(self.controller.duration)}")
+        # Метка вида «текущее / общее» меняется раз в секунду
+        second = (int(sec), self.controller.duration)
+        if second != self._shown_second:
+            self._shown_second = second
+            m, s = divmod(int(sec), 60)
+            self.time_label.setText(f"{m:02d}:{s:02d} / {format_time(self.controller.duration)}")
         # Ставим ползунок в нужное положение
-        self.slider.setValue(pos)
-        # Передвигаем вертикальную линию playhead на графике волны
-        self.playhead.setPos(sec)
+        if self.slider.value() != pos:
+            self.slider.setValue(pos)
+        # Передвигаем playhead, если сдвиг заметен хотя бы на пиксель
+        if self.playhead.isVisible():
+            px = self.plot_widget.getViewBox().viewPixelSize()[0]
+            if abs(self.playhead.value() - sec) >= px:
+                self.playhead.setPos(sec)
+
+    def on_player_state_changed(self, state):
+        """Позиция и индикатор уровня анимируются только во время воспроизведения."""
+        playing = state == QMediaPlayer.PlayingState
+        self.render.set_animating('position', playing)
+        self.render.set_animating('meters', playing)
+        if not playing:
+            # Индикатор гаснет в ближайшем кадре
+            self.level_meter.set_levels(METER_FLOOR_DB, METER_FLOOR_DB, METER_FLOOR_DB, False)
+
+    def render_meters(self):
+        """Обновляет индикатор уровня по накопленным блокам (раз в кадр)."""
+        now = time.perf_counter()
+        dt, self._meter_time = now - self._meter_time, now
+        self.level_meter.set_levels(*self.meter.poll(dt))
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.render.resume()
+
+    def changeEvent(self, event):
+        # Окно развёрнуто из свёрнутого состояния — догоняем отложенную перерисовку
+        if event.type() == QEvent.WindowStateChange:
+            self.render.resume()
+        super().changeEvent(event)
 
 
     def on_duration_changed(self, dur):
@@ -418,10 +699,13 @@ class AudioPlayer(QMainWindow):
         Слот, вызываемый при загрузке трека.
         Устанавливает полный диапазон слайдера и сохраняет длительность.
         """
-        # Сохраняем длительность в контроллере
+        # Сохраняем длительность исходного трека в контроллере
+        # (у рендера фрагмента файл короче трека — длительность по сигналу)
+        dur = self.controller.source_duration(dur)
         self.controller.duration = dur
         # Задаём диапазон главного слайдера от 0 до полной длительности
         self.slider.setRange(0, dur)
+        self.render.invalidate('position')
 
 
     def on_media_status_changed(self, status):
@@ -451,8 +735,8 @@ class AudioPlayer(QMainWindow):
         Слот для обработки изменения громкости через слайдер.
         Устанавливает громкость плеера и обновляет метку-значение.
         """
-        # Меняем громкость у QMediaPlayer
-        self.controller.player.setVolume(v)
+        # Меняем громкость у QMediaPlayer (с поправкой выравнивания громкости)
+        self.controller.set_volume(v)
         # Отображаем значение громкости рядом со слайдером
         self.vol_value.setText(f"{v}%")
 
@@ -460,15 +744,42 @@ class AudioPlayer(QMainWindow):
     def on_rate_change(self, v):
         """
         Слот для обработки изменения скорости воспроизведения.
-        Устанавливает новую скорость и обновляет метку-значение.
+        Обновляет метку сразу, а темп (растяжение без изменения высоты тона)
+        применяет после паузы в движении ползунка.
         """
         # Переводим целочисленное значение (50–200) в коэффициент (0.5–2.0)
         rate = v / 100.0
-        # Меняем скорость плеера
-        self.controller.player.setPlaybackRate(rate)
+        # Перезапускаем отложенное применение темпа
+        self.rate_timer.start()
         # Обновляем текст метки вида «1.25x»
         self.rate_value.setText(f"{rate:.2f}x")
-   
+
+    def on_loudness_ready(self, path):
+        """Громкость трека проанализирована: применяем поправку, если он играет."""
+        idx = self.controller.current_index
+        if idx is not None and self.controller.playlist.index_of(path) == idx:
+            self.controller.apply_volume()
+            self.update_metadata()
+
+    def on_stream_progress(self, path):
+        """Пришли новые блоки длинного файла: дорисовываем форму волны."""
+        stream = self.controller.stream
+        if stream is not None and stream.path == path and self.vol_plot_widget.isVisible():
+            self.render.invalidate('waveform')
+
+    def on_stream_done(self, path):
+        """Длинный файл декодирован целиком: сигнал доступен для анализа."""
+        stream = self.controller.stream
+        if stream is None or stream.path != path:
+            return
+        if stream.error is not None:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось декодировать файл:\n{stream.error}")
+            return
+        self.controller.finish_stream(path)
+        if self.vol_plot_widget.isVisible():
+            plot_waveform(self)
+        self.statusBar().showMessage(f"Декодировано: {os.path.basename(path)}", 3000)
+
     # --Обновление--
     def update_metadata(self):
         """
@@ -496,6 +807,11 @@ class AudioPlayer(QMainWindow):
             info.append(f"Битрейт: {bitrate} бит/с")
         if channels:
             info.append(f"Каналы: {channels}")
+        loud = None
+        if idx is not None and idx < len(self.controller.playlist):
+            loud = self.controller.playlist[idx].loudness
+        if loud and loud.get('lufs') is not None:
+            info.append(f"Громкость: {loud['lufs']:.1f} LUFS")
 
         text = " | ".join(info)
         # Обновляем метку и заголовок окна
@@ -509,10 +825,14 @@ class AudioPlayer(QMainWindow):
         """
         self.playlistWidget.clear()
         for tr in self.controller.playlist:
-            # длительность в миллисекундах
-            dur_ms = int(tr['duration'] * 1000)
-            text = f"{tr['title']} — {format_time(dur_ms)}"
-            self.playlistWidget.addItem(QListWidgetItem(text))
+            self.playlistWidget.addItem(QListWidgetItem(self._playlist_item_text(tr)))
+        self._apply_cluster_filter()
+
+    @staticmethod
+    def _playlist_item_text(tr):
+        # длительность в миллисекундах
+        dur_ms = int(tr['duration'] * 1000)
+        return f"{tr['title']} — {format_time(dur_ms)}"
 
     def update_ui_for_current_track(self):
         """
@@ -523,7 +843,6 @@ class AudioPlayer(QMainWindow):
         – запускает таймер
         """
         idx = self.controller.current_index
-        print(idx)
         if idx is None or idx < 0 or idx >= len(self.controller.playlist):
             return
 
@@ -533,65 +852,155 @@ class AudioPlayer(QMainWindow):
 
         # 1. отрисовать звук
         plot_waveform(self)
+        if self.structure_widget is not None and self.structure_widget.isVisible():
+            plot_structure(self)
 
         # 2. выделить в списке и обновить метку
         self.playlistWidget.setCurrentRow(idx)
         self.update_metadata()
         self.setWindowTitle(f"PyQt Audio Player - {title}")
 
-        # 3. (если надо) перезапустить таймер
-        if not self.timer.isActive():
-            self.timer.start()
-
-    def update_slider(self):
-        self.slider.setValue(self.controller.player.position())
+        # 3. обновить позицию в ближайшем кадре
+        self.render.invalidate('position')
     
     
     # --Контроль показа--
+    def _ensure_spec_canvas(self):
+        """
+        Создаёт холст matplotlib для спектрограммы при первом обращении
+        и ставит его сразу после графика громкости.
+        """
+        if self.spec_canvas is not None:
+            return
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+        from matplotlib.figure import Figure
+        self.spec_fig = Figure(figsize=(5,2))
+        self.spec_canvas = FigureCanvas(self.spec_fig)
+        self.spec_canvas.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.spec_ax = self.spec_fig.add_subplot(111)
+        pos = self.right_layout.indexOf(self.vol_plot_widget) + 1
+        self.right_layout.insertWidget(pos, self.spec_canvas)
+
+    def _ensure_structure_widget(self):
+        """
+        Создаёт график и фоновый поток вида «Структура» при первом показе
+        и ставит график сразу после графика громкости.
+        """
+        if self.structure_widget is not None:
+            return
+        from structure import StructureThread
+        self.structure_widget = pg.PlotWidget(title="Структура (самоподобие)")
+        self.structure_widget.setBackground('w')
+        self.structure_widget.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        plot_item = self.structure_widget.getPlotItem()
+        plot_item.setAspectLocked(True)
+        plot_item.invertY(True)
+        plot_item.setLabel('bottom', 'Time', units='s')
+        plot_item.setLabel('left', 'Time', units='s')
+        # Прокрутка и масштаб: плитки нужного уровня запрашиваются раз за кадр
+        plot_item.getViewBox().sigRangeChanged.connect(lambda *_: self.render.invalidate('structure'))
+        self.render.register('structure', lambda: render_structure(self))
+
+        self.structure_thread = StructureThread(self)
+        self.structure_thread.loaded.connect(lambda path, tiles: structure_loaded(self, path, tiles))
+        self.structure_thread.tile_ready.connect(lambda *tile: add_structure_tile(self, *tile))
+        pos = self.right_layout.indexOf(self.vol_plot_widget) + 1
+        self.right_layout.insertWidget(pos, self.structure_widget)
+
     def show_view(self, view):
+        if view == 'spectrogram':
+            self._ensure_spec_canvas()
+        elif view == 'structure':
+            self._ensure_structure_widget()
         self.plot_widget.setVisible(view in ('waveform', 'spectrum'))
         self.vol_plot_widget.setVisible(view == 'waveform')
-        self.spec_canvas.setVisible(view == 'spectrogram')
-        if view == 'waveform':
-            plot_waveform(self)
-        elif view == 'spectrum':
-            plot_spectrum(self)
-        elif view == 'spectrogram':
-            plot_spectrogram(self)
+        if self.spec_canvas is not None:
+            self.spec_canvas.setVisible(view == 'spectrogram')
+        if self.structure_widget is not None:
+            self.structure_widget.setVisible(view == 'structure')
+        with profile_action(f'view-{view}'):
+            if view == 'waveform':
+                plot_waveform(self)
+            elif view == 'spectrum':
+                plot_spectrum(self)
+            elif view == 'spectrogram':
+                plot_spectrogram(self)
+            elif view == 'structure':
+                plot_structure(self)
+
+    def closeEvent(self, event):
+        # Останавливаем пул анализа и освобождаем общую память
+        if self.structure_thread is not None:
+            self.structure_thread.stop()
+        self.controller.shutdown()
+        super().closeEvent(event)
 
     def toggle_playlist_visibility(self):
         """
         Показывает или прячет панель плейлиста по кнопке «≡».
         """
-        is_visible = self.playlistWidget.isVisible()
-        self.playlistWidget.setVisible(not is_visible)
+        is_visible = self.playlist_panel.isVisible()
+        self.playlist_panel.setVisible(not is_visible)
     
 
     # --Эквалайзер--
     def apply_eq_and_refresh(self):
-        # 1) Считываем гейны
+        # 1) Считываем гейны и выделенный фрагмент (для длинных треков)
         gains = [slider.value() for slider in self.eq_sliders]
-        # 2) Применяем EQ
-        self.controller.apply_eq(gains, self.eq_bands)
-        # 3) Обновляем весь UI сразу
+        segment = (self.start_line.value(), self.end_line.value())
+        with profile_action('eq'):
+            # 2) Применяем EQ: повторные усиления берутся из кэша рендеров,
+            #    новый рендер считается в пуле и включится по on_eq_ready
+            if self.controller.apply_eq(gains, self.eq_bands, segment):
+                self._refresh_after_eq(segment)
+            else:
+                self.statusBar().showMessage("Рендер эквалайзера...")
+
+    def on_eq_ready(self, key, entry):
+        segment = (self.start_line.value(), self.end_line.value())
+        if self.controller.finish_eq(key, entry):
+            self.statusBar().clearMessage()
+            self._refresh_after_eq(segment)
+
+    def _refresh_after_eq(self, segment):
+        # 3) Обновляем весь UI сразу, сохранив выделение
         self.update_ui_for_current_track()
-
-    
+        self.start_line.setPos(min(segment))
+        self.end_line.setPos(max(segment))
 
     def reset_eq(self):
         # 1) Сбрасываем слайдеры эквалайзера
         for slider in self.eq_sliders:
             slider.setValue(0)
         # 2) Восстанавливаем оригинальный сигнал в контроллере
-        idx = self.controller.current_index
-        if idx is not None:
-            track = self.controller.playlist[idx]
-            self.controller.data = track['original_data']
-            self.controller.fs   = track['original_fs']
-            self.controller._set_media(track['path'])
-            self.controller.player.play()
+        self.controller.reset_eq()
+        self.eq_snapshot_box.setCurrentIndex(0)
         self.update_ui_for_current_track()
 
+    def on_save_eq_snapshot(self):
+        """Сохраняет текущие положения полос как именованный снимок."""
+        default = f"Снимок {self.eq_snapshot_box.count()}"
+        name, ok = QInputDialog.getText(self, "Снимок эквалайзера", "Название:", text=default)
+        name = name.strip()
+        if not ok or not name:
+            return
+        if name not in self.controller.eq_snapshots:
+            self.eq_snapshot_box.addItem(name)
+        self.controller.save_eq_snapshot(name, [slider.value() for slider in self.eq_sliders])
+        self.eq_snapshot_box.setCurrentText(name)
+
+    def on_eq_snapshot_selected(self, row):
+        """Переключает на снимок: ползунки и звук меняются, позиция сохраняется."""
+        if row == 0:
+            self.reset_eq()
+            return
+        gains = self.controller.eq_snapshots.get(self.eq_snapshot_box.itemText(row))
+        if gains is None:
+            return
+        for slider, g in zip(self.eq_sliders, gains):
+            slider.setValue(g)
+        self.apply_eq_and_refresh()
+
     
     def show_playlist_menu(self, pos):
         """
@@ -600,11 +1009,19 @@ class AudioPlayer(QMainWindow):
         """
         menu = QMenu(self)
         find_sim = menu.addAction("Найти похожие треки")
+        find_dup = menu.addAction("Найти дубликаты")
+        save_group = None
+        if self.cluster_box.currentIndex() > 0:
+            save_group = menu.addAction("Сохранить группу как плейлист...")
         # можно добавить ещё действий: play, remove и т.п.
 
         action = menu.exec_(self.playlistWidget.mapToGlobal(pos))
         if action == find_sim:
             self.on_find_similar()
+        elif action == find_dup:
+            self.on_find_duplicates()
+        elif action is not None and action == save_group:
+            self.on_save_cluster_playlist()
 
     def on_find_similar(self):
         rows = [i.row() for i in self.playlistWidget.selectedIndexes()]
@@ -614,13 +1031,179 @@ class AudioPlayer(QMainWindow):
             "Пожалуйста, выберите минимум два трека для сравнения.")
             return
         ref, comps = rows[0], rows[1:]
-        results = self.controller.compute_similarity_indices(ref, comps)
+        # Пары считаются в пуле; окно откроется по on_similarity_ready.
+        # Более ранний незавершённый поиск отменяется.
+        if self._similarity_req is not None:
+            self.controller.pool.cancel_tag('similarity')
+        with profile_action('similarity'):
+            self._similarity_req = self.controller.request_similarity(ref, comps)
+        if not self._similarity_req['future'].done():
+            self.statusBar().showMessage("Поиск похожих треков...")
+
+    def on_similarity_ready(self, req):
+        if req is not self._similarity_req:
+            return
+        self._similarity_req = None
+        self.statusBar().clearMessage()
+        from similarity import combine_scores
+        # Сырые компоненты (из хранилища или посчитанные) — веса меняются в окне
+        components = self.controller.finish_similarity(req)
+        idxs, dtw, chroma = components
+        results = dict(zip(idxs.tolist(), combine_scores(dtw, chroma).tolist()))
 
         dlg = SimilarityTableDialog(
             self,
-            ref,
+            req['ref'],
             results,
-            self.controller.playlist
+            self.controller.playlist,
+            components
         )
         dlg.exec_()
 
+    def on_find_duplicates(self):
+        """
+        Ищет дубликаты и перекодировки во всём плейлисте
+        и показывает найденные группы.
+        """
+        if len(self.controller.playlist) < 2:
+            return
+        if self._duplicates_thread is not None and self._duplicates_thread.isRunning():
+            return
+        paths = [tr.path for tr in self.controller.playlist]
+        self._duplicates_thread = DuplicatesThread(self.controller, paths, self)
+        self._duplicates_thread.found.connect(self.on_duplicates_ready)
+        self._duplicates_thread.start()
+        self.statusBar().showMessage("Поиск дубликатов...")
+
+    def on_duplicates_ready(self, path_groups):
+        """Показывает группы дубликатов; треки, убранные из плейлиста за время поиска, пропускаются."""
+        self.statusBar().clearMessage()
+        playlist = self.controller.playlist
+        groups = []
+        for group in path_groups:
+            idxs = [i for i in map(playlist.index_of, group) if i is not None]
+            if len(idxs) > 1:
+                groups.append(idxs)
+        if not groups:
+            QMessageBox.information(self, "Дубликаты", "Дубликаты не найдены.")
+            return
+        dlg = DuplicateGroupsDialog(self, groups, playlist)
+        dlg.exec_()
+
+    # --Группы похожих треков--
+    def on_cluster_tracks(self):
+        """Спрашивает число групп и запускает кластеризацию плейлиста в фоне."""
+        if len(self.controller.playlist) < 2:
+            return
+        k, ok = QInputDialog.getInt(self, "Группы похожих треков", "Число групп:",
+                                    self._cluster_k or DEFAULT_CLUSTERS, 2, 100)
+        if ok:
+            self._cluster_k = k
+            self._update_clusters()
+
+    def _update_clusters(self):
+        """
+        Перестраивает группы для текущего плейлиста, если кластеризация
+        включена: векторы считаются только для новых файлов.
+        """
+        if self._cluster_k is None:
+            return
+        if self._cluster_thread is not None and self._cluster_thread.isRunning():
+            # Новые файлы подхватятся после текущего прохода
+            self._cluster_pending = True
+            return
+        self._cluster_pending = False
+        paths = [tr.path for tr in self.controller.playlist]
+        self._cluster_thread = ClusterThread(self.controller, paths, self._cluster_k, self)
+        self._cluster_thread.clustered.connect(self.on_clusters_ready)
+        self._cluster_thread.finished.connect(self._on_cluster_thread_finished)
+        self._cluster_thread.start()
+        self.statusBar().showMessage("Группировка треков по сходству...")
+
+    def _on_cluster_thread_finished(self):
+        if self._cluster_pending:
+            self._update_clusters()
+
+    def on_clusters_ready(self, groups):
+        """Заполняет список групп над плейлистом, сохраняя выбранную по номеру."""
+        self._cluster_groups = groups
+        current = self.cluster_box.currentIndex()
+        self.cluster_box.clear()
+        self.cluster_box.addItem("Все треки")
+        for i, group in enumerate(groups, 1):
+            self.cluster_box.addItem(f"Группа {i} — {len(group)} тр.")
+        self.cluster_box.setCurrentIndex(current if current < self.cluster_box.count() else 0)
+        self._apply_cluster_filter()
+        self.statusBar().showMessage(f"Групп похожих треков: {len(groups)}", 5000)
+
+    def on_cluster_selected(self, row):
+        self._apply_cluster_filter()
+
+    def _apply_cluster_filter(self):
+        """Показывает в плейлисте только треки выбранной группы (строки = индексы плейлиста)."""
+        row = self.cluster_box.currentIndex()
+        if row <= 0 or row > len(self._cluster_groups):
+            for i in range(self.playlistWidget.count()):
+                self.playlistWidget.setRowHidden(i, False)
+            return
+        playlist = self.controller.playlist
+        visible = {playlist.index_of(p) for p in self._cluster_groups[row - 1]}
+        for i in range(self.playlistWidget.count()):
+            self.playlistWidget.setRowHidden(i, i not in visible)
+
+    def on_save_cluster_playlist(self):
+        """Сохраняет выбранную группу как отдельный плейлист."""
+        row = self.cluster_box.currentIndex()
+        if row <= 0 or row > len(self._cluster_groups):
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save Playlist", "", self.PLAYLIST_FILTER)
+        if path:
+            playlist = self.controller.playlist
+            save_playlist(path, [playlist.get(p) for p in self._cluster_groups[row - 1]
+                                 if p in playlist])
+
+    def on_find_clip(self):
+        """
+        Ищет выделенный между start_line и end_line фрагмент во всех треках
+        плейлиста и показывает найденные позиции.
+        """
+        if self.controller.data is None:
+            return
+        if self._clip_thread is not None and self._clip_thread.isRunning():
+            return
+        y_seg, sr, _, _ = self.controller.get_segment(self.start_line.value(),
+                                                      self.end_line.value())
+        if y_seg is None or len(y_seg) == 0:
+            return
+        paths = [tr.path for tr in self.controller.playlist]
+        # Копия: буфер контроллера может смениться (эквалайзер, другой трек) во время поиска
+        self._clip_thread = ClipSearchThread(self.controller, y_seg.copy(), sr, paths, self)
+        self._clip_thread.progress.connect(self.on_find_clip_progress)
+        self._clip_thread.found.connect(self.on_find_clip_ready)
+        self._clip_thread.start()
+        self.statusBar().showMessage("Поиск фрагмента...")
+
+    def on_find_clip_progress(self, done, total):
+        self.statusBar().showMessage(f"Поиск фрагмента: признаки {done}/{total} треков")
+
+    def on_find_clip_ready(self, path_hits):
+        """Показывает совпадения; треки, убранные из плейлиста за время поиска, пропускаются."""
+        self.statusBar().clearMessage()
+        playlist = self.controller.playlist
+        hits = [(playlist.index_of(path), offset, sim) for path, offset, sim in path_hits
+                if path in playlist]
+        if not hits:
+            QMessageBox.information(self, "Поиск фрагмента", "Совпадений не найдено.")
+            return
+        SegmentSearchDialog(self, hits, playlist).exec_()
+
+    def play_track_at(self, idx, sec):
+        """
+        Открывает трек idx (если он ещё не текущий) и перематывает на sec секунд.
+        """
+        if idx != self.controller.current_index:
+            self.controller.current_index = idx
+            self.controller.open_file(self.controller.playlist[idx]['path'])
+            self.update_ui_for_current_track()
+        self.controller.seek(sec)
+        self.playhead.setPos(sec)
@@ -1,4 +1,10 @@
-import json
+import json, os, hashlib, threading, importlib
+
+# Потоковый формат плейлиста: первая строка — заголовок с версией,
+# далее по одной JSON-записи трека на строку
+PLAYLIST_FORMAT    = "gui-sound-app/playlist"
+PLAYLIST_VERSION   = 1
+PLAYLIST_EXTENSION = ".gspl"
 
 def format_time(ms):
     """
@@ -33,3 +39,115 @@ def load_playlist_json(path: str) -> list[dict]:
     with open(path, 'r', encoding='utf-8') as f:
         data = json.load(f)
     return data.get("playlist", [])
+
+
+def file_signature(path: str):
+    """
+    Возвращает (size, mtime) файла или None, если файл недоступен.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime
+
+
+def track_cache_key(path: str, size: int, mtime: float) -> str:
+    """
+    Ключ кэша признаков трека: меняется при изменении пути, размера или mtime.
+    """
+    raw = f"{os.path.abspath(path)}|{int(size)}|{float(mtime):.6f}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def save_playlist_stream(path: str, playlist):
+    """
+    Сохраняет плейлист в потоковом формате (.gspl): заголовок с версией
+    и по одной строке на трек. Помимо 'path', 'title' и 'duration'
+    пишет кэшируемые метаданные: sr, channels, size, mtime, ключ кэша признаков
+    и результат анализа громкости.
+    """
+    header = {'format': PLAYLIST_FORMAT, 'version': PLAYLIST_VERSION}
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(header) + '\n')
+        for tr in playlist:
+            size, mtime = tr.get('size'), tr.get('mtime')
+            if size is None or mtime is None:
+                size, mtime = file_signature(tr['path']) or (None, None)
+            rec = {
+                'path':     tr['path'],
+                'title':    tr['title'],
+                'duration': tr['duration'],
+                'sr':       tr.get('original_fs'),
+                'channels': tr.get('channels'),
+                'size':     size,
+                'mtime':    mtime,
+                'key':      track_cache_key(tr['path'], size, mtime) if size is not None else None,
+                'loudness': tr.get('loudness'),
+            }
+            f.write(json.dumps(rec, ensure_ascii=False) + '\n')
+
+
+def iter_playlist_stream(path: str):
+    """
+    Построчно читает плейлист в формате .gspl и отдаёт записи треков
+    по одной, не загружая весь файл в память.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get('format') != PLAYLIST_FORMAT:
+            raise ValueError(f"{path}: не является плейлистом {PLAYLIST_FORMAT}")
+        if header.get('version', 0) > PLAYLIST_VERSION:
+            raise ValueError(f"{path}: неподдерживаемая версия {header.get('version')}")
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def save_playlist(path: str, playlist):
+    """Сохраняет плейлист, выбирая формат по расширению (.json или .gspl)."""
+    if path.lower().endswith('.json'):
+        save_playlist_json(path, playlist)
+    else:
+        save_playlist_stream(path, playlist)
+
+
+def iter_playlist(path: str):
+    """Итератор по записям плейлиста в формате .json или .gspl."""
+    if path.lower().endswith('.json'):
+        yield from load_playlist_json(path)
+    else:
+        yield from iter_playlist_stream(path)
+
+
+def is_track_unchanged(rec: dict) -> bool:
+    """
+    True, если для записи плейлиста сохранены метаданные и файл
+    с тех пор не менялся (совпадают размер и mtime).
+    """
+    if rec.get('size') is None or rec.get('mtime') is None or not rec.get('sr'):
+        return False
+    sig = file_signature(rec['path'])
+    return sig is not None and sig[0] == rec['size'] and sig[1] == rec['mtime']
+
+
+# Тяжёлые модули, которые GUI импортирует лениво; прогреваются в фоне после старта
+WARM_UP_MODULES = ('scipy.signal', 'scipy.io.wavfile', 'soundfile', 'librosa',
+                   'librosa.feature', 'fastdtw', 'matplotlib.figure')
+
+
+def warm_up_imports(modules=WARM_UP_MODULES) -> threading.Thread:
+    """
+    Импортирует тяжёлые модули в фоновом потоке, чтобы первое обращение
+    к функциям анализа не тормозило интерфейс. Ошибки импорта игнорируются:
+    модуль всё равно будет импортирован (и ошибка показана) при реальном вызове.
+    """
+    def run():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                pass
+    th = threading.Thread(target=run, name='warm-up-imports', daemon=True)
+    th.start()
+    return th
@@ -0,0 +1,137 @@
+# watchdog.py
+
+import os, sys, time, threading, logging, traceback
+from collections import deque
+from PyQt5.QtCore import QObject, QTimer, QEvent
+
+log = logging.getLogger(__name__)
+
+# Границы корзин гистограммы задержки цикла событий, мс
+LATENCY_BUCKETS = (5, 10, 20, 50, 100, 250, 500, 1000, 2000, 5000)
+
+
+def _slot_name(stack) -> str:
+    """
+    Имя слота, заблокировавшего GUI: самый внешний кадр из ui.py/dialogs.py,
+    иначе — самый внутренний кадр стека.
+    """
+    for fr in stack:
+        if os.path.basename(fr.filename) in ('ui.py', 'dialogs.py'):
+            return f"{os.path.basename(fr.filename)}:{fr.name}"
+    return f"{os.path.basename(stack[-1].filename)}:{stack[-1].name}" if stack else "?"
+
+
+class UiWatchdog(QObject):
+    """
+    Сторож GUI-потока.
+    – QTimer-пульс каждые interval_ms в цикле событий; отставание пульса
+      от расписания — задержка цикла событий, она копится в гистограмме
+    – фоновый поток проверяет, как давно был пульс; если дольше threshold_ms,
+      снимает Python-стек GUI-потока в момент зависания
+    – по окончании зависания пишет в лог длительность, слот и стек
+    – пока окно-родитель скрыто или свёрнуто, пульс остановлен (как кадры
+      RenderScheduler), а фоновый поток зависаний не ищет
+    """
+
+    def __init__(self, parent=None, interval_ms: int = 50, threshold_ms: int = None):
+        super().__init__(parent)
+        self.interval_ms  = interval_ms
+        self.threshold_ms = threshold_ms or int(os.environ.get('GSA_WATCHDOG_MS', 200))
+        self.histogram    = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.max_latency_ms = 0.0
+        # Последние зависания: {"time", "duration_ms", "slot", "stack"}
+        self.stalls = deque(maxlen=100)
+
+        self._gui_ident = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._pending   = None
+        self._paused    = True
+        self._lock      = threading.Lock()
+        self._stop      = threading.Event()
+        self._thread    = None
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._beat)
+
+    def start(self):
+        self._stop.clear()
+        if self.parent() is not None:
+            self.parent().installEventFilter(self)
+        self._update_timer()
+        self._thread = threading.Thread(target=self._monitor, name='ui-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._timer.stop()
+        self._stop.set()
+
+    def _can_beat(self) -> bool:
+        w = self.parent()
+        return w is None or not w.isWidgetType() or (w.isVisible() and not w.isMinimized())
+
+    def _update_timer(self):
+        """Запускает пульс, если окно видно, иначе останавливает."""
+        if self._stop.is_set():
+            return
+        if self._can_beat():
+            if not self._timer.isActive():
+                # Время в скрытом состоянии не считается задержкой цикла
+                with self._lock:
+                    self._last_beat = time.perf_counter()
+                    self._paused = False
+                self._timer.start()
+        else:
+            self._timer.stop()
+            with self._lock:
+                self._paused = True
+
+    def eventFilter(self, obj, event):
+        if event.type() in (QEvent.Show, QEvent.Hide, QEvent.WindowStateChange):
+            self._update_timer()
+        return False
+
+    # --GUI-поток--
+    def _beat(self):
+        now = time.perf_counter()
+        with self._lock:
+            latency_ms = max(0.0, (now - self._last_beat) * 1000 - self.interval_ms)
+            self._last_beat = now
+            pending, self._pending = self._pending, None
+
+        self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+        bucket = 0
+        while bucket < len(LATENCY_BUCKETS) and latency_ms > LATENCY_BUCKETS[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+
+        if pending is not None:
+            pending['duration_ms'] = latency_ms + self.interval_ms
+            self.stalls.append(pending)
+            log.warning("GUI заблокирован на %.0f мс в %s\n%s",
+                        pending['duration_ms'], pending['slot'], ''.join(pending['stack']))
+
+    # --Фоновый поток--
+    def _monitor(self):
+        period = self.threshold_ms / 4000
+        while not self._stop.wait(period):
+            with self._lock:
+                stalled_ms = (time.perf_counter() - self._last_beat) * 1000
+                if self._paused or self._pending is not None or stalled_ms < self.threshold_ms:
+                    continue
+            frame = sys._current_frames().get(self._gui_ident)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame)
+            with self._lock:
+                self._pending = {
+                    'time':  time.time(),
+                    'slot':  _slot_name(stack),
+                    'stack': traceback.format_list(stack),
+                }
+
+    # --Отчёт--
+    def histogram_rows(self) -> list[tuple[str, int]]:
+        """Гистограмма задержек в виде [(подпись корзины, число пульсов)]."""
+        labels = [f"≤{b} мс" for b in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]} мс"]
+        return list(zip(labels, self.histogram))
@@ -0,0 +1,390 @@
+# workers.py
+
+import os, itertools, threading, queue
+import multiprocessing as mp
+from collections import OrderedDict
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, Future, CancelledError, InvalidStateError
+import numpy as np
+
+# Модуль импортируется в дочерних процессах, поэтому здесь нет Qt
+# и тяжёлых библиотек на верхнем уровне.
+
+# Приоритеты задач: меньше — раньше
+PRIORITY_INTERACTIVE = 0    # рендер EQ текущего трека
+PRIORITY_QUERY       = 10   # поиск похожих, запущенный пользователем
+PRIORITY_BACKGROUND  = 20   # фоновое извлечение признаков
+
+# Сколько наборов признаков держит каждый рабочий процесс
+WORKER_FEATURES_SIZE = 32
+# Сколько общих блоков без задач держать для повторного использования
+SHARED_IDLE_BLOCKS = 4
+
+
+# --Код, выполняемый в рабочих процессах--
+
+# Кэш признаков рабочего процесса (LRU): пул постоянный, поэтому кэш живёт
+# между задачами; ключ — track_cache_key, так что изменённый файл пересчитывается
+_worker_features: OrderedDict = OrderedDict()
+
+
+def _feature_key(path: str):
+    """Ключ кэша признаков по пути, размеру и mtime файла (None, если файла нет)."""
+    from utils import file_signature, track_cache_key
+    sig = file_signature(path)
+    return None if sig is None else track_cache_key(path, *sig)
+
+
+def _open_source(src: dict):
+    """
+    Возвращает (shm, y, sr): вид на общий блок памяти без копирования,
+    либо (None, y, sr), если сигнала в памяти нет и файл декодируется здесь.
+    """
+    if src.get('shm'):
+        name, shape, dtype = src['shm']
+        shm = shared_memory.SharedMemory(name=name)
+        return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf), src['sr']
+    import librosa
+    y, sr = librosa.load(src['path'], sr=None, mono=True)
+    return None, y, sr
+
+
+def _features_for(src: dict) -> dict:
+    key = _feature_key(src['path'])
+    feats = _worker_features.get(key) if key is not None else None
+    if feats is not None:
+        _worker_features.move_to_end(key)
+    else:
+        from similarity import track_features
+        from activity import activity_for, active_signal
+        shm, y, sr = _open_source(src)
+        try:
+            # Признаки считаются только по звучащим участкам
+            y = active_signal(y, activity_for(y, sr, src['path']))
+            feats = track_features(y, sr, path=src['path'])
+        finally:
+            del y
+            if shm is not None:
+                shm.close()
+        if key is not None:
+            _worker_features[key] = feats
+            while len(_worker_features) > WORKER_FEATURES_SIZE:
+                _worker_features.popitem(last=False)
+    return feats
+
+
+def job_track_vector(src: dict) -> np.ndarray:
+    """Вектор трека для кластеризации: средний MFCC и хрома (float32, n_mfcc + 12)."""
+    feats = _features_for(src)
+    return np.concatenate([feats['mfcc'], feats['chroma']]).astype(np.float32)
+
+
+def job_pair_similarity(ref_src: dict, comp_src: dict):
+    """Сырые компоненты сходства пары: (DTW-расстояние, косинус хрома-векторов)."""
+    from similarity import features_dtw_distance, cosine_similarity
+    a, b = _features_for(ref_src), _features_for(comp_src)
+    return (float(features_dtw_distance(a, b)),
+            cosine_similarity(a['chroma'], b['chroma']))
+
+
+def job_eq(src: dict, wav: str, gains, fs, bands, regions=None, segment=None,
+           scale_db: float = None, out_name: str = None) -> float:
+    """
+    Рендерит эквалайзер и пишет 16-битный WAV wav для плеера.
+    regions — активные участки (фильтруется только звук), segment —
+    (i0, i1, разгон) в отсчётах: фильтруется только фрагмент y[i0:i1],
+    первые «разгон» отсчётов отбрасываются. scale_db — усиление рендера
+    (если не задано — нормировка по пику). Отфильтрованный сигнал
+    (float32) кладётся в общий блок out_name, если он задан.
+    Возвращает усиление рендера в дБ.
+    """
+    from eq import apply_equalizer, apply_equalizer_regions
+    from loudness import db_to_gain
+    import scipy.io.wavfile as wavfile
+    shm, y, _ = _open_source(src)
+    try:
+        if segment is not None:
+            i0, i1, pre = segment
+            y_eq = apply_equalizer(y[i0:i1], gains, fs, bands)[pre:]
+        elif regions is not None:
+            y_eq = apply_equalizer_regions(y, gains, fs, bands, regions)
+        else:
+            y_eq = apply_equalizer(y, gains, fs, bands)
+    finally:
+        del y
+        if shm is not None:
+            shm.close()
+    y_eq = np.asarray(y_eq, dtype=np.float32)
+    if scale_db is None:
+        peak = float(np.max(np.abs(y_eq))) if len(y_eq) else 0.0
+        scale_db = float(-20 * np.log10(peak)) if peak > 0 else 0.0
+    if out_name is not None:
+        out = shared_memory.SharedMemory(name=out_name)
+        try:
+            dst = np.ndarray(y_eq.shape, dtype=np.float32, buffer=out.buf)
+            dst[:] = y_eq
+            del dst
+        finally:
+            out.close()
+    gain = np.float32(db_to_gain(scale_db))
+    wavfile.write(wav, int(fs), np.int16(np.clip(y_eq * gain, -1.0, 1.0) * 32767))
+    return scale_db
+
+
+# --Родительский процесс--
+
+class Job:
+    """Задача пула: приоритет, функция, аргументы и Future с результатом."""
+    __slots__ = ('priority', 'seq', 'fn', 'args', 'future', 'transform', 'tag',
+                 'cleanup', 'shared', 'started')
+
+    def __init__(self, priority, seq, fn, args, transform=None, tag=None, cleanup=None):
+        self.priority  = priority
+        self.seq       = seq
+        self.fn        = fn
+        self.args      = args
+        self.future    = Future()
+        self.transform = transform
+        self.tag       = tag
+        self.cleanup   = cleanup
+        # Ключи общих блоков источников и признак передачи в процесс
+        self.shared    = [a['path'] for a in args if isinstance(a, dict) and a.get('shm')]
+        self.started   = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def cancel(self) -> bool:
+        """
+        Отменяет задачу. Ещё не запущенная задача не попадёт в процесс,
+        результат уже выполняющейся будет отброшен.
+        """
+        return self.future.cancel()
+
+
+class AnalysisPool:
+    """
+    Постоянный пул процессов для анализа.
+    – запускается один раз и переиспользуется (spawn, по процессу на ядро)
+    – сигналы передаются через multiprocessing.shared_memory: каждый трек
+      копируется в общий блок один раз, процессы читают его без копирования;
+      блок живёт, пока на него ссылаются задачи, и ещё немного в LRU
+      из SHARED_IDLE_BLOCKS блоков для повторных запросов
+    – очередь с приоритетами: в процессы отдаётся не больше задач, чем
+      рабочих, поэтому срочная задача обгоняет фоновые
+    – отмена задач по одной или по тегу
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(self.max_workers,
+                                             mp_context=mp.get_context('spawn'))
+        self._queue    = queue.PriorityQueue()
+        self._slots    = threading.Semaphore(self.max_workers)
+        self._seq      = itertools.count()
+        # key -> [блок общей памяти, shape, число задач-владельцев]
+        self._shared: OrderedDict = OrderedDict()
+        self._pending: set[Job] = set()
+        self._lock     = threading.Lock()
+        self._closed   = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name='analysis-dispatch',
+                                            daemon=True)
+        self._dispatcher.start()
+
+    # --Общая память--
+    def share(self, key: str, y: np.ndarray) -> tuple:
+        """
+        Кладёт сигнал в общий блок памяти (один раз на key), берёт на него
+        ссылку и возвращает (name, shape, dtype) для передачи в задачи.
+        Ссылку снимает release.
+        """
+        with self._lock:
+            entry = self._shared.get(key)
+            if entry is None:
+                y = np.ascontiguousarray(y, dtype=np.float32)
+                shm = shared_memory.SharedMemory(create=True, size=max(1, y.nbytes))
+                np.ndarray(y.shape, dtype=np.float32, buffer=shm.buf)[:] = y
+                entry = self._shared[key] = [shm, y.shape, 0]
+            entry[2] += 1
+            self._shared.move_to_end(key)
+        shm, shape, _ = entry
+        return shm.name, shape, 'float32'
+
+    def release(self, key: str):
+        """
+        Снимает ссылку на блок key. Блоки без ссылок сверх
+        SHARED_IDLE_BLOCKS освобождаются, начиная с давно использованных.
+        """
+        with self._lock:
+            entry = self._shared.get(key)
+            if entry is not None and entry[2] > 0:
+                entry[2] -= 1
+            idle = [k for k, e in self._shared.items() if e[2] == 0]
+            drop = [self._shared.pop(k)[0] for k in idle[:max(0, len(idle) - SHARED_IDLE_BLOCKS)]]
+        for shm in drop:
+            shm.close()
+            shm.unlink()
+
+    def source(self, path: str, y: np.ndarray = None, sr: int = None) -> dict:
+        """
+        Описание источника сигнала для задачи: общий блок памяти,
+        если сигнал уже загружен, иначе путь к файлу (декодирует рабочий процесс).
+        Источник с общим блоком держит ссылку до завершения задачи, поэтому
+        передаётся ровно в одну задачу.
+        """
+        src = {'path': path, 'sr': sr, 'shm': None}
+        if y is not None:
+            src['shm'] = self.share(path, y)
+        return src
+
+    # --Очередь задач--
+    def submit(self, fn, *args, priority: int = PRIORITY_BACKGROUND,
+               transform=None, tag=None, cleanup=None) -> Job:
+        """
+        Ставит fn(*args) в очередь. transform (если задан) применяется
+        к результату в родительском процессе перед установкой Future.
+        cleanup(job) вызывается один раз, когда задача больше не может
+        выполняться: процесс её закончил или она снята с очереди. В отличие
+        от колбэков Future, при отмене уже выполняющейся задачи он ждёт
+        процесс, поэтому в нём освобождают то, чем процесс пользуется
+        (выходные блоки памяти, временные файлы).
+        """
+        if self._closed:
+            raise RuntimeError("AnalysisPool закрыт")
+        job = Job(priority, next(self._seq), fn, args, transform, tag, cleanup)
+        with self._lock:
+            self._pending.add(job)
+        self._queue.put(job)
+        return job
+
+    def cancel_tag(self, tag) -> int:
+        """Отменяет все незавершённые задачи с тегом tag."""
+        with self._lock:
+            jobs = [j for j in self._pending if j.tag == tag and not j.future.done()]
+        return sum(j.cancel() for j in jobs)
+
+    def _finish(self, job):
+        """Задача больше не выполняется: снимает ссылки на общие блоки, вызывает cleanup."""
+        with self._lock:
+            if job not in self._pending:
+                return
+            self._pending.discard(job)
+        for key in job.shared:
+            self.release(key)
+        if job.cleanup is not None:
+            try:
+                job.cleanup(job)
+            except Exception:
+                pass
+
+    @staticmethod
+    def _settle(future, result=None, exc=None):
+        """
+        Устанавливает результат или ошибку, если Future ещё не завершён:
+        отмена может прийти из потока интерфейса в любой момент.
+        """
+        if future.done():
+            return
+        try:
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire()
+            job = self._queue.get()
+            if job.fn is None:
+                break
+            if job.future.cancelled():
+                self._slots.release()
+                self._finish(job)
+                continue
+            with self._lock:
+                # Задачу мог уже снять shutdown
+                job.started = job in self._pending
+            if not job.started:
+                self._slots.release()
+                continue
+            try:
+                fut = self._executor.submit(job.fn, *job.args)
+            except RuntimeError as exc:
+                self._slots.release()
+                self._settle(job.future, exc=exc)
+                self._finish(job)
+                continue
+            fut.add_done_callback(lambda f, job=job: self._on_done(job, f))
+
+    def _on_done(self, job, fut):
+        self._slots.release()
+        try:
+            if job.future.done():
+                return
+            try:
+                result = fut.result()
+                if job.transform is not None:
+                    result = job.transform(result)
+            except CancelledError:
+                job.future.cancel()
+                return
+            except BaseException as exc:
+                self._settle(job.future, exc=exc)
+                return
+            self._settle(job.future, result)
+        finally:
+            self._finish(job)
+
+    def shutdown(self):
+        """Останавливает пул, отменяет очередь и освобождает общую память."""
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            jobs = list(self._pending)
+        for job in jobs:
+            job.cancel()
+        # Задачи, не дошедшие до процессов, диспетчер уже не увидит
+        with self._lock:
+            idle = [j for j in self._pending if not j.started]
+        for job in idle:
+            self._finish(job)
+        # Стоп-задача с наивысшим приоритетом завершает диспетчер
+        self._queue.put(Job(-1, -1, None, ()))
+        self._slots.release()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            blocks = [e[0] for e in self._shared.values()]
+            self._shared.clear()
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def gather(jobs: dict) -> Future:
+    """
+    Объединяет задачи {ключ: Job} в один Future со словарём {ключ: результат}.
+    Отменённые и упавшие задачи в результат не попадают.
+    """
+    combined = Future()
+    results, left = {}, [len(jobs)]
+    lock = threading.Lock()
+    if not jobs:
+        combined.set_result(results)
+        return combined
+
+    def done(key, fut):
+        if not fut.cancelled() and fut.exception() is None:
+            with lock:
+                results[key] = fut.result()
+        with lock:
+            left[0] -= 1
+            finished = left[0] == 0
+        if finished and not combined.done():
+            combined.set_result(results)
+
+    for key, job in jobs.items():
+        job.future.add_done_callback(lambda f, key=key: done(key, f))
+    return combined